@@ -0,0 +1,135 @@
+# scripts/load_test_scoring.py
+"""
+Load generator for the local scoring service (scripts/scoring_service.py).
+
+Opens --concurrency keep-alive connections that each send single-policy POST /predict
+requests back to back, then reports the throughput and the client-side p50/p99 latency,
+followed by the service's own /metrics.
+
+Example:
+    python scripts/load_test_scoring.py --port 8080 --input MachineLearningRating_v3.txt \\
+        --concurrency 64 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from scoring_service import REQUIRED_FIELDS
+
+
+def sample_policies(input_path=None, n_policies=1000, delimiter="|", seed=0):
+    """
+    Policies to send: rows of a policy file, or synthetic policies when no file is given.
+    """
+    fields = REQUIRED_FIELDS + ['TransactionMonth', 'TotalPremium', 'TotalClaims']
+    if input_path is not None:
+        policies = pd.read_csv(input_path, delimiter=delimiter, nrows=n_policies, low_memory=False)
+        policies = policies[[col for col in fields if col in policies.columns]]
+        return json.loads(policies.to_json(orient='records'))
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'RegistrationYear': int(rng.integers(1990, 2015)),
+            'Province': str(rng.choice(['Gauteng', 'Western Cape', 'KwaZulu-Natal', 'Limpopo'])),
+            'MainCrestaZone': str(rng.choice(['Rand East', 'Cape Town', 'Durban', 'Karoo'])),
+            'SumInsured': float(rng.gamma(2, 50000)),
+            'CapitalOutstanding': float(rng.gamma(2, 20000)),
+            'TransactionMonth': '2015-08-01',
+            'TotalPremium': float(rng.gamma(1.5, 40)),
+            'TotalClaims': 0.0,
+        }
+        for _ in range(n_policies)
+    ]
+
+
+async def _request(reader, writer, host, method, path, body=b''):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), json.loads(payload)
+
+
+async def _client(host, port, bodies, n_requests, latencies_ms, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(n_requests):
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, host, 'POST', '/predict', bodies[i % len(bodies)])
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            statuses.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load_test(host='127.0.0.1', port=8080, policies=None, concurrency=32, n_requests=5000):
+    """
+    Sends n_requests single-policy requests over `concurrency` connections.
+
+    :return: Dictionary with the client-side results and the service's /metrics
+    """
+    policies = policies or sample_policies()
+    bodies = [json.dumps(policy).encode() for policy in policies]
+    latencies_ms, statuses = [], []
+    per_client = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(host, port, bodies[i::concurrency] or bodies, count, latencies_ms, statuses)
+        for i, count in enumerate(per_client) if count
+    ])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        _, metrics = await _request(reader, writer, host, 'GET', '/metrics')
+    finally:
+        writer.close()
+
+    p50, p99 = np.percentile(latencies_ms, [50, 99])
+    return {
+        'requests': len(latencies_ms),
+        'errors': sum(status != 200 for status in statuses),
+        'elapsed_s': elapsed,
+        'requests_per_s': len(latencies_ms) / elapsed,
+        'client_latency_ms': {'p50': float(p50), 'p99': float(p99)},
+        'service_metrics': metrics,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the local scoring service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--input', help="Policy file to take the request payloads from (default is synthetic)")
+    parser.add_argument('--policies', type=int, default=1000, help="Number of distinct policies to send")
+    parser.add_argument('--concurrency', type=int, default=32, help="Number of concurrent connections")
+    parser.add_argument('--requests', type=int, default=5000, help="Total number of requests")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_load_test(
+        args.host, args.port, sample_policies(args.input, args.policies), args.concurrency, args.requests
+    ))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
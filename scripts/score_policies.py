@@ -0,0 +1,98 @@
+# scripts/score_policies.py
+"""
+Batch scoring of a policy file with models from the model registry.
+
+The file is streamed through load_data in chunks, so memory is bounded by the chunk
+size: every chunk is cleaned with the imputer and outlier capper saved with the models,
+feature-engineered, transformed and predicted in vectorized calls, and its predictions
+are appended to the output CSV before the next chunk is read.
+
+Example:
+    python scripts/score_policies.py --input MachineLearningRating_v3.txt \\
+        --registry models --model TotalPremium_XGBoost --model TotalClaims_XGBoost \\
+        --output predictions.csv
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from data_loader import DEFAULT_CHUNKSIZE, load_data
+from Future_Engineering import RAW_FEATURE_COLUMNS, engineer_features
+from model_registry import load_model
+
+ID_COLUMNS = ['UnderwrittenCoverID', 'PolicyID']
+
+
+def score_policies(input_path, registry_dir, model_names, output_path, chunksize=DEFAULT_CHUNKSIZE,
+                   delimiter="|", versions=None):
+    """
+    Scores a policy file with one or more registered models in a single pass.
+
+    :param input_path: Path to the pipe-delimited policy file
+    :param registry_dir: Root directory of the model registry
+    :param model_names: Names of the registered models to score with
+    :param output_path: Path of the output CSV (ID columns and one 'Predicted<model>' column per model)
+    :param chunksize: Number of rows per chunk
+    :param delimiter: Delimiter of the policy file
+    :param versions: Optional list of model versions (default is the latest of each model)
+    :return: Number of rows scored
+    """
+    versions = versions or [None] * len(model_names)
+    models = {name: load_model(registry_dir, name, version) for name, version in zip(model_names, versions)}
+
+    # Only read the columns the features and the output need
+    header = pd.read_csv(input_path, delimiter=delimiter, nrows=0).columns
+    id_columns = [col for col in ID_COLUMNS if col in header]
+    usecols = id_columns + [col for col in RAW_FEATURE_COLUMNS if col in header]
+
+    n_rows, start = 0, time.perf_counter()
+    for i, chunk in enumerate(load_data(input_path, delimiter=delimiter, chunksize=chunksize, usecols=usecols)):
+        predictions = chunk[id_columns].copy()
+        # Models saved with the same cleaners share one cleaning and feature engineering of
+        # the chunk, and those also saved with the same transformer one transform
+        features, design_matrices = {}, {}
+        for name, model in models.items():
+            cleaning = model.metadata.get('cleaning_hash')
+            if cleaning not in features:
+                features[cleaning] = engineer_features(model.clean(chunk))
+            key = (cleaning, model.metadata.get('preprocessor_hash') or name)
+            if key not in design_matrices:
+                design_matrices[key] = model.transform(features[cleaning])
+            predictions[f"Predicted{name}"] = model.predict_transformed(design_matrices[key])
+
+        # Write incrementally: the header with the first chunk, then append
+        predictions.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        n_rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"Scored {n_rows} rows in {elapsed:.1f}s ({n_rows / elapsed:,.0f} rows/s)")
+
+    print(f"Predictions saved to {output_path}")
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a policy file with models from the model registry.")
+    parser.add_argument('--input', required=True, help="Pipe-delimited policy file")
+    parser.add_argument('--registry', required=True, help="Root directory of the model registry")
+    parser.add_argument('--model', required=True, action='append', dest='models',
+                        help="Registered model name (repeat to score with several models)")
+    parser.add_argument('--version', type=int, action='append', dest='versions',
+                        help="Model version, one per --model (default is the latest)")
+    parser.add_argument('--output', required=True, help="Output CSV file")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    parser.add_argument('--delimiter', default="|", help="Delimiter of the policy file")
+    args = parser.parse_args(argv)
+
+    if args.versions and len(args.versions) != len(args.models):
+        parser.error("Give one --version per --model, or none.")
+    score_policies(args.input, args.registry, args.models, args.output, chunksize=args.chunksize,
+                   delimiter=args.delimiter, versions=args.versions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+# scripts/scoring_service.py
+"""
+Local HTTP scoring service for quote-time predictions.
+
+The registered model and its feature transformer are loaded once at startup. Concurrent
+requests are gathered into micro-batches (up to --max-batch-size rows, waiting at most
+--max-wait-ms for more requests after the first one) and every batch is scored with one
+vectorized predict call.
+
+Endpoints:
+    POST /predict   a policy (JSON object) or a list of policies -> {"predictions": [...]}
+    GET  /metrics   request and batch counts, p50/p99 latency and batch-size statistics
+    GET  /health
+
+Example:
+    python scripts/scoring_service.py --registry models --model TotalPremium_XGBoost --port 8080
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from Future_Engineering import engineer_features
+from model_registry import load_model
+
+# Raw policy fields the feature engineering steps always read
+REQUIRED_FIELDS = ['RegistrationYear', 'Province', 'MainCrestaZone', 'SumInsured', 'CapitalOutstanding']
+MAX_BODY_BYTES = 1 << 20
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p99': None, 'mean': None, 'max': None}
+    values = np.asarray(values, dtype='float64')
+    p50, p99 = np.percentile(values, [50, 99])
+    return {'p50': float(p50), 'p99': float(p99), 'mean': float(values.mean()), 'max': float(values.max())}
+
+
+class MicroBatcher:
+    """
+    Gathers the records of concurrent requests into batches scored by one call of
+    `predict_batch` (a function of a list of records returning one prediction per record).
+    When a batch fails, each of its requests is scored on its own, so a bad record only
+    fails the request that sent it.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=256, max_wait_ms=5.0, metrics_window=10000):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.task = None
+        # Batches are scored off the event loop, one at a time, while the next one is gathered
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.latencies_ms = deque(maxlen=metrics_window)
+        self.batch_sizes = deque(maxlen=metrics_window)
+        self.counts = {'requests': 0, 'rows': 0, 'batches': 0, 'errors': 0}
+        self.started_at = time.monotonic()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, records):
+        # Queue the records of one request and wait for their predictions
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_rows < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+
+            predictions = await self._score(loop, [record for item in batch for record in item[0]])
+            if isinstance(predictions, Exception):
+                results = [predictions] if len(batch) == 1 else [await self._score(loop, item[0]) for item in batch]
+            else:
+                results, offset = [], 0
+                for item_records, _, _ in batch:
+                    results.append(predictions[offset:offset + len(item_records)])
+                    offset += len(item_records)
+
+            now = time.perf_counter()
+            for (item_records, future, submitted), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self.counts['errors'] += 1
+                    if not future.done():
+                        future.set_exception(result)
+                    continue
+                self.counts['requests'] += 1
+                self.counts['rows'] += len(item_records)
+                self.latencies_ms.append((now - submitted) * 1000)
+                if not future.done():
+                    future.set_result(result)
+
+    async def _score(self, loop, records):
+        # Predictions of the records, or the exception raised while scoring them
+        try:
+            predictions = await loop.run_in_executor(self.executor, self.predict_batch, records)
+        except Exception as error:
+            return error
+        self.counts['batches'] += 1
+        self.batch_sizes.append(len(records))
+        return predictions
+
+    def metrics(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            **self.counts,
+            'uptime_s': elapsed,
+            'requests_per_s': self.counts['requests'] / elapsed if elapsed > 0 else None,
+            'latency_ms': _percentiles(self.latencies_ms),
+            'batch_size': _percentiles(self.batch_sizes),
+        }
+
+
+class ScoringService:
+    """
+    HTTP front end of a registered model (see model_registry.load_model).
+    """
+
+    def __init__(self, registered_model, max_batch_size=256, max_wait_ms=5.0):
+        self.model = registered_model
+        # Targets the model was trained with as features must be sent with the policies too
+        self.required_fields = REQUIRED_FIELDS + [
+            col for col in registered_model.feature_columns if col in ('TotalPremium', 'TotalClaims')
+        ]
+        self.batcher = MicroBatcher(self.predict_records, max_batch_size, max_wait_ms)
+        self.server = None
+
+    def predict_records(self, records):
+        # Clean, feature-engineer, transform and predict a batch of raw policies in
+        # vectorized calls
+        policies = pd.DataFrame.from_records(records)
+        if 'TransactionMonth' not in policies.columns:
+            policies['TransactionMonth'] = pd.Timestamp.now().strftime('%Y-%m-01')
+        return self.model.predict(engineer_features(self.model.clean(policies))).tolist()
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.batcher.start()
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._route(method, path, body)
+                # The body of a rejected request (too large, or of an unreadable
+                # length) is left unread, so the connection cannot be reused
+                keep_alive = path is not None and headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        # A request whose body is not read comes back with path None and the error
+        # response in place of the body
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return method, None, headers, (400, {'error': "Content-Length must be a non-negative integer."})
+        if length > MAX_BODY_BYTES:
+            return method, None, headers, (413, {'error': f"Request bodies are limited to {MAX_BODY_BYTES} bytes."})
+        body = await reader.readexactly(length) if length else b''
+        return method, target.split('?', 1)[0], headers, body
+
+    async def _route(self, method, path, body):
+        if path is None:
+            return body
+        if path == '/predict':
+            if method != 'POST':
+                return 405, {'error': "Use POST /predict."}
+            return await self._predict(body)
+        if path == '/metrics':
+            return 200, self.batcher.metrics()
+        if path == '/health':
+            return 200, {'status': 'ok', 'model': self.model.metadata.get('name'),
+                         'version': self.model.metadata.get('version')}
+        return 404, {'error': f"Unknown path {path}."}
+
+    async def _predict(self, body):
+        try:
+            payload = json.loads(body or b'null')
+        except ValueError:
+            return 400, {'error': "The body must be JSON."}
+        records = [payload] if isinstance(payload, dict) else payload
+        if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+            return 400, {'error': "Send a policy object or a non-empty list of policy objects."}
+        missing = sorted({field for record in records for field in self.required_fields if field not in record})
+        if missing:
+            return 400, {'error': f"Missing policy fields {missing}."}
+        try:
+            predictions = await self.batcher.submit(records)
+        except Exception as error:
+            return 500, {'error': f"Scoring failed: {error}"}
+        return 200, {'predictions': predictions}
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+
+
+async def serve(registry_dir, model_name, version=None, host='127.0.0.1', port=8080, max_batch_size=256,
+                max_wait_ms=5.0):
+    """
+    Loads the model once and serves it until interrupted.
+    """
+    service = ScoringService(load_model(registry_dir, model_name, version), max_batch_size, max_wait_ms)
+    server = await service.start(host, port)
+    print(f"Serving {model_name} on http://{host}:{server.sockets[0].getsockname()[1]}")
+    try:
+        await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP scoring service for a registered model.")
+    parser.add_argument('--registry', required=True, help="Root directory of the model registry")
+    parser.add_argument('--model', required=True, help="Registered model name, e.g. TotalPremium_XGBoost")
+    parser.add_argument('--version', type=int, help="Model version (default is the latest)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-size', type=int, default=256, help="Maximum rows per micro-batch")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help="Maximum time to wait for more requests after the first one of a batch")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.registry, args.model, args.version, args.host, args.port, args.max_batch_size,
+                          args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,97 @@
+import joblib
 import pandas as pd
 import numpy as np
+import scipy.sparse as sparse
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
+from date_dimension import date_features
+from cross_validation import CV_SCHEMES, kfold_splits, prepare_folds, rolling_origin_splits, transaction_months
+
+CATEGORICAL_FEATURES = ['ProvinceZone']
+NUMERICAL_FEATURES = ['VehicleAge', 'LogSumInsured', 'LogCapitalOutstanding', 'TotalPremium', 'TotalClaims']
+# Raw policy columns the feature engineering steps read (the targets are optional features)
+RAW_FEATURE_COLUMNS = [
+    'TransactionMonth', 'RegistrationYear', 'Province', 'MainCrestaZone',
+    'SumInsured', 'CapitalOutstanding', 'TotalPremium', 'TotalClaims'
+]
+# Columns kept by get_selected_features_df: the engineered features and the targets
+SELECTED_COLUMNS = [
+    'TransactionYear', 'TransactionMonthOnly', 'VehicleAge',
+    'ProvinceZone', 'LogSumInsured', 'LogCapitalOutstanding',
+    'TotalPremium', 'TotalClaims'
+]
+
+
+def build_preprocessor(numerical_features, categorical_features):
+    # Scaled numerical columns next to one-hot encoded categories, always output as a
+    # sparse CSR matrix so memory grows with the non-zeros, not with the number of categories.
+    # Categories unseen during fit are encoded as all zeros.
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), numerical_features),
+            ('cat', OneHotEncoder(drop='first', sparse_output=True, handle_unknown='ignore'), categorical_features)
+        ],
+        sparse_threshold=1.0,
+        verbose_feature_names_out=False
+    )
+
+
+def transform_features(preprocessor, df):
+    # Transform new policies with a fitted preprocessor into a CSR design matrix
+    return sparse.csr_matrix(preprocessor.transform(df))
+
+
+def save_preprocessor(preprocessor, path):
+    joblib.dump(preprocessor, path)
+    print(f"Preprocessor saved to {path}")
+
+
+def load_preprocessor(path):
+    return joblib.load(path)
+
+
+def engineer_features(df, verbose=False):
+    # Run the feature engineering steps of the modeling notebook on raw policies (e.g. a
+    # chunk of load_data) and return the selected columns present in the data, so new
+    # policies get the same features as the training data
+    utils = InsuranceDataUtils(df, target_column=None)
+    utils.add_date_features()
+    utils.add_vehicle_age()
+    utils.combine_province_zone()
+    utils.apply_log_transformation(verbose=verbose)
+    return utils.df[[col for col in SELECTED_COLUMNS if col in utils.df.columns]]
+
 
 class InsuranceDataUtils:
     def __init__(self, df, target_column):
+        # target_column is a column name, or a list of names (e.g. ['TotalPremium', 'TotalClaims'])
+        # to build one feature matrix and one split shared by several targets
         self.df = df.copy()
         self.target_column = target_column
+        if target_column is None:
+            self.target_columns = []
+        elif isinstance(target_column, str):
+            self.target_columns = [target_column]
+        else:
+            self.target_columns = list(target_column)
         self.df_preprocessed = None
+        self.preprocessor = None
+        self.feature_names = None
         self.X_train = None
         self.X_test = None
         self.y_train = None
         self.y_test = None
+        # Transformed cross-validation folds per (scheme, n_splits, horizon, random_state)
+        self.cv_folds = {}
 
     def add_date_features(self):
-        # Extract year and month from TransactionMonth (assuming it's in 'YYYY-MM' format)
-        self.df['TransactionYear'] = pd.to_datetime(self.df['TransactionMonth']).dt.year
-        self.df['TransactionMonthOnly'] = pd.to_datetime(self.df['TransactionMonth']).dt.month
+        # Extract year and month from TransactionMonth (assuming it's in 'YYYY-MM' format);
+        # only the distinct months are parsed, and the parsed values are cached (see date_dimension)
+        dates = date_features(self.df, 'TransactionMonth', ['Year', 'Month'])
+        self.df['TransactionYear'] = dates['Year']
+        self.df['TransactionMonthOnly'] = dates['Month']
 
     def add_vehicle_age(self):
         # Calculate vehicle age based on the current year
@@ -29,7 +102,7 @@ class InsuranceDataUtils:
         # Combine Province with MainCrestaZone into a new feature
         self.df['ProvinceZone'] = self.df['Province'].astype(str) + '_' + self.df['MainCrestaZone'].astype(str)
 
-    def apply_log_transformation(self):
+    def apply_log_transformation(self, verbose=True):
         # Ensure 'SumInsured' and 'CapitalOutstanding' are numeric
         self.df['SumInsured'] = pd.to_numeric(self.df['SumInsured'], errors='coerce')
         self.df['CapitalOutstanding'] = pd.to_numeric(self.df['CapitalOutstanding'], errors='coerce')
@@ -47,80 +120,97 @@ class InsuranceDataUtils:
         self.df['LogCapitalOutstanding'] = np.log1p(self.df['CapitalOutstanding'])
 
         # Verify results
-        print(self.df[['LogSumInsured', 'LogCapitalOutstanding']].describe())
+        if verbose:
+            print(self.df[['LogSumInsured', 'LogCapitalOutstanding']].describe())
 
     def get_selected_features_df(self):
         # Select only the newly created features and the target variables
-        selected_columns = [
-            'TransactionYear', 'TransactionMonthOnly', 'VehicleAge', 
-            'ProvinceZone', 'LogSumInsured', 'LogCapitalOutstanding', 
-            'TotalPremium', 'TotalClaims'
-        ]
         # Return a new dataframe with only the selected columns
-        return self.df[selected_columns]
+        return self.df[SELECTED_COLUMNS]
 
     def preprocess_features(self):
         print("Starting feature preprocessing...")  # Debug statement
 
-        # Define columns
-        categorical_features = ['ProvinceZone']
-        numerical_features = ['VehicleAge', 'LogSumInsured', 'LogCapitalOutstanding', 'TotalPremium', 'TotalClaims']
-
-        # Define preprocessors
-        categorical_preprocessor = OneHotEncoder(drop='first', sparse_output=False)  # Updated argument name
-        numerical_preprocessor = StandardScaler()
-
-        # Combine preprocessors
-        preprocessor = ColumnTransformer(
-            transformers=[
-                ('num', numerical_preprocessor, numerical_features),
-                ('cat', categorical_preprocessor, categorical_features)
-            ]
-        )
-        
-        try:
-            # Apply preprocessing
-            X_preprocessed = preprocessor.fit_transform(self.df)
-            print("Preprocessing successful.")  # Debug statement
-            
-            # Get feature names after transformation
-            feature_names = (
-                numerical_features + 
-                list(preprocessor.named_transformers_['cat'].get_feature_names_out(categorical_features))
-            )
-            
-            # Convert to DataFrame
-            self.df_preprocessed = pd.DataFrame(X_preprocessed, columns=feature_names)
-            print("DataFrame created successfully with shape:", self.df_preprocessed.shape)  # Debug statement
-        
-        except Exception as e:
-            print("Error during preprocessing:", e)  # Error handling
+        # Define columns; the targets are not features, so the fitted preprocessor can
+        # transform new policies that have no targets yet
+        categorical_features = list(CATEGORICAL_FEATURES)
+        numerical_features = [col for col in NUMERICAL_FEATURES if col not in self.target_columns]
+
+        # The preprocessor is only fitted on the training split (see split_data)
+        self.preprocessor = build_preprocessor(numerical_features, categorical_features)
+        self.feature_names = None
+        self.df_preprocessed = None
+        self.cv_folds = {}
+        print("Preprocessor created.")  # Debug statement
 
     def split_data(self, test_size=0.2, random_state=42):
-        if self.df_preprocessed is None:
+        if self.preprocessor is None:
             raise ValueError("Preprocessed DataFrame has not been created. Call preprocess_features first.")
         
-        if self.target_column not in self.df_preprocessed.columns:
-            raise ValueError(f"Target column '{self.target_column}' not found in the preprocessed DataFrame.")
+        missing_targets = [col for col in self.target_columns if col not in self.df.columns]
+        if missing_targets:
+            raise ValueError(f"Target columns {missing_targets} not found in the DataFrame.")
         
-        X = self.df_preprocessed.drop(columns=[self.target_column])
-        y = self.df_preprocessed[self.target_column]
+        # Split the raw rows, then fit the preprocessor on the training rows only
+        train_df, test_df = train_test_split(self.df, test_size=test_size, random_state=random_state)
         
-        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
-            X, y, test_size=test_size, random_state=random_state
-        )
+        self.X_train = sparse.csr_matrix(self.preprocessor.fit_transform(train_df))
+        self.X_test = transform_features(self.preprocessor, test_df)
+        # A Series for a single target, a DataFrame with one column per target otherwise
+        self.y_train = train_df[self.target_column]
+        self.y_test = test_df[self.target_column]
+        self.feature_names = list(self.preprocessor.get_feature_names_out())
+        self.df_preprocessed = None
         
         print(f"Training data shape for {self.target_column}: {self.X_train.shape}")
         print(f"Testing data shape for {self.target_column}: {self.X_test.shape}")
 
+    def cross_validation_folds(self, scheme='kfold', n_splits=5, horizon=1, random_state=42):
+        # Cross-validation folds of all rows: shuffled K-fold ('kfold') or rolling-origin
+        # windows of `horizon` transaction months ('rolling'). Every fold fits its own
+        # preprocessor on its training rows; the transformed folds are cached, so every
+        # model and later call reuses them (see Modeling.InsuranceModeling.cross_validate)
+        if self.preprocessor is None:
+            raise ValueError("Preprocessor has not been created. Call preprocess_features first.")
+        if scheme not in CV_SCHEMES:
+            raise ValueError(f"Unknown cross-validation scheme '{scheme}'. Use one of {list(CV_SCHEMES)}.")
+        missing_targets = [col for col in self.target_columns if col not in self.df.columns]
+        if missing_targets:
+            raise ValueError(f"Target columns {missing_targets} not found in the DataFrame.")
+
+        key = (scheme, n_splits, horizon if scheme == 'rolling' else None, random_state if scheme == 'kfold' else None)
+        if key not in self.cv_folds:
+            if scheme == 'kfold':
+                splits = kfold_splits(len(self.df), n_splits, random_state)
+            else:
+                splits = rolling_origin_splits(transaction_months(self.df), n_splits, horizon)
+            self.cv_folds[key] = prepare_folds(self.df, splits, self.preprocessor, self.target_columns)
+        return self.cv_folds[key]
+
+    def transform(self, df):
+        # Transform new policies with the preprocessor fitted in split_data
+        if self.feature_names is None:
+            raise ValueError("Preprocessor has not been fitted. Call split_data first.")
+        return transform_features(self.preprocessor, df)
+
+    def save_preprocessor(self, path):
+        if self.feature_names is None:
+            raise ValueError("Preprocessor has not been fitted. Call split_data first.")
+        save_preprocessor(self.preprocessor, path)
+
     def get_train_test_data(self):
         if self.X_train is None or self.X_test is None:
             raise ValueError("Data has not been split. Call split_data first.")
         return self.X_train, self.X_test, self.y_train, self.y_test
 
     def get_preprocessed_df(self):
+        if self.feature_names is None:
+            raise ValueError("Preprocessed DataFrame has not been created. Call preprocess_features and split_data first.")
         if self.df_preprocessed is None:
-            raise ValueError("Preprocessed DataFrame has not been created. Call preprocess_features first.")
+            # Sparse-backed DataFrame of all rows, transformed with the train-fitted preprocessor
+            self.df_preprocessed = pd.DataFrame.sparse.from_spmatrix(
+                self.transform(self.df), index=self.df.index, columns=self.feature_names
+            )
         return self.df_preprocessed
 
     def get_dataframe(self):
@@ -1,17 +1,132 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
+import scipy.sparse as sparse
 import shap
-import lime
-import lime.lime_tabular
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.tree import DecisionTreeRegressor
+from sklearn.base import clone
 import xgboost as xgb
 from sklearn.metrics import mean_squared_error, mean_absolute_error
+from model_tuning import hyperband_search
+from model_registry import save_model
+from cross_validation import cross_validate
+from model_explanations import explain_model, explain_rows_lime, permutation_importance
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Interval at which the RSS of a training job is sampled
+RSS_SAMPLE_INTERVAL = 0.005
+
+
+def as_dense_frame(X, feature_names=None):
+    # Dense DataFrame view of a design matrix (sparse CSR, array or DataFrame) for the
+    # explainers, which need dense input
+    if isinstance(X, pd.DataFrame):
+        return X
+    if sparse.issparse(X):
+        X = X.toarray()
+    return pd.DataFrame(X, columns=feature_names)
+
+
+# Train/test data of the running training jobs, per target, set once in each worker
+# process by its initializer instead of being shipped with every job
+_training_data = None
+
+
+def _init_training_worker(datasets):
+    global _training_data
+    _training_data = datasets
+
+
+def _peak_rss_mb():
+    # Peak resident set size of this process so far (native allocations included), in MB;
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if resource is None:
+        return np.nan
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _current_rss_mb():
+    # Resident set size of this process now, in MB (None where /proc is not available)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _PeakRssMonitor:
+    # Peak RSS reached while the block runs, above the RSS at its start, in MB. The RSS
+    # is sampled on a background thread, and the process high-water mark (ru_maxrss)
+    # catches the peaks between samples whenever the block sets a new one, so the peak
+    # is the job's own even after heavier work in the same process. Without /proc only
+    # the high-water mark is available, and a block that stays below an earlier peak of
+    # the process reports 0.
+
+    def __enter__(self):
+        self.start_rss = _current_rss_mb()
+        self.sampled_peak = self.start_rss
+        self.peak_before = _peak_rss_mb()
+        self._stop = threading.Event()
+        self._sampler = None
+        if self.start_rss is not None:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.sampled_peak = max(self.sampled_peak, _current_rss_mb())
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        peak_after = _peak_rss_mb()
+        if self._sampler is None:
+            self.peak_mb = peak_after - self.peak_before
+            return False
+        self._sampler.join()
+        peak = max(self.sampled_peak, _current_rss_mb())
+        if peak_after > self.peak_before:
+            peak = max(peak, peak_after)
+        self.peak_mb = peak - self.start_rss
+        return False
+
+
+def _fit_job(name, target, estimator):
+    # Fit one (model, target) pair on its own estimator and score it on the test split,
+    # recording the wall time and the peak memory of the job (see _PeakRssMonitor)
+    X_train, y_train, X_test, y_test = _training_data[target]
+    with _PeakRssMonitor() as memory:
+        start = time.perf_counter()
+        estimator.fit(X_train, y_train)
+        y_pred = estimator.predict(X_test)
+        wall_time = time.perf_counter() - start
+    return name, target, {
+        'model': estimator,
+        'RMSE': np.sqrt(mean_squared_error(y_test, y_pred)),
+        'MAE': mean_absolute_error(y_test, y_pred),
+        'Wall Time (s)': wall_time,
+        'Peak Memory (MB)': memory.peak_mb
+    }
+
 
 class InsuranceModeling:
     def __init__(self, X_train_premium, X_test_premium, y_train_premium, y_test_premium,
-                 X_train_claims, X_test_claims, y_train_claims, y_test_claims):
+                 X_train_claims, X_test_claims, y_train_claims, y_test_claims,
+                 feature_names_premium=None, feature_names_claims=None, preprocessor=None):
+        # The design matrices can be DataFrames, arrays or sparse CSR matrices; the
+        # feature names label the columns of arrays and sparse matrices. The fitted
+        # preprocessor that produced them is saved with the models (see save_models)
         self.X_train_premium = X_train_premium
         self.X_test_premium = X_test_premium
         self.y_train_premium = y_train_premium
@@ -20,6 +135,9 @@ class InsuranceModeling:
         self.X_test_claims = X_test_claims
         self.y_train_claims = y_train_claims
         self.y_test_claims = y_test_claims
+        self.feature_names_premium = feature_names_premium
+        self.feature_names_claims = feature_names_claims
+        self.preprocessor = preprocessor
         self.models = {
             'Linear Regression': LinearRegression(),
             'Random Forest': RandomForestRegressor(),
@@ -28,88 +146,207 @@ class InsuranceModeling:
         }
         self.results_premium = {}
         self.results_claims = {}
+        # Best parameters per target and model found by tune_models, used by train_models
+        self.tuned_params = {}
+        self.tuning_history = None
+        self.tuning_report = None
+        self.cv_scores = None
+
+    @classmethod
+    def from_data_utils(cls, data_utils, premium_target='TotalPremium', claims_target='TotalClaims'):
+        # Build from a multi-target Future_Engineering.InsuranceDataUtils: both targets
+        # share the same design matrices (no copies) and the same split
+        X_train, X_test, y_train, y_test = data_utils.get_train_test_data()
+        if not isinstance(y_train, pd.DataFrame) or not {premium_target, claims_target} <= set(y_train.columns):
+            raise ValueError(f"The data must be split with target_column=['{premium_target}', '{claims_target}'].")
+        return cls(
+            X_train, X_test, y_train[premium_target], y_test[premium_target],
+            X_train, X_test, y_train[claims_target], y_test[claims_target],
+            feature_names_premium=data_utils.feature_names, feature_names_claims=data_utils.feature_names,
+            preprocessor=data_utils.preprocessor
+        )
     
-    def train_models(self):
+    def train_models(self, n_jobs=None):
+        # Each (model, target) pair is fitted on its own clone of the estimator, so the
+        # premium and claims models are independent. The jobs run concurrently on a process
+        # pool (default one process per core); the estimators themselves are single-threaded
+        # to avoid oversubscribing the cores. n_jobs=1 trains in this process.
+        datasets = {
+            'TotalPremium': (self.X_train_premium, self.y_train_premium, self.X_test_premium, self.y_test_premium),
+            'TotalClaims': (self.X_train_claims, self.y_train_claims, self.X_test_claims, self.y_test_claims)
+        }
+        results = {'TotalPremium': self.results_premium, 'TotalClaims': self.results_claims}
+        jobs = []
         for name, model in self.models.items():
-            print(f"Training {name} for TotalPremium...")
-            model.fit(self.X_train_premium, self.y_train_premium)
-            y_pred_premium = model.predict(self.X_test_premium)
-            self.results_premium[name] = {
-                'model': model,
-                'RMSE': np.sqrt(mean_squared_error(self.y_test_premium, y_pred_premium)),
-                'MAE': mean_absolute_error(self.y_test_premium, y_pred_premium)
-            }
-            
-            print(f"Training {name} for TotalClaims...")
-            model.fit(self.X_train_claims, self.y_train_claims)
-            y_pred_claims = model.predict(self.X_test_claims)
-            self.results_claims[name] = {
-                'model': model,
-                'RMSE': np.sqrt(mean_squared_error(self.y_test_claims, y_pred_claims)),
-                'MAE': mean_absolute_error(self.y_test_claims, y_pred_claims)
-            }
+            for target in datasets:
+                estimator = clone(model).set_params(**self.tuned_params.get(target, {}).get(name, {}))
+                if 'n_jobs' in estimator.get_params():
+                    estimator.set_params(n_jobs=1)
+                jobs.append((name, target, estimator))
+
+        n_jobs = min(n_jobs or os.cpu_count(), len(jobs))
+        if n_jobs == 1:
+            global _training_data
+            previous, _training_data = _training_data, datasets
+            try:
+                for name, target, estimator in jobs:
+                    print(f"Training {name} for {target}...")
+                    _, _, results[target][name] = _fit_job(name, target, estimator)
+            finally:
+                _training_data = previous
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_training_worker,
+                                     initargs=(datasets,)) as executor:
+                futures = [executor.submit(_fit_job, *job) for job in jobs]
+                print(f"Training {len(jobs)} models on {n_jobs} processes...")
+                for future in as_completed(futures):
+                    name, target, result = future.result()
+                    results[target][name] = result
+                    print(f"Trained {name} for {target} in {result['Wall Time (s)']:.1f}s")
+
+        # Keep the results in the order of self.models
+        for target_results in results.values():
+            ordered = {name: target_results[name] for name in self.models}
+            target_results.clear()
+            target_results.update(ordered)
     
+    def tune_models(self, budget_seconds=None, eta=3, n_jobs=None, random_state=0):
+        # Hyperband search (successive halving over growing row subsamples, and growing
+        # boosting rounds with early stopping for XGBoost) of the tree models for both
+        # targets, on a validation split of the training rows, within an optional
+        # wall-clock budget. The best parameters per target and model are then used by
+        # train_models; the elapsed time of the search is kept in self.tuning_report.
+        best, self.tuning_history, self.tuning_report = hyperband_search(
+            self.models,
+            {
+                'TotalPremium': (self.X_train_premium, self.y_train_premium),
+                'TotalClaims': (self.X_train_claims, self.y_train_claims)
+            },
+            budget_seconds=budget_seconds, eta=eta, n_jobs=n_jobs, random_state=random_state
+        )
+        summary = []
+        for target, target_best in best.items():
+            self.tuned_params[target] = {name: result['params'] for name, result in target_best['per_model'].items()}
+            print(f"Best model for {target}: {target_best['model']} (validation RMSE = {target_best['RMSE']:.2f})")
+            print(target_best['params'])
+            for name, result in target_best['per_model'].items():
+                summary.append({'Target': target, 'Model': name, 'Validation RMSE': result['RMSE'],
+                                'Rows': result['n_samples'], 'Best': name == target_best['model'],
+                                'Params': result['params']})
+        return pd.DataFrame(summary)
+
+    def cross_validate(self, folds, targets=None, n_jobs=None):
+        # Cross-validate every model (with its tuned parameters, if any) on folds from
+        # Future_Engineering.InsuranceDataUtils.cross_validation_folds, in parallel over the
+        # folds x models x targets grid (default every target the folds were prepared for).
+        # Keeps the score of every fold in self.cv_scores and returns the mean/std RMSE and
+        # MAE per model and target.
+        if targets is None:
+            targets = list(folds[0]['y_train']) if folds else []
+        summary, self.cv_scores = cross_validate(self.models, folds, list(targets), params=self.tuned_params,
+                                                 n_jobs=n_jobs)
+        for _, row in summary.iterrows():
+            print(f"{row['Model']} ({row['Target']}): RMSE = {row['RMSE Mean']:.2f} +/- {row['RMSE Std']:.2f}, "
+                  f"MAE = {row['MAE Mean']:.2f} +/- {row['MAE Std']:.2f} over {row['Folds']} folds")
+        return summary
+
+    def save_models(self, registry_dir, preprocessor=None, imputer=None, capper=None):
+        # Persist every trained (model, target) pair with its feature transformer and
+        # metadata in the model registry, as '<target>_<model>' (e.g. 'TotalPremium_XGBoost').
+        # The fitted MissingValueImputer and OutlierCapper that cleaned the raw training
+        # data are saved with them, so scoring cleans new policies the same way
+        preprocessor = preprocessor if preprocessor is not None else self.preprocessor
+        if preprocessor is None:
+            raise ValueError("No preprocessor to save the models with. Pass the fitted preprocessor.")
+        if not self.results_premium and not self.results_claims:
+            raise ValueError("Models have not been trained. Call train_models first.")
+        paths = []
+        for target, results in [('TotalPremium', self.results_premium), ('TotalClaims', self.results_claims)]:
+            for name, result in results.items():
+                paths.append(save_model(
+                    registry_dir, f"{target}_{name.replace(' ', '')}", result['model'], preprocessor,
+                    {'target': target, 'model_name': name, 'RMSE': float(result['RMSE']),
+                     'MAE': float(result['MAE']), 'tuned': name in self.tuned_params.get(target, {})},
+                    imputer=imputer, capper=capper
+                ))
+        return paths
+
     def evaluate_models(self):
         print("\nEvaluation for TotalPremium:")
         for name, metrics in self.results_premium.items():
-            print(f"{name}: RMSE = {metrics['RMSE']:.2f}, MAE = {metrics['MAE']:.2f}")
+            print(f"{name}: RMSE = {metrics['RMSE']:.2f}, MAE = {metrics['MAE']:.2f}"
+                  f" ({metrics['Wall Time (s)']:.1f}s, {metrics['Peak Memory (MB)']:.1f} MB)")
         
         print("\nEvaluation for TotalClaims:")
         for name, metrics in self.results_claims.items():
-            print(f"{name}: RMSE = {metrics['RMSE']:.2f}, MAE = {metrics['MAE']:.2f}")
+            print(f"{name}: RMSE = {metrics['RMSE']:.2f}, MAE = {metrics['MAE']:.2f}"
+                  f" ({metrics['Wall Time (s)']:.1f}s, {metrics['Peak Memory (MB)']:.1f} MB)")
     
-    def feature_importance_analysis(self):
-        for name, model in self.models.items():
-            print(f"\nFeature Importance for {name} (TotalPremium):")
-            if hasattr(model, 'feature_importances_'):
-                feature_importances = model.feature_importances_
-                for i, importance in enumerate(feature_importances):
-                    print(f"Feature {i}: {importance:.4f}")
-            else:
-                print("Feature importance not available for this model.")
-            
-            print(f"\nFeature Importance for {name} (TotalClaims):")
-            if hasattr(model, 'feature_importances_'):
-                feature_importances = model.feature_importances_
-                for i, importance in enumerate(feature_importances):
-                    print(f"Feature {i}: {importance:.4f}")
-            else:
-                print("Feature importance not available for this model.")
-
-    def shap_analysis(self, model_name):
-        model_premium = self.results_premium[model_name]['model']
-        model_claims = self.results_claims[model_name]['model']
-        
-        # SHAP analysis for TotalPremium
-        explainer_premium = shap.Explainer(model_premium, self.X_train_premium)
-        shap_values_premium = explainer_premium(self.X_test_premium)
-        shap.summary_plot(shap_values_premium, self.X_test_premium)
-        
-        # SHAP analysis for TotalClaims
-        explainer_claims = shap.Explainer(model_claims, self.X_train_claims)
-        shap_values_claims = explainer_claims(self.X_test_claims)
-        shap.summary_plot(shap_values_claims, self.X_test_claims)
-
-    def lime_analysis(self, model_name):
-        model_premium = self.results_premium[model_name]['model']
-        model_claims = self.results_claims[model_name]['model']
-        
-        # LIME analysis for TotalPremium
-        explainer_premium = lime.lime_tabular.LimeTabularExplainer(
-            training_data=self.X_train_premium.values,
-            feature_names=self.X_train_premium.columns,
-            mode='regression'
-        )
-        for i in range(len(self.X_test_premium)):
-            exp = explainer_premium.explain_instance(self.X_test_premium.iloc[i].values, model_premium.predict)
-            exp.show_in_notebook(show_table=True, show_all=False)
-        
-        # LIME analysis for TotalClaims
-        explainer_claims = lime.lime_tabular.LimeTabularExplainer(
-            training_data=self.X_train_claims.values,
-            feature_names=self.X_train_claims.columns,
-            mode='regression'
-        )
-        for i in range(len(self.X_test_claims)):
-            exp = explainer_claims.explain_instance(self.X_test_claims.iloc[i].values, model_claims.predict)
-            exp.show_in_notebook(show_table=True, show_all=False)
\ No newline at end of file
+    def feature_importance_analysis(self, n_repeats=5, metric='rmse', max_rows=None, n_jobs=None, random_state=0):
+        # Permutation importance of every fitted (model, target) pair on its test split,
+        # with the feature names of the preprocessor: the increase of the test error when
+        # a feature is shuffled, so linear and tree models are comparable. Prints the top
+        # features of each pair and returns the ranked table of all of them.
+        importances = []
+        for target, results, X_test, y_test, feature_names in [
+            ('TotalPremium', self.results_premium, self.X_test_premium, self.y_test_premium,
+             self.feature_names_premium),
+            ('TotalClaims', self.results_claims, self.X_test_claims, self.y_test_claims, self.feature_names_claims)
+        ]:
+            for name, result in results.items():
+                pair_importances = permutation_importance(
+                    result['model'], X_test, y_test, feature_names=feature_names, n_repeats=n_repeats,
+                    metric=metric, max_rows=max_rows, n_jobs=n_jobs, random_state=random_state
+                )
+                print(f"\nPermutation importance for {name} ({target}, baseline {metric.upper()} = "
+                      f"{pair_importances['baseline'].iloc[0]:.2f}):")
+                for row in pair_importances.head(10).itertuples():
+                    print(f"{row.rank:>3}. {row.feature}: {row.importance_mean:.4f} (+/- {row.importance_std:.4f})")
+                pair_importances.insert(0, 'Model', name)
+                pair_importances.insert(0, 'Target', target)
+                importances.append(pair_importances)
+        if not importances:
+            raise ValueError("Models have not been trained. Call train_models first.")
+        return pd.concat(importances, ignore_index=True)
+
+    def shap_analysis(self, model_name, n_samples=2000, n_jobs=None, cache_dir='shap_cache', random_state=0):
+        # SHAP values of a sample of the test rows, stratified on the target: tree models
+        # use the fast TreeExplainer, other models a summarized background of the training
+        # rows. Chunks are explained in parallel and the values cached per model hash in
+        # cache_dir (None disables the cache), so the plots can be redrawn without recomputing.
+        explanations = {}
+        for target, results, X_train, X_test, y_test, feature_names in [
+            ('TotalPremium', self.results_premium, self.X_train_premium, self.X_test_premium,
+             self.y_test_premium, self.feature_names_premium),
+            ('TotalClaims', self.results_claims, self.X_train_claims, self.X_test_claims,
+             self.y_test_claims, self.feature_names_claims)
+        ]:
+            print(f"\nSHAP analysis of {model_name} for {target}:")
+            explanations[target] = explain_model(
+                results[model_name]['model'], X_test, feature_names=feature_names, y=y_test, X_background=X_train,
+                n_samples=n_samples, n_jobs=n_jobs, cache_dir=cache_dir, random_state=random_state
+            )
+            shap.summary_plot(explanations[target].values, as_dense_frame(explanations[target].data, feature_names))
+        return explanations
+
+    def lime_analysis(self, model_name, n_rows=20, strategy='residual', num_features=10, num_samples=5000,
+                      n_jobs=None, random_state=0):
+        # LIME weights of selected test rows of both targets ('residual': the n_rows worst
+        # predicted rows, 'random': a random sample), explained in parallel and returned
+        # as one tidy DataFrame instead of per-row HTML output
+        weights = []
+        for target, results, X_train, X_test, y_test, feature_names in [
+            ('TotalPremium', self.results_premium, self.X_train_premium, self.X_test_premium,
+             self.y_test_premium, self.feature_names_premium),
+            ('TotalClaims', self.results_claims, self.X_train_claims, self.X_test_claims,
+             self.y_test_claims, self.feature_names_claims)
+        ]:
+            print(f"\nLIME analysis of {model_name} for {target}:")
+            target_weights = explain_rows_lime(
+                results[model_name]['model'], X_test, X_train, feature_names=feature_names, y=y_test,
+                n_rows=n_rows, strategy=strategy, num_features=num_features, num_samples=num_samples,
+                n_jobs=n_jobs, random_state=random_state
+            )
+            target_weights.insert(0, 'Target', target)
+            weights.append(target_weights)
+        return pd.concat(weights, ignore_index=True)
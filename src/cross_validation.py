@@ -0,0 +1,139 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sklearn.model_selection import KFold
+
+from date_dimension import date_features
+
+CV_SCHEMES = ('kfold', 'rolling')
+
+# Transformed folds of the running cross-validation, set once in each worker process by
+# its initializer instead of being shipped with every (fold, model, target) job
+_cv_data = None
+
+
+def _init_cv_worker(folds):
+    global _cv_data
+    _cv_data = folds
+
+
+def kfold_splits(n_rows, n_splits=5, random_state=42):
+    # Shuffled K-fold row positions, as (train, test) pairs
+    return list(KFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(np.arange(n_rows)))
+
+
+def transaction_months(df, column='TransactionMonth'):
+    # Month index (year * 12 + month - 1) of every row, from the transaction date or, when
+    # only the engineered features are left, from TransactionYear and TransactionMonthOnly.
+    # Rows without a date get NaN.
+    if column in df.columns:
+        dates = date_features(df, column, ['Year', 'Month'])
+        year, month = dates['Year'], dates['Month']
+    elif {'TransactionYear', 'TransactionMonthOnly'} <= set(df.columns):
+        year, month = df['TransactionYear'], df['TransactionMonthOnly']
+    else:
+        raise ValueError(f"DataFrame must contain a '{column}' column or 'TransactionYear' and "
+                         f"'TransactionMonthOnly' columns.")
+    return year.to_numpy(dtype='float64') * 12 + month.to_numpy(dtype='float64') - 1
+
+
+def rolling_origin_splits(months, n_splits=5, horizon=1):
+    # Rolling-origin (expanding window) splits over transaction months: fold k tests on the
+    # k-th of the last n_splits windows of `horizon` months and trains on every earlier
+    # month, so no fold is trained on the future of its test window
+    months = np.asarray(months, dtype='float64')
+    unique = np.unique(months[~np.isnan(months)])
+    if len(unique) < n_splits * horizon + 1:
+        raise ValueError(f"{len(unique)} months are too few for {n_splits} windows of {horizon} month(s) "
+                         f"and at least one training month.")
+    splits = []
+    for k in range(n_splits):
+        start = len(unique) - (n_splits - k) * horizon
+        first, last = unique[start], unique[start + horizon - 1]
+        splits.append((np.flatnonzero(months < first), np.flatnonzero((months >= first) & (months <= last))))
+    return splits
+
+
+def prepare_folds(df, splits, preprocessor, target_columns):
+    # Fit a clone of the (unfitted) preprocessor on the training rows of every fold and
+    # transform its rows once; the folds are then shared by every model of the grid
+    folds = []
+    for fold, (train, test) in enumerate(splits, start=1):
+        train_df, test_df = df.iloc[train], df.iloc[test]
+        fold_preprocessor = clone(preprocessor)
+        folds.append({
+            'fold': fold,
+            'preprocessor': fold_preprocessor,
+            'X_train': sparse.csr_matrix(fold_preprocessor.fit_transform(train_df)),
+            'X_test': sparse.csr_matrix(fold_preprocessor.transform(test_df)),
+            'y_train': {target: train_df[target].to_numpy(dtype='float64') for target in target_columns},
+            'y_test': {target: test_df[target].to_numpy(dtype='float64') for target in target_columns}
+        })
+        print(f"Fold {fold}: {len(train)} training rows, {len(test)} test rows")
+    return folds
+
+
+def _cv_job(fold, name, target, estimator):
+    data = _cv_data[fold]
+    start = time.perf_counter()
+    estimator.fit(data['X_train'], data['y_train'][target])
+    y_pred = estimator.predict(data['X_test'])
+    return {
+        'Fold': data['fold'], 'Model': name, 'Target': target,
+        'RMSE': np.sqrt(mean_squared_error(data['y_test'][target], y_pred)),
+        'MAE': mean_absolute_error(data['y_test'][target], y_pred),
+        'Wall Time (s)': time.perf_counter() - start
+    }
+
+
+def cross_validate(models, folds, targets, params=None, n_jobs=None):
+    # Fit and score every (fold, model, target) on its own clone of the estimator, on a
+    # process pool (default one process per core; the estimators are single-threaded,
+    # n_jobs=1 runs in this process). params holds optional parameters per target and
+    # model (e.g. InsuranceModeling.tuned_params).
+    # Returns the mean/std RMSE and MAE per model and target, and the score of every fold.
+    params = params or {}
+    missing = [target for target in targets if any(target not in fold['y_train'] for fold in folds)]
+    if missing:
+        raise ValueError(f"Targets {missing} are not in the folds, which were prepared for "
+                         f"{list(folds[0]['y_train']) if folds else []}.")
+    shared = [{key: fold[key] for key in ('fold', 'X_train', 'X_test', 'y_train', 'y_test')} for fold in folds]
+    jobs = []
+    for i in range(len(folds)):
+        for name, model in models.items():
+            for target in targets:
+                estimator = clone(model).set_params(**params.get(target, {}).get(name, {}))
+                if 'n_jobs' in estimator.get_params():
+                    estimator.set_params(n_jobs=1)
+                jobs.append((i, name, target, estimator))
+
+    n_jobs = min(n_jobs or os.cpu_count(), len(jobs))
+    print(f"Cross-validating {len(models)} models x {len(targets)} targets on {len(folds)} folds "
+          f"({len(jobs)} fits, {n_jobs} processes)...")
+    if n_jobs == 1:
+        global _cv_data
+        previous, _cv_data = _cv_data, shared
+        try:
+            scores = [_cv_job(*job) for job in jobs]
+        finally:
+            _cv_data = previous
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_cv_worker, initargs=(shared,)) as executor:
+            scores = [future.result() for future in as_completed([executor.submit(_cv_job, *job) for job in jobs])]
+
+    # Order by target and model as given, then by fold
+    scores = pd.DataFrame(scores)
+    order = (scores['Target'].map({target: i for i, target in enumerate(targets)}) * len(models)
+             + scores['Model'].map({name: i for i, name in enumerate(models)}))
+    scores = scores.iloc[np.lexsort((scores['Fold'], order))].reset_index(drop=True)
+    summary = scores.groupby(['Target', 'Model'], sort=False).agg(
+        **{'RMSE Mean': ('RMSE', 'mean'), 'RMSE Std': ('RMSE', 'std'),
+           'MAE Mean': ('MAE', 'mean'), 'MAE Std': ('MAE', 'std'), 'Folds': ('Fold', 'count')}
+    ).reset_index()
+    return summary, scores
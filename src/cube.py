@@ -0,0 +1,135 @@
+# src/cube.py
+import numpy as np
+import pandas as pd
+
+from date_dimension import date_features
+
+CUBE_DIMENSIONS = ['Province', 'PostalCode', 'Gender', 'CoverType', 'TransactionMonth']
+CUBE_MEASURES = ['TotalPremium', 'TotalClaims', 'Margin']
+
+
+class InsuranceCube:
+    """
+    Pre-aggregated OLAP cube of the policy transactions.
+
+    The cube stores, for every observed combination of the dimensions
+    (Province x PostalCode x Gender x CoverType x month by default), the row count and,
+    for premium, claims and margin, the count of non-missing values, their sum and their
+    sum of squares. Group-level queries
+    (means, variances, totals and counts by any subset of the dimensions) are then
+    answered by rolling these cells up instead of rescanning the rows.
+    """
+
+    def __init__(self, cells: pd.DataFrame, dimensions: list, measures: list):
+        """
+        Use InsuranceCube.build (or InsuranceCube.load) to create a cube.
+
+        :param cells: One row per dimension combination with 'count', '<measure>_count',
+                      '<measure>_sum' and '<measure>_sumsq' columns
+        :param dimensions: Dimension columns of the cells
+        :param measures: Aggregated measures
+        """
+        self.cells = cells
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, dimensions=None, measures=None) -> "InsuranceCube":
+        """
+        Builds the cube with one scan of the DataFrame.
+
+        TransactionMonth is truncated to month-end dates and Margin is derived as
+        TotalPremium - TotalClaims when it is not a column of `df`. Dimensions that are
+        not columns of `df` are skipped when `dimensions` is not given.
+
+        :param df: DataFrame with the dimension and measure columns
+        :param dimensions: Dimension columns (default CUBE_DIMENSIONS present in df)
+        :param measures: Measure columns (default CUBE_MEASURES)
+        :return: The built cube
+        """
+        if dimensions is None:
+            dimensions = [dim for dim in CUBE_DIMENSIONS if dim in df.columns]
+        measures = list(measures or CUBE_MEASURES)
+
+        missing = [dim for dim in dimensions if dim not in df.columns]
+        if missing:
+            raise ValueError(f"Dimension columns {missing} are missing from the DataFrame.")
+
+        keys = {}
+        for dim in dimensions:
+            if dim == 'TransactionMonth':
+                keys[dim] = date_features(df, dim, ['MonthEnd'])['MonthEnd']
+            elif isinstance(df[dim].dtype, pd.CategoricalDtype):
+                keys[dim] = df[dim]
+            else:
+                keys[dim] = df[dim].astype('category')
+
+        values = {}
+        for measure in measures:
+            if measure in df.columns:
+                values[measure] = df[measure].astype('float64')
+            elif measure == 'Margin':
+                values[measure] = df['TotalPremium'].astype('float64') - df['TotalClaims'].astype('float64')
+            else:
+                raise ValueError(f"Measure column '{measure}' is missing from the DataFrame.")
+
+        frame = pd.DataFrame({'count': np.ones(len(df), dtype='int64')}, index=df.index)
+        for measure, series in values.items():
+            # Missing values are left out of the sums, so each measure keeps its own count
+            frame[f"{measure}_count"] = series.notna().astype('int64')
+            frame[f"{measure}_sum"] = series
+            frame[f"{measure}_sumsq"] = series ** 2
+
+        grouped = frame.groupby([keys[dim].rename(dim) for dim in dimensions], observed=True, dropna=False)
+        cells = grouped.sum().reset_index()
+        return cls(cells, dimensions, measures)
+
+    def rollup(self, dimensions) -> pd.DataFrame:
+        """
+        Rolls the cube up to a subset of its dimensions.
+
+        :param dimensions: Dimension name or list of dimension names to group by
+                           (an empty list gives the grand total)
+        :return: DataFrame indexed by the dimensions with the row 'count' and, per measure,
+                 '_count' (non-missing values), '_sum', '_sumsq', '_mean' and '_var'
+                 (sample variance, ddof=1) columns
+        """
+        if isinstance(dimensions, str):
+            dimensions = [dimensions]
+        unknown = [dim for dim in dimensions if dim not in self.dimensions]
+        if unknown:
+            raise ValueError(f"Dimensions {unknown} are not in the cube {self.dimensions}.")
+
+        sums = self.cells.drop(columns=self.dimensions)
+        if dimensions:
+            totals = sums.groupby([self.cells[dim] for dim in dimensions], observed=True).sum()
+        else:
+            totals = sums.sum().to_frame().T
+
+        for measure in self.measures:
+            count = totals[f"{measure}_count"]
+            mean = totals[f"{measure}_sum"] / count
+            totals[f"{measure}_mean"] = mean
+            totals[f"{measure}_var"] = ((totals[f"{measure}_sumsq"] - count * mean ** 2) / (count - 1)).clip(lower=0)
+        return totals
+
+    def save(self, path: str):
+        """
+        Saves the cube cells to a Parquet file.
+        """
+        self.cells.to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path: str) -> "InsuranceCube":
+        """
+        Loads a cube saved with InsuranceCube.save.
+        """
+        cells = pd.read_parquet(path)
+        measures = [col[:-len('_sum')] for col in cells.columns if col.endswith('_sum')]
+        aggregates = {'count'} | {f"{measure}_{stat}" for measure in measures for stat in ('count', 'sum', 'sumsq')}
+        dimensions = [col for col in cells.columns if col not in aggregates]
+        # Cubes saved before the per-measure counts were stored had complete measures only
+        for measure in measures:
+            if f"{measure}_count" not in cells.columns:
+                cells[f"{measure}_count"] = cells['count']
+        return cls(cells, dimensions, measures)
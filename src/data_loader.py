@@ -1,28 +1,324 @@
 # src/data_loader.py
-# 
+#
+import hashlib
+import json
+import os
+
+import numpy as np
 import pandas as pd
 
-def load_data(txt_file_path: str, delimiter: str = "\t"):
+# Declared dtypes for the known MachineLearningRating_v3 columns. Columns that are
+# not listed here keep the dtype pandas infers for them.
+CATEGORICAL_COLUMNS = ['Province', 'PostalCode', 'Gender', 'CoverType', 'make']
+DATE_COLUMNS = ['TransactionMonth']
+MONEY_COLUMNS = [
+    'TotalPremium', 'TotalClaims', 'SumInsured', 'CalculatedPremiumPerTerm',
+    'CustomValueEstimate', 'CapitalOutstanding'
+]
+# Money columns that contain malformed values in the raw extract and therefore have to
+# be coerced after parsing instead of being typed by the CSV parser.
+COERCED_MONEY_COLUMNS = ['CapitalOutstanding']
+
+SCHEMA = {
+    **{col: 'category' for col in CATEGORICAL_COLUMNS},
+    **{col: 'float32' for col in MONEY_COLUMNS if col not in COERCED_MONEY_COLUMNS},
+}
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Bump whenever SCHEMA or apply_schema changes so existing columnar caches are rebuilt.
+SCHEMA_VERSION = 1
+CACHE_FORMATS = ('parquet', 'feather')
+
+# Columns written to the memory-mapped store shared by worker processes.
+SHARED_NUMERIC_COLUMNS = ['TotalPremium', 'TotalClaims', 'SumInsured', 'CapitalOutstanding', 'RegistrationYear']
+SHARED_MANIFEST = 'manifest.json'
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Applies the parts of the schema the CSV parser cannot handle itself: parses the
+    date columns and coerces the malformed money columns to float32.
+
+    :param df: DataFrame (or chunk) read with the declared dtypes
+    :return: The same DataFrame with the date and coerced columns converted
+    """
+    for col in DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col in COERCED_MONEY_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    return df
+
+
+def load_data(txt_file_path: str, delimiter: str = "|", chunksize: int = None, usecols=None):
+    """
+    Loads data from a .txt file and converts it to a pandas DataFrame typed with the
+    declared schema (categorical codes, parsed dates and float32 money columns).
+
+    When `chunksize` is given the file is streamed instead: an iterator is returned that
+    yields typed DataFrames of at most `chunksize` rows, so the memory used is bounded
+    by the chunk size rather than by the size of the file. The categorical columns are
+    scanned first, so every chunk has the same categories as a full load of the file.
+
+    :param txt_file_path: Path to the .txt file
+    :param delimiter: Delimiter used in the .txt file (default is pipe-separated)
+    :param chunksize: Number of rows per chunk; None loads the whole file at once
+    :param usecols: Optional subset of columns to read
+    :return: DataFrame containing the data from the .txt file, or an iterator of
+             DataFrames when `chunksize` is given
+    """
+    dtype = SCHEMA
+    if chunksize is not None:
+        dtype = {**SCHEMA, **_file_categories(txt_file_path, delimiter, chunksize, usecols)}
+    reader = pd.read_csv(
+        txt_file_path,
+        delimiter=delimiter,
+        encoding='utf-8',
+        dtype=dtype,
+        usecols=usecols,
+        chunksize=chunksize,
+        low_memory=False
+    )
+    if chunksize is None:
+        return apply_schema(reader)
+    return _typed_chunks(reader)
+
+
+def _file_categories(txt_file_path: str, delimiter: str, chunksize: int, usecols=None) -> dict:
+    # Categories of the categorical columns over the whole file, read in chunks of those
+    # columns only, as the sorted dtype a full load would give them
+    header = pd.read_csv(txt_file_path, delimiter=delimiter, encoding='utf-8', nrows=0).columns
+    columns = [col for col in CATEGORICAL_COLUMNS if col in header and (usecols is None or col in usecols)]
+    if not columns:
+        return {}
+    categories = {col: set() for col in columns}
+    with pd.read_csv(txt_file_path, delimiter=delimiter, encoding='utf-8', usecols=columns,
+                     dtype={col: 'category' for col in columns}, chunksize=chunksize) as reader:
+        for chunk in reader:
+            for col in columns:
+                categories[col].update(chunk[col].cat.categories)
+    return {col: pd.CategoricalDtype(sorted(values)) for col, values in categories.items()}
+
+
+def _typed_chunks(reader):
+    with reader:
+        for chunk in reader:
+            yield apply_schema(chunk)
+
+
+def fingerprint_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Computes a content hash of a file, combined with the schema version.
+
+    :param file_path: Path to the file to hash
+    :param block_size: Number of bytes read per block
+    :return: Hex digest identifying the file contents and the schema they are read with
     """
-    Loads data from a .txt file and converts it to a pandas DataFrame.
-    
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"schema-v{SCHEMA_VERSION}".encode())
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_cached_data(txt_file_path: str, cache_dir: str = None, delimiter: str = "|",
+                     file_format: str = 'parquet'):
+    """
+    Loads the typed DataFrame through a columnar (Parquet/Feather) cache.
+
+    The cache file is keyed by the content hash of the .txt file and the schema version,
+    so repeated loads are a binary read and the cache is rebuilt automatically whenever
+    the raw file (or the schema) changes. Stale cache files of the same source are removed.
+    The content hash is returned in `df.attrs['source_fingerprint']`, so callers can key
+    their own caches on it without hashing the frame (see `eda.profile_data`).
+
     :param txt_file_path: Path to the .txt file
-    :param delimiter: Delimiter used in the .txt file (default is tab-separated)
+    :param cache_dir: Directory holding the cache files (default is a `.cache` directory
+                      next to the .txt file)
+    :param delimiter: Delimiter used in the .txt file
+    :param file_format: 'parquet' or 'feather'
     :return: DataFrame containing the data from the .txt file
     """
-    df = pd.read_csv(txt_file_path, delimiter='|', encoding='utf-8', low_memory=False)
+    if file_format not in CACHE_FORMATS:
+        raise ValueError(f"file_format must be one of {CACHE_FORMATS}, got '{file_format}'.")
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(txt_file_path)), '.cache')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    stem = os.path.splitext(os.path.basename(txt_file_path))[0]
+    fingerprint = fingerprint_file(txt_file_path)
+    cache_path = os.path.join(cache_dir, f"{stem}.{fingerprint}.{file_format}")
+
+    if os.path.exists(cache_path):
+        print(f"Loading cached data from {cache_path}")
+        df = pd.read_parquet(cache_path) if file_format == 'parquet' else pd.read_feather(cache_path)
+        df.attrs['source_fingerprint'] = fingerprint
+        return df
+
+    df = load_data(txt_file_path, delimiter=delimiter)
+
+    # Write to a temporary file first so an interrupted write never leaves a valid-looking cache
+    tmp_path = cache_path + '.tmp'
+    if file_format == 'parquet':
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+    prefix, suffix = f"{stem}.", f".{file_format}"
+    for name in os.listdir(cache_dir):
+        stale_path = os.path.join(cache_dir, name)
+        is_cache_of_source = (
+            name.startswith(prefix) and name.endswith(suffix)
+            and len(name) == len(prefix) + 32 + len(suffix)
+        )
+        if is_cache_of_source and stale_path != cache_path:
+            os.remove(stale_path)
+
+    print(f"Cache written to {cache_path}")
+    df.attrs['source_fingerprint'] = fingerprint
     return df
 
+
+def write_shared_columns(df: pd.DataFrame, store_dir: str, numeric_columns=None,
+                         categorical_columns=None) -> str:
+    """
+    Writes numeric columns and categorical codes into a memory-mapped on-disk store
+    (one .npy file per column plus a JSON manifest), so worker processes can attach to
+    the same page-cache copy with `attach_shared_columns` instead of each receiving a
+    pickled copy of the DataFrame.
+
+    :param df: DataFrame to export
+    :param store_dir: Directory of the store (created if needed)
+    :param numeric_columns: Numeric columns to store (default SHARED_NUMERIC_COLUMNS)
+    :param categorical_columns: Columns stored as integer category codes
+                                (default CATEGORICAL_COLUMNS)
+    :return: Path to the manifest of the store
+    """
+    if numeric_columns is None:
+        numeric_columns = [col for col in SHARED_NUMERIC_COLUMNS if col in df.columns]
+    if categorical_columns is None:
+        categorical_columns = [col for col in CATEGORICAL_COLUMNS if col in df.columns]
+
+    missing = [col for col in list(numeric_columns) + list(categorical_columns) if col not in df.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} are missing from the DataFrame.")
+
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = {'n_rows': len(df), 'columns': {}}
+
+    for col in numeric_columns:
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            values = pd.to_numeric(values, errors='coerce').astype('float32')
+        _write_column(store_dir, col, values.to_numpy())
+        manifest['columns'][col] = {'kind': 'numeric', 'dtype': str(values.dtype)}
+
+    for col in categorical_columns:
+        values = df[col]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        codes = values.cat.codes.to_numpy()
+        _write_column(store_dir, col, codes)
+        manifest['columns'][col] = {
+            'kind': 'categorical',
+            'dtype': str(codes.dtype),
+            'categories': [c if isinstance(c, (int, float, str)) else str(c)
+                           for c in values.cat.categories.tolist()]
+        }
+
+    # The manifest is written last, so a store is only visible to workers once complete
+    manifest_path = os.path.join(store_dir, SHARED_MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    print(f"Shared column store written to {store_dir}")
+    return manifest_path
+
+
+def _write_column(store_dir: str, col: str, values: np.ndarray):
+    array = np.lib.format.open_memmap(
+        os.path.join(store_dir, f"{col}.npy"), mode='w+', dtype=values.dtype, shape=values.shape
+    )
+    array[:] = values
+    array.flush()
+    del array
+
+
+def attach_shared_columns(store_dir: str, columns=None) -> dict:
+    """
+    Attaches to a store written by `write_shared_columns` without copying the data.
+
+    The returned arrays are read-only memory maps, so any number of processes attaching
+    to the same store share a single page-cache copy of it. Categorical columns are
+    returned as their integer codes (-1 marks missing values); use
+    `shared_column_categories` to map them back to labels.
+
+    :param store_dir: Directory of the store
+    :param columns: Optional subset of columns to attach
+    :return: Dictionary mapping column names to read-only numpy memory maps
+    :raises ValueError: If a column is not in the store, or its file does not match the manifest
+    """
+    manifest = _read_manifest(store_dir)
+    if columns is None:
+        columns = list(manifest['columns'])
+    missing = [col for col in columns if col not in manifest['columns']]
+    if missing:
+        raise ValueError(f"Columns {missing} are not in the shared store at {store_dir}.")
+
+    arrays = {}
+    for col in columns:
+        path = os.path.join(store_dir, f"{col}.npy")
+        if not os.path.exists(path):
+            raise ValueError(f"Column '{col}' is in the manifest but its file {path} is missing.")
+        array = np.load(path, mmap_mode='r')
+        expected = manifest['columns'][col]['dtype']
+        if array.shape != (manifest['n_rows'],) or str(array.dtype) != expected:
+            raise ValueError(
+                f"Column '{col}' of the shared store at {store_dir} does not match its manifest: "
+                f"expected {manifest['n_rows']} values of {expected}, found shape {array.shape} of {array.dtype}."
+            )
+        arrays[col] = array
+    return arrays
+
+
+def shared_column_categories(store_dir: str) -> dict:
+    """
+    Returns the categories of the categorical columns of a shared store.
+
+    :param store_dir: Directory of the store
+    :return: Dictionary mapping column names to pandas Index of categories
+    """
+    manifest = _read_manifest(store_dir)
+    return {
+        col: pd.Index(info['categories'])
+        for col, info in manifest['columns'].items()
+        if info['kind'] == 'categorical'
+    }
+
+
+def _read_manifest(store_dir: str) -> dict:
+    manifest_path = os.path.join(store_dir, SHARED_MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No shared column store found at {store_dir}.")
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
 def save_to_csv(df, csv_file_path: str):
     """
     Saves the DataFrame to a CSV file.
-    
+
     :param df: DataFrame to be saved
     :param csv_file_path: Path to the output .csv file
     """
     df=df.to_csv(csv_file_path, index=False)
     # df = pd.read_csv(csv_file_path, low_memory=False)
     print(f"File saved to {csv_file_path}")
-    
 
-    
\ No newline at end of file
+
+
@@ -1,5 +1,300 @@
+import os
+
 import pandas as pd
 import numpy as np
+
+
+class MissingValueImputer:
+    """
+    Fit/transform imputer used by `handle_missing_values`.
+
+    `fit` computes, in one vectorized pass over the frame, the null fraction of every
+    column, the mode of the categorical columns and the mean, median and skewness of the
+    numerical columns (any numeric dtype, including float32/int32). `transform` drops the
+    columns above the missing-value threshold and fills the remaining gaps in a single
+    `fillna` call, so the fitted statistics can be reused on new monthly batches
+    without refitting.
+
+    Parameters:
+        threshold (float): Columns with a larger fraction of missing values are dropped.
+        skew_threshold (float): Numerical columns with an absolute skewness above this
+            value are filled with the median, the others with the mean.
+    """
+
+    def __init__(self, threshold: float = 0.5, skew_threshold: float = 1.0):
+        self.threshold = threshold
+        self.skew_threshold = skew_threshold
+        self.statistics_ = None
+        self.columns_to_drop_ = None
+        self.fill_values_ = None
+        self._partial_state = None
+
+    def fit(self, df: pd.DataFrame) -> "MissingValueImputer":
+        """
+        Computes the per-column statistics and fill values.
+
+        Parameters:
+            df (pd.DataFrame): The input dataset.
+
+        Returns:
+            MissingValueImputer: The fitted imputer.
+        """
+        null_fraction = df.isna().mean()
+        kept = df.columns[~self._drop_mask(null_fraction).to_numpy()]
+        numerical_columns = [col for col in kept if _is_numerical(df[col])]
+        categorical_columns = [col for col in kept if _is_categorical(df[col])]
+
+        numerical_stats = None
+        if numerical_columns:
+            count, mean, m2, m3 = _numerical_moments(df[numerical_columns])
+            values = df[numerical_columns].to_numpy(dtype='float64', na_value=np.nan)
+            median = np.full(len(numerical_columns), np.nan)
+            has_values = count > 0
+            if has_values.any():
+                median[has_values] = np.nanmedian(values[:, has_values], axis=0)
+            numerical_stats = pd.DataFrame(
+                {'mean': mean, 'median': median, 'skewness': _skewness(count, m2, m3)},
+                index=numerical_columns
+            )
+        modes = {col: _column_mode(df[col]) for col in categorical_columns}
+        integer_columns = [col for col in numerical_columns if pd.api.types.is_integer_dtype(df[col])]
+
+        self._finalize(null_fraction, numerical_stats, modes, integer_columns)
+        return self
+
+    def partial_fit(self, chunk: pd.DataFrame) -> "MissingValueImputer":
+        """
+        Accumulates the statistics of one chunk, for input that does not fit in memory.
+
+        Null fractions, modes, means and skewness are exact (moments are merged across
+        chunks); medians are estimated with a `QuantileSketch` per column. The fill values
+        are refreshed after every chunk, so the imputer can be used at any point.
+
+        Parameters:
+            chunk (pd.DataFrame): Next chunk of the dataset.
+
+        Returns:
+            MissingValueImputer: The updated imputer.
+        """
+        state = self._partial_state
+        if state is None:
+            state = self._partial_state = {
+                'n_rows': 0,
+                'null_counts': pd.Series(0, index=chunk.columns, dtype='int64'),
+                # A column that is all missing in a chunk reads as float whatever it holds,
+                # so its kind is decided by the first chunk in which it has a value
+                'undecided': list(chunk.columns),
+                'numerical_columns': [],
+                'categorical_columns': [],
+                'integer_columns': [],
+                'moments': None,
+                'sketches': {},
+                'value_counts': {},
+            }
+
+        state['n_rows'] += len(chunk)
+        state['null_counts'] = state['null_counts'].add(chunk.isna().sum(), fill_value=0)
+        decided = [col for col in state['undecided'] if chunk[col].notna().any()]
+        if decided:
+            self._decide_column_kinds(chunk, decided)
+
+        numerical_columns = state['numerical_columns']
+        if numerical_columns:
+            numbers = chunk[numerical_columns].apply(pd.to_numeric, errors='coerce')
+            moments = _numerical_moments(numbers)
+            state['moments'] = moments if state['moments'] is None else _merge_moments(state['moments'], moments)
+            for col in numerical_columns:
+                state['sketches'][col].update(numbers[col].to_numpy(dtype='float64', na_value=np.nan))
+
+        for col in state['categorical_columns']:
+            counts = chunk[col].value_counts(sort=False)
+            previous = state['value_counts'].get(col)
+            state['value_counts'][col] = counts if previous is None else previous.add(counts, fill_value=0)
+
+        null_fraction = state['null_counts'] / state['n_rows']
+        kept = set(null_fraction.index[~self._drop_mask(null_fraction).to_numpy()])
+
+        numerical_stats = None
+        if numerical_columns:
+            count, mean, m2, m3 = state['moments']
+            numerical_stats = pd.DataFrame({
+                'mean': mean,
+                'median': [state['sketches'][col].quantile(0.5) for col in numerical_columns],
+                'skewness': _skewness(count, m2, m3)
+            }, index=numerical_columns).loc[[col for col in numerical_columns if col in kept]]
+        modes = {
+            col: _mode_from_counts(state['value_counts'][col])
+            for col in state['categorical_columns'] if col in kept
+        }
+
+        self._finalize(null_fraction, numerical_stats, modes, state['integer_columns'])
+        return self
+
+    def _decide_column_kinds(self, chunk: pd.DataFrame, columns: list):
+        # Classifies columns seen with a value for the first time. The moments of a new
+        # numerical column start empty, since every earlier chunk had it all missing
+        state = self._partial_state
+        order = list(state['null_counts'].index)
+        new_numerical = [col for col in columns if _is_numerical(chunk[col])]
+        numerical_columns = [col for col in order if col in state['numerical_columns'] or col in new_numerical]
+        if state['moments'] is not None and new_numerical:
+            position = {col: i for i, col in enumerate(state['numerical_columns'])}
+            index = np.array([position.get(col, -1) for col in numerical_columns])
+            state['moments'] = tuple(
+                np.where(index >= 0, moment[index], empty)
+                for moment, empty in zip(state['moments'], (0, np.nan, 0.0, 0.0))
+            )
+        state['numerical_columns'] = numerical_columns
+        state['integer_columns'] = [
+            col for col in numerical_columns
+            if col in state['integer_columns'] or (col in new_numerical and pd.api.types.is_integer_dtype(chunk[col]))
+        ]
+        state['categorical_columns'] = [
+            col for col in order
+            if col in state['categorical_columns'] or (col in columns and _is_categorical(chunk[col]))
+        ]
+        state['sketches'].update({col: QuantileSketch() for col in new_numerical})
+        state['undecided'] = [col for col in state['undecided'] if col not in columns]
+
+    def _drop_mask(self, null_fraction: pd.Series) -> pd.Series:
+        # Columns with 100% missing values are always dropped, whatever the threshold
+        return (null_fraction > self.threshold) | (null_fraction == 1.0)
+
+    def _finalize(self, null_fraction: pd.Series, numerical_stats, modes: dict, integer_columns: list):
+        self.columns_to_drop_ = list(null_fraction.index[self._drop_mask(null_fraction).to_numpy()])
+        numerical_columns = [] if numerical_stats is None else list(numerical_stats.index)
+        categorical_columns = list(modes)
+
+        statistics = pd.DataFrame(
+            index=pd.Index(numerical_columns + categorical_columns),
+            columns=['null_fraction', 'mode', 'mean', 'median', 'skewness'],
+            dtype=object
+        )
+        statistics['null_fraction'] = null_fraction
+        if numerical_columns:
+            for stat in ['mean', 'median', 'skewness']:
+                statistics.loc[numerical_columns, stat] = numerical_stats[stat]
+        if categorical_columns:
+            statistics.loc[categorical_columns, 'mode'] = pd.Series(modes, dtype=object)
+        self.statistics_ = statistics
+
+        fill_values = {}
+        for col in numerical_columns:
+            use_median = abs(statistics.at[col, 'skewness']) > self.skew_threshold
+            value = statistics.at[col, 'median' if use_median else 'mean']
+            if col in integer_columns and not pd.isna(value):
+                value = round(value)
+            fill_values[col] = value
+        for col in categorical_columns:
+            fill_values[col] = statistics.at[col, 'mode']
+        self.fill_values_ = {col: value for col, value in fill_values.items() if not pd.isna(value)}
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Drops the high-missing columns and fills missing values with the fitted statistics.
+
+        Parameters:
+            df (pd.DataFrame): Dataset to impute (the fitted one or a new batch).
+
+        Returns:
+            pd.DataFrame: Dataset with handled missing values.
+        """
+        if self.fill_values_ is None:
+            raise ValueError("The imputer has not been fitted. Call fit first.")
+
+        df = df.drop(columns=[col for col in self.columns_to_drop_ if col in df.columns])
+        fill_values = {col: value for col, value in self.fill_values_.items() if col in df.columns}
+
+        # A new batch may not contain the fitted mode among its categories
+        for col, value in fill_values.items():
+            if isinstance(df[col].dtype, pd.CategoricalDtype) and value not in df[col].cat.categories:
+                df[col] = df[col].cat.add_categories([value])
+
+        return df.fillna(value=fill_values)
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+
+def _is_numerical(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _is_categorical(series: pd.Series) -> bool:
+    return (
+        isinstance(series.dtype, pd.CategoricalDtype)
+        or pd.api.types.is_object_dtype(series)
+        or pd.api.types.is_string_dtype(series)
+        or pd.api.types.is_bool_dtype(series)
+    )
+
+
+def _numerical_moments(df: pd.DataFrame):
+    """
+    Count, mean and the sums of squared and cubed deviations of every column, computed
+    on a single float64 block instead of one scan per column and statistic.
+    """
+    values = df.to_numpy(dtype='float64', na_value=np.nan)
+    observed = ~np.isnan(values)
+    count = observed.sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(values, axis=0) / count
+        deviations = np.where(observed, values - mean, 0.0)
+    return count, mean, (deviations ** 2).sum(axis=0), (deviations ** 3).sum(axis=0)
+
+
+def _merge_moments(a, b):
+    """
+    Combines the moments of two chunks (pairwise update of Chan et al. / Pebay).
+    """
+    n_a, mean_a, m2_a, m3_a = a
+    n_b, mean_b, m2_b, m3_b = b
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = np.where(n_b > 0, mean_b - np.where(n_a > 0, mean_a, 0.0), 0.0)
+        mean = np.where(n_a > 0, mean_a, 0.0) + delta * n_b / n
+        m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+        m3 = (m3_a + m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+              + 3 * delta * (n_a * m2_b - n_b * m2_a) / n)
+    return n, mean, m2, m3
+
+
+def _skewness(count, m2, m3):
+    """
+    Bias-corrected skewness (as `Series.skew`) from the moments of `_numerical_moments`.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        skewness = np.sqrt(count * (count - 1)) / (count - 2) * (m3 / count) / (m2 / count) ** 1.5
+    return np.where(count < 3, np.nan, np.where(m2 == 0, 0.0, skewness))
+
+
+def _column_mode(series: pd.Series):
+    """
+    Most frequent value of a column (smallest value on ties, as `Series.mode`), counted
+    with a hash table or, for categoricals, a bincount over the codes instead of a sort.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+        if counts.sum() == 0:
+            return np.nan
+        return series.cat.categories[np.argmax(counts)]
+
+    return _mode_from_counts(series.value_counts(sort=False))
+
+
+def _mode_from_counts(counts: pd.Series):
+    counts = counts[counts > 0]
+    if counts.empty:
+        return np.nan
+    ties = counts.index[counts.to_numpy() == counts.max()]
+    try:
+        return min(ties)
+    except TypeError:
+        return ties[0]
+
+
 def handle_missing_values(df: pd.DataFrame, threshold: float = 0.5) -> pd.DataFrame:
     """
     Handles missing values by:
@@ -8,6 +303,8 @@ def handle_missing_values(df: pd.DataFrame, threshold: float = 0.5) -> pd.DataFr
         - Mode for categorical columns.
         - Mean/Median for numerical columns based on skewness.
 
+    See `MissingValueImputer` to reuse the fitted statistics on new batches.
+
     Parameters:
         df (pd.DataFrame): The input dataset.
         threshold (float): Threshold for dropping columns with missing values.
@@ -15,56 +312,206 @@ def handle_missing_values(df: pd.DataFrame, threshold: float = 0.5) -> pd.DataFr
     Returns:
         pd.DataFrame: Dataset with handled missing values.
     """
-    # Step 1: Drop Columns with >50% Missing Values or 100% Missing Values
-    missing_percentage = df.isnull().mean()
-    
-    # Drop columns with missing values greater than the threshold (default 50%)
-    cols_to_drop = missing_percentage[missing_percentage > threshold].index
-    # Add columns with 100% missing values to the drop list
-    cols_to_drop = cols_to_drop.append(missing_percentage[missing_percentage == 1.0].index)
-    
-    df = df.drop(columns=cols_to_drop)
-    print(f"Dropped columns with >{threshold*100}% or 100% missing values: {list(cols_to_drop)}")
-    
-    # Step 2: Fill Missing Values
-    for col in df.columns:
-        if df[col].dtype == 'object' or df[col].dtype == 'category':
-            # Categorical Columns - Fill with mode
-            if df[col].isna().sum() > 0:
-                df[col] = df[col].fillna(df[col].mode()[0])
-        elif df[col].dtype in ['int64', 'float64']:
-            # Numerical Columns - Fill based on skewness
-            if df[col].isna().sum() > 0:
-                if abs(df[col].skew()) > 1:
-                    df[col] = df[col].fillna(df[col].median())
-                else:
-                    df[col] = df[col].fillna(df[col].mean())
-    
+    imputer = MissingValueImputer(threshold=threshold).fit(df)
+    print(f"Dropped columns with >{threshold*100}% or 100% missing values: {imputer.columns_to_drop_}")
+
+    df = imputer.transform(df)
     print("Filled missing values: Mode for categorical, Mean/Median for numerical columns.")
     return df
 
 
-def handle_outliers(df: pd.DataFrame) -> pd.DataFrame:
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch (a merging t-digest).
+
+    Values are summarised by at most about `compression` weighted centroids, which are
+    small near the tails and large around the median, so tail quantiles stay accurate.
+    Each update merges a whole chunk with vectorized NumPy operations, and the memory
+    used is independent of the number of values seen.
+
+    Parameters:
+        compression (int): Controls the number of centroids kept (accuracy vs size).
+    """
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values) -> "QuantileSketch":
+        """
+        Adds a chunk of values (NaNs are ignored) to the sketch.
+        """
+        values = np.asarray(values, dtype='float64').ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._merge(values, np.ones(len(values)))
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """
+        Merges another sketch (e.g. built over a different chunk) into this one.
+        """
+        if other.count == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._merge(other.means, other.weights)
+        return self
+
+    def _merge(self, means: np.ndarray, weights: np.ndarray):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        # k1 scale function: a centroid may span at most one unit of k
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1))
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(cluster)) + 1])
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+        self.count = total
+
+    def quantile(self, q):
+        """
+        Estimates one or several quantiles (floats in [0, 1]).
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q, dtype='float64') * self.count, positions, values)
+
+
+class OutlierCapper:
+    """
+    Fitted IQR outlier capper used by `handle_outliers` and `detect_outliers`.
+
+    With method='exact', `fit` gets the quartiles of every numerical column from one
+    multi-column quantile computation. With method='streaming', `partial_fit` can be
+    called on successive chunks and the quartiles are estimated with a `QuantileSketch`
+    per column, so the bounds can be computed over input that never fits in memory.
+
+    Parameters:
+        threshold (float): IQR multiplier for the lower and upper bounds.
+        method (str): 'exact' or 'streaming'.
+        compression (int): Compression of the streaming quantile sketches.
+    """
+
+    def __init__(self, threshold: float = 1.5, method: str = 'exact', compression: int = 200):
+        if method not in ('exact', 'streaming'):
+            raise ValueError("method must be either 'exact' or 'streaming'.")
+        self.threshold = threshold
+        self.method = method
+        self.compression = compression
+        self.columns_ = None
+        self.sketches_ = None
+        self.lower_bounds_ = None
+        self.upper_bounds_ = None
+
+    def fit(self, df: pd.DataFrame) -> "OutlierCapper":
+        """
+        Computes the capping bounds of every numerical column of `df`.
+        """
+        if self.method == 'streaming':
+            self.sketches_ = None
+            return self.partial_fit(df)
+
+        self.columns_ = _numerical_columns(df)
+        quartiles = df[self.columns_].quantile([0.25, 0.75])
+        self._set_bounds(quartiles.loc[0.25], quartiles.loc[0.75])
+        return self
+
+    def partial_fit(self, chunk: pd.DataFrame) -> "OutlierCapper":
+        """
+        Updates the streaming quantile sketches with a chunk and refreshes the bounds.
+        """
+        if self.method != 'streaming':
+            raise ValueError("partial_fit is only available with method='streaming'.")
+        if self.sketches_ is None:
+            self.columns_ = _numerical_columns(chunk)
+            self.sketches_ = {col: QuantileSketch(self.compression) for col in self.columns_}
+        for col in self.columns_:
+            values = pd.to_numeric(chunk[col], errors='coerce')
+            self.sketches_[col].update(values.to_numpy(dtype='float64', na_value=np.nan))
+
+        quartiles = pd.DataFrame(
+            {col: self.sketches_[col].quantile([0.25, 0.75]) for col in self.columns_},
+            index=[0.25, 0.75]
+        )
+        self._set_bounds(quartiles.loc[0.25], quartiles.loc[0.75])
+        return self
+
+    def _set_bounds(self, q1: pd.Series, q3: pd.Series):
+        iqr = q3 - q1
+        self.lower_bounds_ = q1 - self.threshold * iqr
+        self.upper_bounds_ = q3 + self.threshold * iqr
+
+    def _check_fitted(self, df: pd.DataFrame) -> list:
+        if self.lower_bounds_ is None:
+            raise ValueError("The capper has not been fitted. Call fit or partial_fit first.")
+        return [col for col in self.columns_ if col in df.columns]
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Caps the values outside the fitted bounds.
+        """
+        columns = self._check_fitted(df)
+        capped = df[columns].clip(
+            lower=self.lower_bounds_[columns], upper=self.upper_bounds_[columns], axis=1
+        )
+        return df.assign(**{col: capped[col] for col in columns})
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    def count_outliers(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Counts the values outside the fitted bounds with vectorized masks.
+
+        Returns:
+            pd.DataFrame: 'Total Outliers', 'Lower Bound' and 'Upper Bound' per column.
+        """
+        columns = self._check_fitted(df)
+        values = df[columns]
+        outside = values.lt(self.lower_bounds_[columns], axis=1) | values.gt(self.upper_bounds_[columns], axis=1)
+        return pd.DataFrame({
+            'Total Outliers': outside.sum(),
+            'Lower Bound': self.lower_bounds_[columns],
+            'Upper Bound': self.upper_bounds_[columns]
+        })
+
+
+def _numerical_columns(df: pd.DataFrame) -> list:
+    return [col for col in df.columns if _is_numerical(df[col])]
+
+
+def handle_outliers(df: pd.DataFrame, threshold: float = 1.5) -> pd.DataFrame:
     """
     Handles outliers using the IQR (Interquartile Range) method.
-    
+
+    See `OutlierCapper` to reuse the bounds or to fit them over chunked input.
+
     Parameters:
         df (pd.DataFrame): The input dataset.
-    
+        threshold (float): IQR multiplier for the capping bounds.
+
     Returns:
         pd.DataFrame: Dataset with capped outliers.
     """
-    for col in df.select_dtypes(include=['float64', 'int64']).columns:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        
-        # Cap values outside bounds
-        df[col] = df[col].clip(lower=lower_bound, upper=upper_bound)
-    
+    df = OutlierCapper(threshold=threshold).fit_transform(df)
+
     print("Capped outliers using IQR method for numerical columns.")
     return df
 def detect_missing_values(df: pd.DataFrame):
@@ -85,23 +532,89 @@ def detect_outliers(df: pd.DataFrame, threshold: float = 1.5):
     """
     Detects outliers based on the IQR method.
     """
-    outlier_info = {}
-    
-    for col in df.select_dtypes(include=['float64', 'int64']).columns:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        
-        lower_bound = Q1 - threshold * IQR
-        upper_bound = Q3 + threshold * IQR
-        
-        outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
-        outlier_info[col] = {
-            'Total Outliers': len(outliers),
-            'Lower Bound': lower_bound,
-            'Upper Bound': upper_bound
-        }
-    
-    return pd.DataFrame.from_dict(outlier_info, orient='index')
+    return OutlierCapper(threshold=threshold).fit(df).count_outliers(df)
+
+
+def clean_in_chunks(make_chunks, output_path: str, threshold: float = 0.5,
+                    outlier_threshold: float = 1.5, compression: int = 200):
+    """
+    Out-of-core version of `handle_missing_values` followed by `handle_outliers`.
+
+    The input is read twice, one chunk at a time:
+    1. The imputer and outlier-capper statistics (null rates, modes, moments, quantile
+       sketches) are accumulated with `partial_fit`.
+    2. Every chunk is imputed, capped and appended to `output_path`.
+    Memory is therefore bounded by the chunk size rather than by the dataset size. Medians
+    and quartiles are estimated with streaming sketches and the quartiles are computed on
+    the values before imputation, so the bounds can differ slightly from the in-memory path.
+
+    Parameters:
+        make_chunks (callable): Returns a new iterator of DataFrame chunks on each call,
+            e.g. `lambda: load_data(txt_file_path, chunksize=DEFAULT_CHUNKSIZE)`.
+        output_path (str): Cleaned output, written as Parquet if it ends with
+            '.parquet' and as CSV otherwise.
+        threshold (float): Threshold for dropping columns with missing values.
+        outlier_threshold (float): IQR multiplier for the capping bounds.
+        compression (int): Compression of the streaming quantile sketches.
+
+    Returns:
+        tuple: The fitted (MissingValueImputer, OutlierCapper).
+    """
+    imputer = MissingValueImputer(threshold=threshold)
+    capper = OutlierCapper(threshold=outlier_threshold, method='streaming', compression=compression)
+
+    # Pass one: accumulate the statistics
+    n_rows = 0
+    for chunk in make_chunks():
+        imputer.partial_fit(chunk)
+        capper.partial_fit(chunk)
+        n_rows += len(chunk)
+    if n_rows == 0:
+        raise ValueError("The input has no rows.")
+    print(f"Collected statistics over {n_rows} rows. "
+          f"Dropping columns with >{threshold*100}% or 100% missing values: {imputer.columns_to_drop_}")
+
+    # Pass two: impute, cap and write each chunk
+    with _ChunkWriter(output_path) as writer:
+        for chunk in make_chunks():
+            writer.write(capper.transform(imputer.transform(chunk)))
+
+    print(f"Cleaned data written to {output_path}")
+    return imputer, capper
+
+
+class _ChunkWriter:
+    """
+    Appends DataFrame chunks to a CSV or Parquet file.
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.parquet = output_path.endswith('.parquet')
+        self._writer = None
+        self._first = True
+
+    def __enter__(self):
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        return self
+
+    def write(self, chunk: pd.DataFrame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
 
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.output_path, table.schema)
+            else:
+                # Categorical index widths and all-null columns can vary between chunks
+                table = table.cast(self._writer.schema)
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.output_path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
 
+    def __exit__(self, *exc_info):
+        if self._writer is not None:
+            self._writer.close()
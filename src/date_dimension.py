@@ -0,0 +1,87 @@
+# src/date_dimension.py
+from collections import OrderedDict
+
+import pandas as pd
+from pandas.api.extensions import take
+
+DATE_FEATURES = ['Date', 'Year', 'Month', 'MonthEnd']
+
+# Parsed dates shared by every frame, as a mapping raw value -> Timestamp, least recently
+# used first and bounded to DATE_CACHE_SIZE values. It is kept out of df.attrs, which
+# pandas deep-copies into every derived frame and writes into Parquet metadata.
+DATE_CACHE_SIZE = 100_000
+_PARSED_DATES = OrderedDict()
+
+
+def date_dimension(df: pd.DataFrame, column: str = 'TransactionMonth'):
+    """
+    Builds the date dimension of a column: the column is factorized into integer codes
+    and only its distinct values are parsed, instead of every row.
+
+    Parsed values are cached by raw value in a module-level cache, so later calls on the
+    same frame, or on any frame with the same values, only parse the values that have not
+    been seen yet. Columns that are already datetime are not parsed at all.
+
+    :param df: DataFrame with the date column
+    :param column: Name of the date column
+    :return: (codes, dimension) where codes are the integer codes of the rows (-1 for
+             missing values) and dimension is a DataFrame with one row per code and
+             'Date', 'Year', 'Month' and 'MonthEnd' columns
+    """
+    if column not in df.columns:
+        raise ValueError(f"DataFrame must contain a '{column}' column.")
+
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+
+    if pd.api.types.is_datetime64_any_dtype(uniques):
+        dates = pd.DatetimeIndex(uniques)
+    else:
+        dates = _parse_dates(uniques)
+
+    dimension = pd.DataFrame({
+        'Date': dates,
+        'Year': dates.year,
+        'Month': dates.month,
+        'MonthEnd': dates.to_period('M').to_timestamp() + pd.offsets.MonthEnd(0),
+    })
+    return codes, dimension
+
+
+def _parse_dates(uniques) -> pd.DatetimeIndex:
+    # Look the distinct raw values up in the cache and parse only the missing ones
+    unparsed = [value for value in uniques if value not in _PARSED_DATES]
+    if unparsed:
+        _PARSED_DATES.update(zip(unparsed, pd.to_datetime(pd.Index(unparsed, dtype=object), errors='coerce')))
+    dates = pd.DatetimeIndex([_PARSED_DATES[value] for value in uniques])
+    for value in uniques:
+        _PARSED_DATES.move_to_end(value)
+    while len(_PARSED_DATES) > DATE_CACHE_SIZE:
+        _PARSED_DATES.popitem(last=False)
+    return dates
+
+
+def date_features(df: pd.DataFrame, column: str = 'TransactionMonth', features=None) -> pd.DataFrame:
+    """
+    Maps the date dimension back to the rows by integer code.
+
+    :param df: DataFrame with the date column
+    :param column: Name of the date column
+    :param features: Subset of DATE_FEATURES to return (default all of them)
+    :return: DataFrame indexed like df with the requested features; rows with missing or
+             unparseable dates get NaT / NaN
+    """
+    features = features or DATE_FEATURES
+    unknown = [feature for feature in features if feature not in DATE_FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown date features {unknown}, expected a subset of {DATE_FEATURES}.")
+
+    codes, dimension = date_dimension(df, column)
+    allow_fill = bool((codes < 0).any())
+    return pd.DataFrame(
+        {feature: take(dimension[feature].array, codes, allow_fill=allow_fill) for feature in features},
+        index=df.index
+    )
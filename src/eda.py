@@ -1,7 +1,24 @@
 # src/eda.py
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
+
+from date_dimension import date_features
+
+# Profiles computed by profile_data, keyed by dataset fingerprint. Only the reports are
+# kept (never the profiled DataFrames), least recently used first, and at most
+# PROFILE_CACHE_SIZE of them.
+PROFILE_CACHE_SIZE = 8
+_PROFILE_CACHE = OrderedDict()
+
+
 def data_summary(df: pd.DataFrame):
     """
     Generates summary statistics for the DataFrame.
@@ -60,62 +77,134 @@ def univariate_analysis(df: pd.DataFrame):
     plt.show()
 
 
+MONTHLY_METRICS = ['TotalPremium', 'TotalClaims']
+
+
+def monthly_aggregates(df: pd.DataFrame, metrics=None) -> pd.DataFrame:
+    """
+    Aggregates the transactions by month: row count and the sum and sum of squares of
+    each metric, indexed by month-end 'Date'. These are additive, so the aggregates of a
+    new month's partition can be appended to or merged with a stored table.
+
+    :param df: DataFrame with a 'TransactionMonth' column and the metric columns
+    :param metrics: Metric columns to aggregate (default MONTHLY_METRICS)
+    :return: DataFrame with 'count', '<metric>_sum' and '<metric>_sumsq' columns
+    """
+    metrics = metrics or MONTHLY_METRICS
+    if 'TransactionMonth' not in df.columns:
+        raise ValueError("DataFrame must contain a 'TransactionMonth' column.")
+
+    month_end = date_features(df, 'TransactionMonth', ['MonthEnd'])['MonthEnd'].rename('Date')
+
+    values = df[metrics].astype('float64')
+    frame = pd.concat([
+        pd.Series(1, index=df.index, name='count'),
+        values.add_suffix('_sum'),
+        (values ** 2).add_suffix('_sumsq')
+    ], axis=1)
+    return frame.groupby(month_end).sum().sort_index()
+
+
+def monthly_changes(aggregates: pd.DataFrame, metrics=None) -> pd.DataFrame:
+    """
+    Derives the monthly totals and their month-over-month changes from monthly aggregates.
+    Months without transactions are included with zero totals.
+
+    :param aggregates: Output of monthly_aggregates (or MonthlyAggregateStore.aggregates)
+    :param metrics: Metric columns (default MONTHLY_METRICS)
+    :return: DataFrame with 'Date', the monthly totals and 'Monthly<metric>Change' columns
+    """
+    metrics = metrics or MONTHLY_METRICS
+    months = pd.date_range(aggregates.index.min(), aggregates.index.max(), freq='ME', name='Date')
+    monthly_data = aggregates[[f"{m}_sum" for m in metrics]].reindex(months, fill_value=0)
+    monthly_data.columns = metrics
+    for m in metrics:
+        monthly_data[f"Monthly{m}Change"] = monthly_data[m].pct_change()
+    return monthly_data.reset_index()
+
+
+class MonthlyAggregateStore:
+    """
+    Persisted monthly aggregate table (count, sum and sum of squares of TotalPremium and
+    TotalClaims per month), updated by appending only the partition of a new month
+    instead of regrouping the full history.
+    """
+
+    def __init__(self, path: str, metrics=None):
+        """
+        :param path: Parquet file holding the aggregates (created on first update)
+        :param metrics: Metric columns to aggregate (default MONTHLY_METRICS)
+        """
+        self.path = path
+        self.metrics = metrics or MONTHLY_METRICS
+        if os.path.exists(path):
+            self.aggregates = pd.read_parquet(path)
+        else:
+            self.aggregates = None
+
+    def update(self, df: pd.DataFrame, replace: bool = True) -> pd.DataFrame:
+        """
+        Adds the transactions of a new partition (typically one month) to the store.
+
+        :param df: New transactions
+        :param replace: If True, months present in `df` replace the stored months
+                        (re-delivered partitions); if False, `df` may only hold months
+                        that are not stored yet
+        :return: The updated aggregate table
+        :raises ValueError: If `replace` is False and `df` holds an already stored month
+        """
+        new = monthly_aggregates(df, self.metrics)
+        if self.aggregates is None:
+            aggregates = new
+        elif replace:
+            aggregates = pd.concat([self.aggregates.drop(index=new.index, errors='ignore'), new])
+        else:
+            duplicates = new.index.intersection(self.aggregates.index)
+            if len(duplicates):
+                raise ValueError(f"Months {[d.strftime('%Y-%m') for d in duplicates]} are already stored. "
+                                 f"Use replace=True to replace them.")
+            aggregates = pd.concat([self.aggregates, new])
+        self.aggregates = aggregates.sort_index()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.aggregates.to_parquet(self.path)
+        return self.aggregates
+
+    def monthly_changes(self) -> pd.DataFrame:
+        """
+        Returns the same table as preprocess_data, derived from the stored aggregates.
+        """
+        if self.aggregates is None or self.aggregates.empty:
+            raise ValueError("The store is empty. Call update first.")
+        return monthly_changes(self.aggregates, self.metrics)
+
+
 def preprocess_data(df: pd.DataFrame):
     """
-    Preprocesses the DataFrame by renaming columns, converting date columns, 
-    and aggregating data.
+    Preprocesses the DataFrame by converting date columns and aggregating data by
+    month, then computes the monthly changes of TotalPremium and TotalClaims.
+    The input DataFrame is left unchanged.
+
+    See MonthlyAggregateStore to update the aggregates one month at a time.
     """
-    # Check and rename 'TransactionMonth' to 'Date'
     if 'TransactionMonth' not in df.columns:
         raise ValueError("DataFrame must contain a 'TransactionMonth' column.")
-    
-    df.rename(columns={'TransactionMonth': 'Date'}, inplace=True)
-    df['Date'] = pd.to_datetime(df['Date'])
-    
-    # Aggregating data
-    df = df.groupby('Date').agg({
-        'TotalPremium': 'sum',
-        'TotalClaims': 'sum'
-    }).reset_index()
-
-    # Set 'Date' as index
-    df.set_index('Date', inplace=True)
-    
-    # Resample data by month using Month End frequency
-    monthly_data = df.resample('ME').agg({
-        'TotalPremium': 'sum',
-        'TotalClaims': 'sum'
-    })
-    
-    # Fill missing values using forward fill
-    monthly_data.ffill(inplace=True)
-
-    # Check for missing values after forward fill
-    missing_values = monthly_data[['TotalPremium', 'TotalClaims']].isnull().sum()
-    if missing_values.any():
-        print("Missing values found after filling:")
-        print(missing_values)
-
-    # Calculate monthly changes
-    monthly_data['MonthlyTotalPremiumChange'] = monthly_data['TotalPremium'].pct_change()
-    monthly_data['MonthlyTotalClaimsChange'] = monthly_data['TotalClaims'].pct_change()
-    
+
+    monthly_data = monthly_changes(monthly_aggregates(df))
+
     # Check for missing values in changes
     missing_changes = monthly_data[['MonthlyTotalPremiumChange', 'MonthlyTotalClaimsChange']].isnull().sum()
     if missing_changes.any():
         print("Missing values found in MonthlyTotalPremiumChange or MonthlyTotalClaimsChange after calculating changes:")
         print(missing_changes)
-    
-    # Reset index to bring 'Date' back as a column
-    monthly_data.reset_index(inplace=True)
-    
+
     # Debug: Print column names to ensure changes are added
     print("Columns after preprocessing:")
     print(monthly_data.columns)
 
     return monthly_data
 
-def bivariate_analysis(df, total_premium_column, total_claims_column, postal_code_column):
+def bivariate_analysis(df, total_premium_column, total_claims_column, postal_code_column, cube=None):
     """
     Explore relationships between Total Premium and Total Claims as a function of PostalCode 
     using scatter plots and correlation matrices.
@@ -124,15 +213,25 @@ def bivariate_analysis(df, total_premium_column, total_claims_column, postal_cod
     :param total_premium_column: The column name for total premium
     :param total_claims_column: The column name for total claims
     :param postal_code_column: The column name for postal code
+    :param cube: Optional InsuranceCube; the group means are then rolled up from it
+                 instead of grouping the rows of df
     """
-    # Ensure required columns exist
-    required_columns = [total_premium_column, total_claims_column, postal_code_column]
-    for col in required_columns:
-        if col not in df.columns:
-            raise ValueError(f"Column '{col}' is missing from the DataFrame.")
+    if cube is not None:
+        # Step 1: Roll the cube up to PostalCode to get the means of TotalPremium and TotalClaims
+        postal_code_groups = cube.rollup([postal_code_column])[
+            [f"{total_premium_column}_mean", f"{total_claims_column}_mean"]
+        ]
+        postal_code_groups.columns = [total_premium_column, total_claims_column]
+        postal_code_groups = postal_code_groups.reset_index()
+    else:
+        # Ensure required columns exist
+        required_columns = [total_premium_column, total_claims_column, postal_code_column]
+        for col in required_columns:
+            if col not in df.columns:
+                raise ValueError(f"Column '{col}' is missing from the DataFrame.")
 
-    # Step 1: Group by PostalCode and calculate the mean of TotalPremium and TotalClaims
-    postal_code_groups = df.groupby(postal_code_column)[[total_premium_column, total_claims_column]].mean().reset_index()
+        # Step 1: Group by PostalCode and calculate the mean of TotalPremium and TotalClaims
+        postal_code_groups = df.groupby(postal_code_column, observed=True)[[total_premium_column, total_claims_column]].mean().reset_index()
 
     # Step 2: Create visualizations
     fig, axes = plt.subplots(1, 2, figsize=(16, 8))
@@ -169,10 +268,32 @@ def bivariate_analysis(df, total_premium_column, total_claims_column, postal_cod
     plt.show()
 
     
-def compare_data(df):
+def compare_data(df, cube=None):
     """
     Compares trends in insurance cover type, premium, etc., across geographic regions using the 'Province' column.
+
+    :param df: DataFrame containing the data (may be None when a cube is given)
+    :param cube: Optional InsuranceCube; the monthly premium totals by Province are then
+                 rolled up from it instead of grouping the rows of df
     """
+    if cube is not None:
+        geo_trends = cube.rollup(['Province', 'TransactionMonth'])['TotalPremium_sum'].unstack()
+    else:
+        geo_trends = _province_monthly_premium(df)
+
+    # Plotting trends
+    plt.figure(figsize=(12, 6))
+    for province in geo_trends.columns:
+        plt.plot(geo_trends.index, geo_trends[province], label=province)
+
+    plt.title('Trends in Total Premiums by Province')
+    plt.xlabel('Month')
+    plt.ylabel('Total Premium')
+    plt.legend()
+    plt.grid(True)
+    plt.show()
+
+def _province_monthly_premium(df):
     # Strip any leading or trailing spaces from column names
     df.columns = df.columns.str.strip()
 
@@ -181,30 +302,21 @@ def compare_data(df):
         raise ValueError("DataFrame must contain a 'Province' column.")
     
     # Verify the data type of 'Province' column
-    if df['Province'].dtype != 'object':
-        raise ValueError("'Province' column must be of type 'object' (string).")
+    if not (pd.api.types.is_object_dtype(df['Province'])
+            or pd.api.types.is_string_dtype(df['Province'])
+            or isinstance(df['Province'].dtype, pd.CategoricalDtype)):
+        raise ValueError("'Province' column must be of type 'object' (string) or 'category'.")
 
     # Check if 'TransactionMonth' column exists
     if 'TransactionMonth' not in df.columns:
         raise ValueError("The 'TransactionMonth' column is missing from the DataFrame.")
     
-    # Ensure 'TransactionMonth' is in datetime format
-    if not pd.api.types.is_datetime64_any_dtype(df['TransactionMonth']):
-        df['TransactionMonth'] = pd.to_datetime(df['TransactionMonth'], errors='coerce')
+    # Month-end dates of 'TransactionMonth' from the shared (cached) date dimension
+    month_end = date_features(df, 'TransactionMonth', ['MonthEnd'])['MonthEnd'].rename('TransactionMonth')
 
     # Aggregating total premiums by 'Province' and 'TransactionMonth'
-    geo_trends = df.groupby(['Province', pd.Grouper(key='TransactionMonth', freq='ME')])['TotalPremium'].sum().unstack()
-    # Plotting trends
-    plt.figure(figsize=(12, 6))
-    for province in geo_trends.columns:
-        plt.plot(geo_trends.index, geo_trends[province], label=province)
+    return df.groupby([df['Province'], month_end], observed=True)['TotalPremium'].sum().unstack()
 
-    plt.title('Trends in Total Premiums by Province')
-    plt.xlabel('Month')
-    plt.ylabel('Total Premium')
-    plt.legend()
-    plt.grid(True)
-    plt.show()
 
 def detect_outliers(df):
     """
@@ -234,9 +346,9 @@ def descriptive_statistics(df: pd.DataFrame):
     # Calculating descriptive statistics for numerical columns
     numerical_stats = numeric_df.describe().T
     
-    # Calculating additional statistics like variance and standard deviation
-    numerical_stats['variance'] = numeric_df.var()
-    numerical_stats['std_dev'] = numeric_df.std()
+    # Variance and standard deviation follow from the std describe() already computed
+    numerical_stats['variance'] = numerical_stats['std'] ** 2
+    numerical_stats['std_dev'] = numerical_stats['std']
     
     return numerical_stats
 # src/eda.py
@@ -263,3 +375,132 @@ def check_data_structure(df: pd.DataFrame):
     }
 
     return data_structure_report
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Computes a content hash of the DataFrame (values, index, column names and dtypes).
+
+    :param df: DataFrame to fingerprint
+    :return: Hex digest identifying the DataFrame contents
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def profile_data(df: pd.DataFrame, n_jobs: int = None, outlier_threshold: float = 1.5,
+                 use_cache: bool = True, cache_dir: str = None, fingerprint: str = None) -> pd.DataFrame:
+    """
+    Computes all per-column statistics in a single pass over each column, with the columns
+    profiled in parallel on a thread pool. This replaces calling detect_missing_values,
+    detect_outliers, descriptive_statistics, check_data_structure and data_summary one
+    after another, each of which re-scans every column.
+
+    Reports are cached by dataset fingerprint (in memory for the last PROFILE_CACHE_SIZE
+    datasets, and on disk when `cache_dir` is given), so re-running a notebook cell on the
+    same data is instant. For a frame fresh from `load_cached_data`, pass its
+    `df.attrs['source_fingerprint']` as `fingerprint`: the key then costs nothing, where
+    `dataset_fingerprint` hashes every value of the frame.
+
+    :param df: DataFrame to profile
+    :param n_jobs: Number of worker threads (default is the number of CPUs)
+    :param outlier_threshold: IQR multiplier used to count outliers
+    :param use_cache: Whether to read and write the profile cache
+    :param cache_dir: Optional directory where reports are persisted
+    :param fingerprint: Fingerprint of the data `df` holds, unchanged since it was loaded
+                        (default is `dataset_fingerprint(df)`)
+    :return: DataFrame with one row per column: dtype, missing values, cardinality,
+             moments, quartiles and IQR outlier counts
+    """
+    key = None
+    if use_cache:
+        key = f"{fingerprint or dataset_fingerprint(df)}-{outlier_threshold}"
+        if key in _PROFILE_CACHE:
+            _PROFILE_CACHE.move_to_end(key)
+            return _PROFILE_CACHE[key].copy()
+        cache_path = os.path.join(cache_dir, f"profile.{key}.pkl") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                report = pickle.load(f)
+            _cache_profile(key, report)
+            return report.copy()
+
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+        rows = list(executor.map(
+            lambda col: _profile_column(df[col], outlier_threshold), df.columns
+        ))
+    report = pd.DataFrame(rows, index=df.columns)
+
+    if use_cache:
+        _cache_profile(key, report)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_path, 'wb') as f:
+                pickle.dump(report, f)
+    return report.copy()
+
+
+def _cache_profile(key: str, report: pd.DataFrame):
+    _PROFILE_CACHE[key] = report
+    _PROFILE_CACHE.move_to_end(key)
+    while len(_PROFILE_CACHE) > PROFILE_CACHE_SIZE:
+        _PROFILE_CACHE.popitem(last=False)
+
+
+def _profile_column(series: pd.Series, outlier_threshold: float) -> dict:
+    n_rows = len(series)
+    missing = int(series.isna().sum())
+    profile = {
+        'dtype': str(series.dtype),
+        'count': n_rows - missing,
+        'missing': missing,
+        'missing_pct': missing / n_rows * 100 if n_rows else np.nan,
+    }
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        values = values[~np.isnan(values)]
+        profile['unique'] = len(pd.unique(values))
+        if len(values) == 0:
+            return profile
+
+        mean = values.mean()
+        deviations = values - mean
+        m2 = (deviations ** 2).mean()
+        m3 = (deviations ** 3).mean()
+        n = len(values)
+        q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        lower_bound = q1 - outlier_threshold * iqr
+        upper_bound = q3 + outlier_threshold * iqr
+        profile.update({
+            'mean': mean,
+            'std': np.sqrt(m2 * n / (n - 1)) if n > 1 else np.nan,
+            'variance': m2 * n / (n - 1) if n > 1 else np.nan,
+            'skewness': (np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2 ** 1.5 if m2 > 0 else 0.0) if n > 2 else np.nan,
+            'min': values.min(),
+            '25%': q1,
+            '50%': median,
+            '75%': q3,
+            'max': values.max(),
+            'iqr': iqr,
+            'lower_bound': lower_bound,
+            'upper_bound': upper_bound,
+            'outliers': int(((values < lower_bound) | (values > upper_bound)).sum()),
+        })
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        profile.update({'unique': series.nunique(), 'min': series.min(), 'max': series.max()})
+    else:
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            counts = pd.Series(np.bincount(codes[codes >= 0], minlength=len(series.cat.categories)),
+                               index=series.cat.categories)
+            counts = counts[counts > 0]
+        else:
+            counts = series.value_counts(sort=False)
+        profile['unique'] = len(counts)
+        if len(counts):
+            profile.update({'top': counts.idxmax(), 'top_freq': int(counts.max())})
+    return profile
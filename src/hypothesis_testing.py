@@ -1,14 +1,618 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
+import scipy.sparse as sparse
 import scipy.stats as stats
 
+# Upper bound on the number of array elements generated per resampling batch
+RESAMPLING_BATCH_ELEMENTS = 4_000_000
+RESAMPLING_STATISTICS = ('mean_diff', 'loss_ratio_diff')
+
+HYPOTHESIS_TESTS = ('t_test', 'anova', 'chi2')
+# The hypotheses of the A/B testing task as (grouping column, metric, test[, groups]) specs
+DEFAULT_HYPOTHESES = [
+    ('Province', 'TotalClaims', 't_test'),
+    ('PostalCodeCategory', 'TotalClaims', 'chi2'),
+    ('PostalCodeCategory', 'Margin', 'anova'),
+    ('Gender', 'TotalClaims', 't_test', ('Male', 'Female')),
+]
+
+# Arrays of the running resampling job, set in each worker process by its initializer
+_resampling_data = None
+
+
+def combine_group_stats(group_stats):
+    """
+    Pools the per-group statistics of several groups into those of their union.
+
+    Parameters:
+    - group_stats: DataFrame with 'count', 'mean' and 'var' (sample variance) columns,
+      one row per group.
+
+    Returns:
+    - count, mean, var: Statistics of the pooled group.
+    """
+    counts = group_stats['count'].to_numpy(dtype='float64')
+    means = group_stats['mean'].to_numpy(dtype='float64')
+    variances = np.nan_to_num(group_stats['var'].to_numpy(dtype='float64'))
+    count = counts.sum()
+    if count == 0:
+        return 0, np.nan, np.nan
+    mean = (counts * means).sum() / count
+    # Within-group plus between-group sums of squared deviations
+    m2 = ((counts - 1) * variances).sum() + (counts * (means - mean) ** 2).sum()
+    return count, mean, m2 / (count - 1) if count > 1 else np.nan
+
+
+def welch_t_test_from_stats(n1, mean1, var1, n2, mean2, var2):
+    """
+    Welch's two-sample t-test from group counts, means and sample variances.
+    Gives the same result as scipy.stats.ttest_ind(a, b, equal_var=False).
+
+    Returns:
+    - t_statistic, p_value
+    """
+    se1, se2 = var1 / n1, var2 / n2
+    t_statistic = (mean1 - mean2) / np.sqrt(se1 + se2)
+    dof = (se1 + se2) ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+    p_value = 2 * stats.t.sf(np.abs(t_statistic), dof)
+    return t_statistic, p_value
+
+
+def one_way_anova_from_stats(counts, means, variances):
+    """
+    One-way ANOVA from per-group counts, means and sample variances.
+    Gives the same result as scipy.stats.f_oneway(*groups).
+
+    Returns:
+    - f_statistic, p_value
+    """
+    counts = np.asarray(counts, dtype='float64')
+    means = np.asarray(means, dtype='float64')
+    variances = np.nan_to_num(np.asarray(variances, dtype='float64'))
+    observed = counts > 0
+    counts, means, variances = counts[observed], means[observed], variances[observed]
+
+    n_groups, n_total = len(counts), counts.sum()
+    grand_mean = (counts * means).sum() / n_total
+    between = (counts * (means - grand_mean) ** 2).sum()
+    within = ((counts - 1) * variances).sum()
+    f_statistic = (between / (n_groups - 1)) / (within / (n_total - n_groups))
+    p_value = stats.f.sf(f_statistic, n_groups - 1, n_total - n_groups)
+    return f_statistic, p_value
+
+
+def bucket_low_frequency(codes, labels, counts, threshold, other_label='Other'):
+    """
+    Buckets the labels occurring less than `threshold` times into `other_label`.
+
+    Parameters:
+    - codes: Integer codes of the rows (-1 for missing values).
+    - labels: Index of the labels the codes refer to.
+    - counts: Number of occurrences of each label.
+    - threshold: Minimum number of occurrences to keep a label.
+    - other_label: Label of the bucket of low-frequency labels.
+
+    Returns:
+    - categories: Categorical of the bucketed rows.
+    - mapping: Series mapping each label to its bucket.
+    """
+    labels = pd.Index(labels).astype(object)
+    keep = np.asarray(counts) >= threshold
+    # Kept labels get consecutive new codes, the others the code of the 'Other' bucket;
+    # the extra last entry maps the missing code -1 to -1
+    lookup = np.where(keep, np.cumsum(keep) - 1, keep.sum())
+    lookup = np.append(lookup, -1).astype(np.int32)
+    bucket_labels = labels[keep].append(pd.Index([other_label], dtype=object))
+
+    categories = pd.Categorical.from_codes(lookup[codes], categories=bucket_labels)
+    mapping = pd.Series(bucket_labels[lookup[:-1]], index=labels)
+    return categories, mapping
+
+
+def bin_claims(claims, bins='raw'):
+    """
+    Encodes claim amounts as integer column codes of a contingency table.
+
+    Parameters:
+    - claims: Array-like of claim amounts.
+    - bins: 'raw' (one column per distinct amount), 'zero' (zero / non-zero claims) or an
+      integer k (a zero-claims column plus k quantile bins of the non-zero claims).
+
+    Returns:
+    - codes: Integer codes of the rows (-1 for missing values).
+    """
+    claims = np.asarray(claims, dtype='float64')
+    missing = np.isnan(claims)
+    if bins == 'raw':
+        codes, _ = pd.factorize(claims)
+        return codes
+    if bins == 'zero':
+        codes = (claims > 0).astype(np.int64)
+    elif isinstance(bins, (int, np.integer)) and bins > 0:
+        positive = claims[~missing & (claims > 0)]
+        edges = np.unique(np.quantile(positive, np.linspace(0, 1, bins + 1))) if len(positive) else np.empty(0)
+        codes = np.where(claims > 0, 1 + np.searchsorted(edges[1:-1], claims, side='right'), 0)
+    else:
+        raise ValueError("bins must be 'raw', 'zero' or a positive integer.")
+    codes[missing] = -1
+    return codes
+
+
+def sparse_chi2_contingency(row_codes, col_codes):
+    """
+    Chi-square test of independence on a contingency table built as a sparse matrix
+    from integer row and column codes, without densifying it.
+
+    The statistic only needs the non-zero cells, since
+    sum((O - E)^2 / E) = sum(O^2 / E) - N over all cells. For 2x2 tables (one degree of
+    freedom) the dense table is tiny and scipy's Yates-corrected test is used, so the
+    results match scipy.stats.chi2_contingency in every case.
+
+    Parameters:
+    - row_codes, col_codes: Integer codes of each observation (-1 for missing values).
+
+    Returns:
+    - chi2_stat, p_value, dof
+    - expected: Sparse matrix of the expected frequencies of the observed cells; the full
+      table of expected frequencies is outer(row_totals, col_totals) / N.
+    """
+    row_codes, col_codes = np.asarray(row_codes), np.asarray(col_codes)
+    observed = (row_codes >= 0) & (col_codes >= 0)
+    # Compact the codes so empty rows and columns do not enter the table
+    rows, row_index = np.unique(row_codes[observed], return_inverse=True)
+    cols, col_index = np.unique(col_codes[observed], return_inverse=True)
+
+    table = sparse.coo_matrix(
+        (np.ones(len(row_index)), (row_index, col_index)), shape=(len(rows), len(cols))
+    ).tocsr()
+    table.sum_duplicates()
+    dof = (len(rows) - 1) * (len(cols) - 1)
+    if dof == 0:
+        raise ValueError("The contingency table needs at least two rows and two columns.")
+    if dof == 1:
+        chi2_stat, p_value, dof, expected = stats.chi2_contingency(table.toarray())
+        return chi2_stat, p_value, dof, sparse.csr_matrix(expected).multiply(table > 0).tocsr()
+
+    n_total = table.sum()
+    row_totals = np.asarray(table.sum(axis=1)).ravel()
+    col_totals = np.asarray(table.sum(axis=0)).ravel()
+
+    coo = table.tocoo()
+    expected_values = row_totals[coo.row] * col_totals[coo.col] / n_total
+    chi2_stat = (coo.data ** 2 / expected_values).sum() - n_total
+    p_value = stats.chi2.sf(chi2_stat, dof)
+    expected = sparse.csr_matrix((expected_values, (coo.row, coo.col)), shape=table.shape)
+    return chi2_stat, p_value, dof, expected
+
+
+def _init_resampling_worker(data):
+    global _resampling_data
+    _resampling_data = data
+
+
+def _group_statistic(value_sums, weight_sums, counts):
+    # Mean of the values, or loss ratio (sum of claims / sum of premiums) when weighted
+    return value_sums / (counts if weight_sums is None else weight_sums)
+
+
+def _permutation_batch(task):
+    """
+    Statistics of a batch of random relabellings of the pooled sample.
+    Only the smaller group is drawn (as the first n_draw entries of an argpartition of
+    random keys); the sums of the other group follow from the totals.
+    """
+    seed, size = task
+    data = _resampling_data
+    rng = np.random.default_rng(seed)
+    values, weights = data['values'], data['weights']
+    n_total, n_draw = len(values), data['n_draw']
+
+    keys = rng.random((size, n_total), dtype=np.float32)
+    drawn = np.argpartition(keys, n_draw - 1, axis=1)[:, :n_draw]
+    del keys
+    drawn_values = values[drawn].sum(axis=1)
+    drawn_weights = None if weights is None else weights[drawn].sum(axis=1)
+
+    other_values = data['total_value'] - drawn_values
+    other_weights = None if weights is None else data['total_weight'] - drawn_weights
+    drawn_stat = _group_statistic(drawn_values, drawn_weights, n_draw)
+    other_stat = _group_statistic(other_values, other_weights, n_total - n_draw)
+    return drawn_stat - other_stat if data['draw_a'] else other_stat - drawn_stat
+
+
+def _bootstrap_batch(task):
+    """
+    Statistics of a batch of bootstrap resamples (with replacement, within each group).
+    """
+    seed, size = task
+    data = _resampling_data
+    rng = np.random.default_rng(seed)
+    group_stats = []
+    for values, weights in [(data['a_values'], data['a_weights']), (data['b_values'], data['b_weights'])]:
+        idx = rng.integers(0, len(values), size=(size, len(values)))
+        group_stats.append(_group_statistic(
+            values[idx].sum(axis=1), None if weights is None else weights[idx].sum(axis=1), len(values)
+        ))
+        del idx
+    return group_stats[0] - group_stats[1]
+
+
+def _run_resampling(batch_function, data, n_resamples, row_elements, batch_size, n_jobs, random_state):
+    """
+    Runs `n_resamples` resamples in batches, spread over a process pool. Each batch has its
+    own seed spawned from `random_state`, so the results do not depend on `n_jobs`.
+    """
+    global _resampling_data
+    if batch_size is None:
+        batch_size = max(1, RESAMPLING_BATCH_ELEMENTS // max(row_elements, 1))
+    batch_size = min(batch_size, n_resamples)
+    sizes = [batch_size] * (n_resamples // batch_size)
+    if n_resamples % batch_size:
+        sizes.append(n_resamples % batch_size)
+    seeds = np.random.SeedSequence(random_state).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    n_jobs = min(n_jobs or os.cpu_count(), len(tasks))
+    if n_jobs == 1:
+        previous, _resampling_data = _resampling_data, data
+        try:
+            results = [batch_function(task) for task in tasks]
+        finally:
+            _resampling_data = previous
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_resampling_worker,
+                                 initargs=(data,)) as executor:
+            results = list(executor.map(batch_function, tasks))
+    return np.concatenate(results)
+
+
+def _check_resampling_inputs(a, b, a_premium, b_premium, statistic):
+    if statistic not in RESAMPLING_STATISTICS:
+        raise ValueError(f"statistic must be one of {RESAMPLING_STATISTICS}.")
+    a, b = np.asarray(a, dtype='float64'), np.asarray(b, dtype='float64')
+    if len(a) == 0 or len(b) == 0:
+        raise ValueError("One or both of the groups have no data.")
+    if statistic == 'loss_ratio_diff':
+        if a_premium is None or b_premium is None:
+            raise ValueError("The loss ratio statistic needs the premiums of both groups.")
+        return a, b, np.asarray(a_premium, dtype='float64'), np.asarray(b_premium, dtype='float64')
+    return a, b, None, None
+
+
+def permutation_test(a, b, a_premium=None, b_premium=None, statistic='mean_diff', n_resamples=10000,
+                     batch_size=None, n_jobs=None, random_state=None):
+    """
+    Two-sided permutation test of the difference between two groups, for heavy-tailed
+    metrics where the t-test assumptions do not hold.
+
+    Permutations are generated in batched NumPy arrays and the batches are spread over a
+    process pool with deterministic per-batch seeding.
+
+    Parameters:
+    - a, b: Metric values (e.g. TotalClaims) of the two groups.
+    - a_premium, b_premium: Premiums of the two groups (for statistic='loss_ratio_diff').
+    - statistic: 'mean_diff' (mean(a) - mean(b)) or 'loss_ratio_diff'
+      (sum(a) / sum(a_premium) - sum(b) / sum(b_premium)).
+    - n_resamples: Number of permutations.
+    - batch_size: Permutations per batch (default keeps batches around
+      RESAMPLING_BATCH_ELEMENTS array elements).
+    - n_jobs: Number of worker processes (default is the number of CPUs, 1 runs in-process).
+    - random_state: Seed of the permutations.
+
+    Returns:
+    - Dictionary with the observed 'statistic', the 'p_value' and 'n_resamples'.
+    """
+    a, b, a_premium, b_premium = _check_resampling_inputs(a, b, a_premium, b_premium, statistic)
+    weighted = statistic == 'loss_ratio_diff'
+    values = np.concatenate([a, b])
+    weights = np.concatenate([a_premium, b_premium]) if weighted else None
+
+    observed = (_group_statistic(a.sum(), a_premium.sum() if weighted else None, len(a))
+                - _group_statistic(b.sum(), b_premium.sum() if weighted else None, len(b)))
+    data = {
+        'values': values,
+        'weights': weights,
+        'total_value': values.sum(),
+        'total_weight': weights.sum() if weighted else None,
+        'n_draw': min(len(a), len(b)),
+        'draw_a': len(a) <= len(b),
+    }
+    permuted = _run_resampling(_permutation_batch, data, n_resamples, len(values), batch_size, n_jobs, random_state)
+    p_value = (1 + np.count_nonzero(np.abs(permuted) >= np.abs(observed))) / (n_resamples + 1)
+    return {'statistic': observed, 'p_value': p_value, 'n_resamples': n_resamples}
+
+
+def bootstrap_ci(a, b, a_premium=None, b_premium=None, statistic='mean_diff', n_resamples=10000,
+                 confidence_level=0.95, batch_size=None, n_jobs=None, random_state=None):
+    """
+    Percentile bootstrap confidence interval of the difference between two groups.
+
+    Parameters are those of permutation_test, plus:
+    - confidence_level: Coverage of the interval.
+
+    Returns:
+    - Dictionary with the observed 'statistic', 'ci_low', 'ci_high' and 'std_error'.
+    """
+    a, b, a_premium, b_premium = _check_resampling_inputs(a, b, a_premium, b_premium, statistic)
+    weighted = statistic == 'loss_ratio_diff'
+    observed = (_group_statistic(a.sum(), a_premium.sum() if weighted else None, len(a))
+                - _group_statistic(b.sum(), b_premium.sum() if weighted else None, len(b)))
+    data = {'a_values': a, 'a_weights': a_premium, 'b_values': b, 'b_weights': b_premium}
+    resampled = _run_resampling(_bootstrap_batch, data, n_resamples, len(a) + len(b), batch_size, n_jobs, random_state)
+    alpha = 1 - confidence_level
+    ci_low, ci_high = np.quantile(resampled, [alpha / 2, 1 - alpha / 2])
+    return {'statistic': observed, 'ci_low': ci_low, 'ci_high': ci_high, 'std_error': resampled.std(ddof=1)}
+
+
+def benjamini_hochberg(p_values):
+    """
+    Benjamini-Hochberg adjusted p-values, controlling the false discovery rate of a
+    family of tests (rejecting where the adjusted p-value is below alpha).
+    NaN p-values are left out of the family and stay NaN.
+    """
+    p_values = np.asarray(p_values, dtype='float64')
+    adjusted = np.full(p_values.shape, np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    if len(tested) == 0:
+        return adjusted
+    order = tested[np.argsort(p_values[tested])]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    # Enforce monotonicity from the largest p-value down
+    adjusted[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1)
+    return adjusted
+
+
+def _parse_hypothesis(spec):
+    group_col, metric_col, test = spec[:3]
+    groups = spec[3] if len(spec) > 3 else None
+    if test not in HYPOTHESIS_TESTS:
+        raise ValueError(f"Unknown test '{test}', expected one of {HYPOTHESIS_TESTS}.")
+    if test == 't_test' and groups is not None and len(groups) != 2:
+        raise ValueError("The groups of a t-test are a pair (group_a, group_b).")
+    return group_col, metric_col, test, groups
+
+
+def _hypothesis_keys(df, group_col, postal_code_threshold):
+    """
+    Grouping keys of the rows as a Categorical; PostalCodeCategory is derived from
+    PostalCode by bucketing the postal codes with fewer than `postal_code_threshold` rows.
+    """
+    if group_col == 'PostalCodeCategory' and group_col not in df.columns:
+        postal_code = df['PostalCode']
+        if isinstance(postal_code.dtype, pd.CategoricalDtype):
+            codes, postal_codes = postal_code.cat.codes.to_numpy(), postal_code.cat.categories
+        else:
+            codes, postal_codes = pd.factorize(postal_code)
+        counts = np.bincount(codes[codes >= 0], minlength=len(postal_codes))
+        categories, _ = bucket_low_frequency(codes, postal_codes, counts, postal_code_threshold)
+        return categories
+    keys = df[group_col]
+    if not isinstance(keys.dtype, pd.CategoricalDtype):
+        keys = keys.astype('category')
+    return keys.array
+
+
+def _hypothesis_metric(df, metric_col):
+    if metric_col == 'Margin' and metric_col not in df.columns:
+        return df['TotalPremium'].to_numpy(dtype='float64') - df['TotalClaims'].to_numpy(dtype='float64')
+    return df[metric_col].to_numpy(dtype='float64')
+
+
+def _scan_group_stats(keys, metrics):
+    """
+    Count, sum, sum of squares, mean and sample variance of several metrics per group,
+    from one groupby over the rows.
+    """
+    frame = pd.DataFrame(metrics)
+    for metric_col, values in metrics.items():
+        frame[f"{metric_col}__sq"] = values ** 2
+    counts = frame[list(metrics)].notna()
+    counts.columns = [f"{metric_col}__n" for metric_col in metrics]
+    totals = pd.concat([frame, counts], axis=1).groupby(keys, observed=True).sum()
+
+    group_stats = {}
+    for metric_col in metrics:
+        metric_stats = pd.DataFrame({
+            'count': totals[f"{metric_col}__n"],
+            'sum': totals[metric_col],
+            'sumsq': totals[f"{metric_col}__sq"],
+        })
+        metric_stats['mean'] = metric_stats['sum'] / metric_stats['count']
+        metric_stats['var'] = (
+            (metric_stats['sumsq'] - metric_stats['count'] * metric_stats['mean'] ** 2) / (metric_stats['count'] - 1)
+        ).clip(lower=0)
+        group_stats[metric_col] = metric_stats
+    return group_stats
+
+
+def _cube_group_stats(cube, group_col, metric_cols):
+    group_stats = {}
+    rolled = cube.rollup([group_col])
+    for metric_col in metric_cols:
+        group_stats[metric_col] = pd.DataFrame({
+            'count': rolled[f"{metric_col}_count"],
+            'sum': rolled[f"{metric_col}_sum"],
+            'sumsq': rolled[f"{metric_col}_sumsq"],
+            'mean': rolled[f"{metric_col}_mean"],
+            'var': rolled[f"{metric_col}_var"],
+        })
+    return group_stats
+
+
+def _run_hypothesis(spec, group_stats, keys, metric, claim_bins):
+    """
+    Runs one test of the batch and returns its row of the results table.
+    """
+    group_col, metric_col, test, groups = spec
+    row = {'group_col': group_col, 'metric': metric_col, 'test': test}
+
+    if test == 't_test':
+        if groups is None:
+            # Split the groups around the average of the group means (see categorize_provinces)
+            means = group_stats['mean']
+            group_a = means.index[means > means.mean()].tolist()
+            group_b = means.index[means <= means.mean()].tolist()
+        else:
+            group_a, group_b = (np.atleast_1d(group).tolist() for group in groups)
+        n_a, mean_a, var_a = combine_group_stats(group_stats[group_stats.index.isin(group_a)])
+        n_b, mean_b, var_b = combine_group_stats(group_stats[group_stats.index.isin(group_b)])
+        if n_a == 0 or n_b == 0:
+            raise ValueError(f"One or both of the groups of {group_col} have no data for {metric_col}.")
+        statistic, p_value = welch_t_test_from_stats(n_a, mean_a, var_a, n_b, mean_b, var_b)
+        row.update({'comparison': f"{group_a} vs {group_b}", 'n_groups': 2, 'n_obs': n_a + n_b,
+                    'statistic': statistic, 'p_value': p_value})
+
+    elif test == 'anova':
+        if groups is not None:
+            group_stats = group_stats[group_stats.index.isin(list(groups))]
+        statistic, p_value = one_way_anova_from_stats(group_stats['count'], group_stats['mean'], group_stats['var'])
+        row.update({'comparison': 'all groups' if groups is None else str(list(groups)),
+                    'n_groups': int((group_stats['count'] > 0).sum()), 'n_obs': group_stats['count'].sum(),
+                    'statistic': statistic, 'p_value': p_value})
+
+    else:
+        row_codes = np.asarray(keys.codes)
+        if groups is not None:
+            row_codes = np.where(np.isin(np.asarray(keys), list(groups)), row_codes, -1)
+        col_codes = bin_claims(metric, claim_bins)
+        statistic, p_value, dof, _ = sparse_chi2_contingency(row_codes, col_codes)
+        row.update({'comparison': 'all groups' if groups is None else str(list(groups)),
+                    'n_groups': len(np.unique(row_codes[row_codes >= 0])),
+                    'n_obs': int(((row_codes >= 0) & (col_codes >= 0)).sum()),
+                    'statistic': statistic, 'p_value': p_value})
+    return row
+
+
+def run_hypothesis_tests(df, hypotheses=None, alpha=0.05, postal_code_threshold=10, claim_bins='raw',
+                         cube=None, n_jobs=None):
+    """
+    Runs a family of A/B hypothesis tests in one batch and corrects them for multiple
+    testing with the Benjamini-Hochberg procedure.
+
+    The group aggregates of all the t-tests and ANOVAs sharing a grouping column are
+    computed together in one groupby (or rolled up from `cube`), and the tests then run
+    concurrently from these statistics, without copying the DataFrame.
+
+    Parameters:
+    - df: The policy DataFrame.
+    - hypotheses: List of (grouping column, metric, test[, groups]) specs (default
+      DEFAULT_HYPOTHESES). The test is 't_test' (Welch), 'anova' or 'chi2' (the metric is
+      binned with bin_claims). For a t-test, groups is a pair (group_a, group_b) of values
+      or lists of values; without it the groups above and below the average group mean
+      are compared. For the other tests, groups optionally restricts the groups tested.
+      'PostalCodeCategory' and 'Margin' are derived when they are not columns of `df`.
+    - alpha: Significance level of the false discovery rate.
+    - postal_code_threshold: Minimum number of rows of a postal code outside the 'Other' bucket.
+    - claim_bins: Binning of the metric of the chi-square tests (see bin_claims).
+    - cube: Optional InsuranceCube of the same data to take the group aggregates from.
+    - n_jobs: Number of threads (default is the number of CPUs).
+
+    Returns:
+    - DataFrame with one row per hypothesis: the test 'statistic', raw 'p_value',
+      Benjamini-Hochberg 'p_adjusted' and whether the null hypothesis is rejected.
+    """
+    hypotheses = [_parse_hypothesis(spec) for spec in (hypotheses or DEFAULT_HYPOTHESES)]
+    group_cols = list(dict.fromkeys(spec[0] for spec in hypotheses))
+    metric_cols = list(dict.fromkeys(spec[1] for spec in hypotheses))
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        keys = dict(zip(group_cols, executor.map(
+            lambda group_col: _hypothesis_keys(df, group_col, postal_code_threshold), group_cols
+        )))
+        metrics = dict(zip(metric_cols, executor.map(lambda metric_col: _hypothesis_metric(df, metric_col), metric_cols)))
+
+        # One scan per grouping column for all the metrics of its t-tests and ANOVAs
+        def scan(group_col):
+            needed = list(dict.fromkeys(
+                metric_col for col, metric_col, test, _ in hypotheses if col == group_col and test != 'chi2'
+            ))
+            if not needed:
+                return {}
+            if (cube is not None and group_col in cube.dimensions
+                    and all(metric_col in cube.measures for metric_col in needed)):
+                return _cube_group_stats(cube, group_col, needed)
+            return _scan_group_stats(keys[group_col], {metric_col: metrics[metric_col] for metric_col in needed})
+
+        group_stats = dict(zip(group_cols, executor.map(scan, group_cols)))
+
+        rows = list(executor.map(
+            lambda spec: _run_hypothesis(
+                spec, group_stats[spec[0]].get(spec[1]), keys[spec[0]], metrics[spec[1]], claim_bins
+            ),
+            hypotheses
+        ))
+
+    results = pd.DataFrame(rows)
+    results.insert(0, 'hypothesis', [f"{metric_col} by {group_col} ({test})"
+                                     for group_col, metric_col, test, _ in hypotheses])
+    results['p_adjusted'] = benjamini_hochberg(results['p_value'])
+    results['reject'] = results['p_adjusted'] < alpha
+    return results
+
+
 class InsuranceDataUtils:
-    def __init__(self, df):
+    def __init__(self, df, cube=None):
         """
         Initializes the InsuranceDataUtils with a DataFrame.
+
+        Parameters:
+        - df: The policy DataFrame.
+        - cube: Optional InsuranceCube built from the same data. Group-level queries
+          (counts, sums, means and variances per group) are then rolled up from the
+          cube instead of grouping the rows of the DataFrame.
         """
         if not isinstance(df, pd.DataFrame):
             raise TypeError("The input must be a pandas DataFrame.")
         self.df = df.copy()
+        self.cube = cube
+        # (column, excluded values) of a row filter applied after the cube was built
+        self._cube_filter = None
+        self._postal_code_mapping = None
+        # Factorized PostalCode column and cached buckets per threshold
+        self._postal_code_factorized = None
+        self._postal_code_buckets = {}
+
+    def _can_use_cube(self, group_col, metric_col):
+        if self.cube is None or metric_col not in self.cube.measures:
+            return False
+        cube_col = 'PostalCode' if group_col == 'PostalCodeCategory' else group_col
+        if cube_col not in self.cube.dimensions:
+            return False
+        if group_col == 'PostalCodeCategory' and self._postal_code_mapping is None:
+            return False
+        return self._cube_filter is None or self._cube_filter[0] == group_col
+
+    def _group_stats(self, group_col, metric_col):
+        """
+        Count, sum, sum of squares, mean and sample variance of a metric per group,
+        rolled up from the cube when possible, otherwise computed with one groupby.
+        """
+        if self._can_use_cube(group_col, metric_col):
+            if group_col == 'PostalCodeCategory':
+                group_stats = self.cube.rollup(['PostalCode'])
+                keys = group_stats.index.astype(object).map(self._postal_code_mapping).rename(group_col)
+                group_stats = group_stats.groupby(keys).sum()
+            else:
+                group_stats = self.cube.rollup([group_col])
+            group_stats = group_stats[[f"{metric_col}_count", f"{metric_col}_sum", f"{metric_col}_sumsq"]]
+            group_stats.columns = ['count', 'sum', 'sumsq']
+            if self._cube_filter is not None:
+                group_stats = group_stats.drop(index=self._cube_filter[1], errors='ignore')
+            group_stats['mean'] = group_stats['sum'] / group_stats['count']
+            group_stats['var'] = (
+                (group_stats['sumsq'] - group_stats['count'] * group_stats['mean'] ** 2) / (group_stats['count'] - 1)
+            ).clip(lower=0)
+        else:
+            values = self.df[metric_col].astype('float64')
+            group_stats = values.groupby(self.df[group_col], observed=True).agg(['count', 'sum', 'mean', 'var'])
+            group_stats.insert(
+                2, 'sumsq',
+                group_stats['var'].fillna(0) * (group_stats['count'] - 1) + group_stats['count'] * group_stats['mean'] ** 2
+            )
+        return group_stats
 
     def categorize_provinces(self, metric_col):
         """
@@ -22,7 +626,7 @@ class InsuranceDataUtils:
         - low_risk_provinces: List of low-risk provinces.
         """
         # Calculate average metric per province
-        province_avg = self.df.groupby('Province')[metric_col].mean().reset_index()
+        province_avg = self._group_stats('Province', metric_col)['mean'].reset_index()
         province_avg.columns = ['Province', 'AverageMetric']
         
         # Calculate the overall average metric
@@ -34,7 +638,8 @@ class InsuranceDataUtils:
         
         return high_risk_provinces, low_risk_provinces
 
-    def test_risk_differences(self, metric_col, high_risk_provinces, low_risk_provinces):
+    def test_risk_differences(self, metric_col, high_risk_provinces, low_risk_provinces, method='welch',
+                              n_resamples=10000, n_jobs=None, random_state=None):
         """
         Test for significant differences in risk between high-risk and low-risk provinces.
 
@@ -42,22 +647,34 @@ class InsuranceDataUtils:
         - metric_col: The column name of the metric to analyze (e.g., 'TotalClaims').
         - high_risk_provinces: List of provinces classified as high-risk.
         - low_risk_provinces: List of provinces classified as low-risk.
+        - method: 'welch' (t-test) or 'permutation' (see permutation_test).
+        - n_resamples, n_jobs, random_state: Settings of the permutation test.
 
         Returns:
-        - t_statistic: The t-statistic of the test.
+        - t_statistic: The t-statistic of the test (the difference in means for method='permutation').
         - p_value: The p-value of the test.
         - interpretation: Interpretation of the results.
         """
-        # Filter data for each group
-        group_a_data = self.df[self.df['Province'].isin(high_risk_provinces)][metric_col]
-        group_b_data = self.df[self.df['Province'].isin(low_risk_provinces)][metric_col]
-        
-        # Check if there is enough data in each group
-        if len(group_a_data) == 0 or len(group_b_data) == 0:
-            raise ValueError("One or both of the groups have no data. Please check the group names and data.")
-        
-        # Perform t-test
-        t_statistic, p_value = stats.ttest_ind(group_a_data, group_b_data, equal_var=False)
+        if method == 'permutation':
+            result = self.resample_group_difference(
+                'Province', high_risk_provinces, low_risk_provinces, metric_col, n_resamples=n_resamples,
+                n_jobs=n_jobs, random_state=random_state, confidence_level=None
+            )
+            t_statistic, p_value = result['statistic'], result['p_value']
+        elif method == 'welch':
+            # Pool the per-province statistics of each group (no per-group copy of the data)
+            province_stats = self._group_stats('Province', metric_col)
+            n_a, mean_a, var_a = combine_group_stats(province_stats[province_stats.index.isin(high_risk_provinces)])
+            n_b, mean_b, var_b = combine_group_stats(province_stats[province_stats.index.isin(low_risk_provinces)])
+
+            # Check if there is enough data in each group
+            if n_a == 0 or n_b == 0:
+                raise ValueError("One or both of the groups have no data. Please check the group names and data.")
+
+            # Perform t-test
+            t_statistic, p_value = welch_t_test_from_stats(n_a, mean_a, var_a, n_b, mean_b, var_b)
+        else:
+            raise ValueError("method must be either 'welch' or 'permutation'.")
         
         # Interpretation
         if p_value < 0.05:
@@ -67,6 +684,45 @@ class InsuranceDataUtils:
         
         return t_statistic, p_value, interpretation
 
+    def resample_group_difference(self, group_col, group_a, group_b, metric_col='TotalClaims',
+                                  statistic='mean_diff', n_resamples=10000, confidence_level=0.95,
+                                  n_jobs=None, random_state=None):
+        """
+        Permutation test and bootstrap confidence interval of the difference between two
+        groups of rows, e.g. high- and low-risk provinces or male and female policyholders.
+
+        Parameters:
+        - group_col: Column defining the groups (e.g., 'Province', 'Gender').
+        - group_a, group_b: Value or list of values of `group_col` in each group.
+        - metric_col: The metric to compare (e.g., 'TotalClaims').
+        - statistic: 'mean_diff' or 'loss_ratio_diff' (claims over TotalPremium).
+        - n_resamples: Number of permutations and of bootstrap resamples.
+        - confidence_level: Coverage of the bootstrap interval (None skips the bootstrap).
+        - n_jobs, random_state: Worker processes and seed of the resampling.
+
+        Returns:
+        - Dictionary with the observed 'statistic', the permutation 'p_value' and, when
+          requested, the bootstrap 'ci_low', 'ci_high' and 'std_error'.
+        """
+        groups = self.df[group_col]
+        in_a = groups.isin(np.atleast_1d(group_a)).to_numpy()
+        in_b = groups.isin(np.atleast_1d(group_b)).to_numpy()
+        values = self.df[metric_col].to_numpy(dtype='float64')
+        premiums = self.df['TotalPremium'].to_numpy(dtype='float64') if statistic == 'loss_ratio_diff' else None
+
+        arrays = {
+            'a': values[in_a], 'b': values[in_b],
+            'a_premium': None if premiums is None else premiums[in_a],
+            'b_premium': None if premiums is None else premiums[in_b],
+        }
+        result = permutation_test(**arrays, statistic=statistic, n_resamples=n_resamples, n_jobs=n_jobs,
+                                  random_state=random_state)
+        if confidence_level is not None:
+            interval = bootstrap_ci(**arrays, statistic=statistic, n_resamples=n_resamples,
+                                    confidence_level=confidence_level, n_jobs=n_jobs, random_state=random_state)
+            result.update({key: interval[key] for key in ['ci_low', 'ci_high', 'std_error']})
+        return result
+
     def print_summary(self, t_statistic, p_value, interpretation):
         """
         Print the summary of the test results.
@@ -79,39 +735,66 @@ class InsuranceDataUtils:
         """
         Categorize postal codes based on their frequency.
         Postal codes with occurrences below the threshold are categorized as 'Other'.
+
+        The bucketing works on integer category codes through a code -> bucket lookup
+        array, and the resulting categorical 'PostalCodeCategory' column is cached per
+        threshold, so repeated analyses reuse it.
         """
-        # Count occurrences of each postal code
-        postal_code_counts = self.df['PostalCode'].value_counts()
-        
-        # Define a category for postal codes that occur less than the threshold
-        low_frequency_postal_codes = postal_code_counts[postal_code_counts < threshold].index
-        
-        # Use .loc to avoid SettingWithCopyWarning
-        self.df.loc[:, 'PostalCodeCategory'] = self.df['PostalCode'].apply(
-            lambda x: 'Other' if x in low_frequency_postal_codes else x
-        )
+        if threshold not in self._postal_code_buckets:
+            codes, postal_codes = self._postal_code_codes()
+
+            # Count occurrences of each postal code
+            if self.cube is not None and 'PostalCode' in self.cube.dimensions and self._cube_filter is None:
+                cube_counts = self.cube.rollup(['PostalCode'])['count']
+                counts = cube_counts.reindex(postal_codes, fill_value=0).to_numpy()
+            else:
+                counts = np.bincount(codes[codes >= 0], minlength=len(postal_codes))
+
+            self._postal_code_buckets[threshold] = bucket_low_frequency(codes, postal_codes, counts, threshold)
+
+        categories, self._postal_code_mapping = self._postal_code_buckets[threshold]
+        self.df['PostalCodeCategory'] = pd.Series(categories, index=self.df.index)
         return self.df
 
-    def analyze(self, threshold=10):
+    def _postal_code_codes(self):
+        """
+        Integer codes (-1 for missing) and labels of the PostalCode column, computed once.
+        """
+        if self._postal_code_factorized is None:
+            postal_code = self.df['PostalCode']
+            if isinstance(postal_code.dtype, pd.CategoricalDtype):
+                codes, postal_codes = postal_code.cat.codes.to_numpy(), postal_code.cat.categories
+            else:
+                codes, postal_codes = pd.factorize(postal_code)
+            self._postal_code_factorized = (codes, postal_codes)
+        return self._postal_code_factorized
+
+    def analyze(self, threshold=10, claim_bins='raw'):
         """
         Perform the analysis by categorizing postal codes and running Chi-Square test.
+
+        The contingency table of postal code categories against claims is built as a
+        sparse matrix from category codes (see sparse_chi2_contingency), with the claims
+        binned according to `claim_bins` ('raw', 'zero' or a number of quantile bins,
+        see bin_claims).
         """
         # Step 1: Categorize Postal Codes
         self.categorize_postal_codes(threshold)
         
         # Step 2: Aggregate total claims by postal code category
-        category_claims = self.df.groupby('PostalCodeCategory')['TotalClaims'].sum().reset_index()
+        category_claims = self._group_stats('PostalCodeCategory', 'TotalClaims')['sum'].rename('TotalClaims').reset_index()
         
         # Print the aggregated results for review
         print("Category Claims:")
         print(category_claims)
         
         # Step 3: Perform Chi-Square Test
-        # Create a contingency table
-        contingency_table = pd.crosstab(self.df['PostalCodeCategory'], self.df['TotalClaims'])
+        # Encode the rows and columns of the (sparse) contingency table
+        row_codes = self.df['PostalCodeCategory'].cat.codes.to_numpy()
+        col_codes = bin_claims(self.df['TotalClaims'], claim_bins)
         
         # Perform Chi-Square Test
-        chi2_stat, p_value, dof, expected = stats.chi2_contingency(contingency_table)
+        chi2_stat, p_value, dof, expected = sparse_chi2_contingency(row_codes, col_codes)
         
         # Print Chi-Square Test Results
         print("Chi-Square Test Results:")
@@ -141,17 +824,17 @@ class InsuranceDataUtils:
         self.df['Margin'] = self.df['TotalPremium'] - self.df['TotalClaims']
         
         # Step 3: Aggregate margins by postal code category
-        category_margin = self.df.groupby('PostalCodeCategory')['Margin'].mean().reset_index()
+        category_stats = self._group_stats('PostalCodeCategory', 'Margin')
+        category_margin = category_stats['mean'].rename('Margin').reset_index()
         
         # Print aggregated margins for review
         print("Category Margins: ")
         print(category_margin)
         
-        # Prepare data for statistical tests
-        grouped_data = [group['Margin'].values for name, group in self.df.groupby('PostalCodeCategory')]
-        
-        # Step 4: Perform ANOVA test
-        f_stat, p_value = stats.f_oneway(*grouped_data)
+        # Step 4: Perform ANOVA test from the per-category statistics
+        f_stat, p_value = one_way_anova_from_stats(
+            category_stats['count'], category_stats['mean'], category_stats['var']
+        )
         
         # Print test results
         print("ANOVA Test Results:")
@@ -174,37 +857,62 @@ class InsuranceDataUtils:
         and calculate average TotalClaims by Gender.
         """
         # Filter out unwanted rows
-        self.df = self.df[~self.df['Gender'].isin(['Not specified', 'Unknown'])]
+        excluded_genders = ['Not specified', 'Unknown']
+        self.df = self.df[~self.df['Gender'].isin(excluded_genders)]
+        self._postal_code_factorized = None
+        self._postal_code_buckets = {}
+        # The cube still holds the filtered rows, so it can only answer Gender queries
+        self._cube_filter = ('Gender', excluded_genders)
         
         # Calculate average TotalClaims by Gender
-        self.avg_claims = self.df.groupby('Gender')['TotalClaims'].mean()
+        self.avg_claims = self._group_stats('Gender', 'TotalClaims')['mean'].rename('TotalClaims')
         return self.avg_claims
 
-    def perform_t_test_and_interpret(self):
+    def perform_t_test_and_interpret(self, method='welch', n_resamples=10000, n_jobs=None, random_state=None):
         """
         Perform a Two-Sample T-Test between 'Female' and 'Male' for TotalClaims,
         and print results and interpretation.
+
+        With method='permutation', a permutation test and a bootstrap confidence interval
+        of the difference in mean claims are used instead (see resample_group_difference).
         """
         # Ensure that the average claims have been calculated
         if not hasattr(self, 'avg_claims'):
             raise ValueError("Average claims not calculated. Please run preprocess_and_calculate first.")
         
-        # Split data into two groups
-        male_claims = self.df[self.df['Gender'] == 'Male']['TotalClaims']
-        female_claims = self.df[self.df['Gender'] == 'Female']['TotalClaims']
-        
-        # Perform T-Test
-        t_stat, p_value = stats.ttest_ind(male_claims, female_claims, equal_var=False)
-        
         # Print results
         print("Average Claims by Gender:")
         print(self.avg_claims)
         
-        print("T-Test Results:")
-        print({
-            'T-Statistic': t_stat,
-            'P-Value': p_value
-        })
+        if method == 'permutation':
+            result = self.resample_group_difference(
+                'Gender', 'Male', 'Female', 'TotalClaims', n_resamples=n_resamples, n_jobs=n_jobs,
+                random_state=random_state
+            )
+            p_value = result['p_value']
+            print("Permutation Test Results:")
+            print({
+                'Mean Difference': result['statistic'],
+                'P-Value': p_value,
+                'Bootstrap CI': (result['ci_low'], result['ci_high'])
+            })
+        elif method == 'welch':
+            # Per-gender statistics from one groupby (no per-group copy of the data)
+            gender_stats = self._group_stats('Gender', 'TotalClaims')
+            male, female = gender_stats.loc['Male'], gender_stats.loc['Female']
+
+            # Perform T-Test
+            t_stat, p_value = welch_t_test_from_stats(
+                male['count'], male['mean'], male['var'], female['count'], female['mean'], female['var']
+            )
+
+            print("T-Test Results:")
+            print({
+                'T-Statistic': t_stat,
+                'P-Value': p_value
+            })
+        else:
+            raise ValueError("method must be either 'welch' or 'permutation'.")
         
         # Interpretation
         if p_value < 0.05:
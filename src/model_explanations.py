@@ -0,0 +1,402 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import lime.lime_tabular
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+import shap
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+# Rows explained per chunk (each chunk is densified on its own, so memory is bounded by
+# the chunk and not by the sample) and rows of the summarized background set
+SHAP_CHUNK_SIZE = 500
+SHAP_BACKGROUND_SIZE = 100
+
+# Training rows LIME takes its feature statistics and discretization quartiles from
+LIME_TRAINING_ROWS = 10000
+IMPORTANCE_METRICS = {
+    'rmse': lambda y_true, y_pred: np.sqrt(mean_squared_error(y_true, y_pred)),
+    'mae': mean_absolute_error
+}
+LIME_COLUMNS = ['row', 'rank', 'feature', 'rule', 'weight', 'intercept', 'local_prediction', 'prediction', 'score']
+
+# Explainer of the running explanation, built once in each worker process by its initializer
+_explanation_data = None
+
+
+def _init_explanation_worker(model, background):
+    global _explanation_data
+    _explanation_data = {'model': model, 'explainer': _make_explainer(model, background)}
+
+
+def _init_lime_worker(model, training_rows, feature_names, num_features, num_samples, random_state):
+    global _explanation_data
+    _explanation_data = {
+        'model': model,
+        'explainer': lime.lime_tabular.LimeTabularExplainer(
+            training_data=training_rows, feature_names=feature_names, mode='regression', random_state=random_state
+        ),
+        'num_features': num_features,
+        'num_samples': num_samples,
+        'random_state': random_state
+    }
+
+
+def model_hash(model):
+    # Content hash of a fitted model: refitting or retuning changes it, so cached
+    # explanations are never reused for a different model
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return hashlib.blake2b(buffer.getvalue(), digest_size=16).hexdigest()
+
+
+def _data_hash(X, *extra):
+    digest = hashlib.blake2b(digest_size=16)
+    if sparse.issparse(X):
+        X = sparse.csr_matrix(X)
+        parts = [X.data, X.indices, X.indptr]
+    else:
+        parts = [np.asarray(X.to_numpy() if isinstance(X, pd.DataFrame) else X)]
+    for part in parts:
+        digest.update(np.ascontiguousarray(part).tobytes())
+    digest.update(repr((X.shape,) + extra).encode())
+    return digest.hexdigest()
+
+
+def is_tree_model(model):
+    # Single trees, forests of trees and XGBoost models have an exact fast TreeExplainer path
+    if isinstance(model, xgb.XGBModel) or hasattr(model, 'tree_'):
+        return True
+    estimators = getattr(model, 'estimators_', None)
+    return estimators is not None and all(hasattr(e, 'tree_') for e in np.ravel(estimators))
+
+
+def _take_rows(X, rows):
+    if isinstance(X, pd.DataFrame):
+        return X.iloc[rows]
+    return X[rows]
+
+
+def _dense(X):
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(dtype='float64')
+    return X.toarray() if sparse.issparse(X) else np.asarray(X, dtype='float64')
+
+
+def _model_input(model, X):
+    # Dense rows as the model sees them: sklearn trees and XGBoost split on float32, so
+    # the rows are rounded to float32 for the explainer to follow the same branches
+    X = _dense(X)
+    return X.astype('float32').astype('float64') if is_tree_model(model) else X
+
+
+def stratified_sample(y, n_samples, n_bins=10, random_state=None):
+    # Row positions of a sample stratified on quantile bins of the target, so the rare
+    # large values (e.g. the few non-zero claims) are represented. The bins are closed on
+    # the right and tied quantiles merge, so the mass of zero claims is one stratum
+    y = np.asarray(y, dtype='float64')
+    if n_samples is None or n_samples >= len(y):
+        return np.arange(len(y))
+    rng = np.random.default_rng(random_state)
+    edges = np.unique(np.quantile(y, np.linspace(0, 1, n_bins + 1)))
+    strata = np.searchsorted(edges, y, side='left')
+    chosen = []
+    for stratum in np.unique(strata):
+        members = np.flatnonzero(strata == stratum)
+        size = min(len(members), max(1, round(n_samples * len(members) / len(y))))
+        chosen.append(rng.choice(members, size, replace=False))
+    return np.sort(np.concatenate(chosen))
+
+
+def summarize_background(model, X, n_background=SHAP_BACKGROUND_SIZE, random_state=0):
+    # Small background set instead of the full training matrix: tree models need none
+    # (path-dependent TreeExplainer), linear models a row sample (only its mean and
+    # covariance are used) and other models k-means centroids weighted by cluster size
+    if is_tree_model(model):
+        return None
+    rng = np.random.default_rng(random_state)
+    # k-means runs on a row sample, so the full matrix is never densified
+    rows = np.sort(rng.choice(X.shape[0], min(X.shape[0], 20 * n_background), replace=False))
+    X_sample = _dense(_take_rows(X, rows))
+    if hasattr(model, 'coef_'):
+        return shap.sample(X_sample, n_background, random_state=random_state)
+    return shap.kmeans(X_sample, min(n_background, len(X_sample)))
+
+
+def _make_explainer(model, background):
+    # Path-dependent TreeSHAP is exact for any depth; the interventional algorithm loses
+    # additivity on the deep unpruned trees of the forests
+    if is_tree_model(model):
+        return shap.TreeExplainer(model, feature_perturbation='tree_path_dependent')
+    if hasattr(model, 'coef_'):
+        return shap.LinearExplainer(model, background)
+    return shap.KernelExplainer(model.predict, background)
+
+
+def _explain_chunk(X_chunk):
+    explainer = _explanation_data['explainer']
+    X_chunk = _model_input(_explanation_data['model'], X_chunk)
+    if isinstance(explainer, shap.KernelExplainer):
+        values = explainer.shap_values(X_chunk, silent=True)
+    else:
+        values = explainer.shap_values(X_chunk)
+    base_values = np.broadcast_to(np.ravel(explainer.expected_value)[0], len(X_chunk))
+    return np.asarray(values, dtype='float64'), np.array(base_values, dtype='float64')
+
+
+def explain_model(model, X, feature_names=None, y=None, X_background=None, n_samples=2000,
+                  n_background=SHAP_BACKGROUND_SIZE, chunk_size=SHAP_CHUNK_SIZE, n_jobs=None,
+                  cache_dir=None, random_state=0):
+    # SHAP values of a sample of the rows of X (stratified on y when given), computed in
+    # chunks on a process pool (default one process per core; n_jobs=1 explains in this
+    # process). With a cache_dir, the values are saved as
+    # <cache_dir>/<model hash>/<sample hash>.npz and reloaded instead of recomputed.
+    # Returns a shap.Explanation for the summary plots.
+    if feature_names is None and isinstance(X, pd.DataFrame):
+        feature_names = list(X.columns)
+    if y is not None:
+        rows = stratified_sample(y, n_samples, random_state=random_state)
+    elif n_samples is not None and n_samples < X.shape[0]:
+        rows = np.sort(np.random.default_rng(random_state).choice(X.shape[0], n_samples, replace=False))
+    else:
+        rows = np.arange(X.shape[0])
+    X_sample = _take_rows(X, rows)
+
+    cache_path = None
+    if cache_dir is not None:
+        key = _data_hash(X_sample, n_background, random_state, X_background is not None)
+        cache_path = os.path.join(cache_dir, model_hash(model), f"{key}.npz")
+        if os.path.exists(cache_path):
+            print(f"Loading cached SHAP values from {cache_path}")
+            cached = np.load(cache_path, allow_pickle=False)
+            return shap.Explanation(cached['values'], base_values=cached['base_values'], data=cached['data'],
+                                    feature_names=list(cached['feature_names']) or feature_names)
+
+    background = summarize_background(model, X if X_background is None else X_background, n_background,
+                                      random_state)
+    chunks = [_take_rows(X_sample, slice(start, start + chunk_size))
+              for start in range(0, len(rows), chunk_size)]
+    n_jobs = min(n_jobs or os.cpu_count(), len(chunks))
+    print(f"Explaining {len(rows)} rows in {len(chunks)} chunks on {n_jobs} process(es)...")
+    if n_jobs == 1:
+        global _explanation_data
+        previous = _explanation_data
+        _init_explanation_worker(model, background)
+        try:
+            results = [_explain_chunk(chunk) for chunk in chunks]
+        finally:
+            _explanation_data = previous
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_explanation_worker,
+                                 initargs=(model, background)) as executor:
+            results = list(executor.map(_explain_chunk, chunks))
+
+    values = np.concatenate([chunk_values for chunk_values, _ in results])
+    base_values = np.concatenate([chunk_base for _, chunk_base in results])
+    data = _dense(X_sample)
+    if cache_path is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write to a temporary file first so a partial file is never loaded
+        with open(cache_path + '.tmp', 'wb') as f:
+            np.savez_compressed(f, values=values, base_values=base_values, data=data, rows=rows,
+                                feature_names=np.array(feature_names if feature_names is not None else [], dtype=str))
+        os.replace(cache_path + '.tmp', cache_path)
+        print(f"SHAP values saved to {cache_path}")
+    return shap.Explanation(values, base_values=base_values, data=data, feature_names=feature_names)
+
+
+def select_rows(model, X, y=None, n_rows=20, strategy='residual', random_state=0):
+    # Row positions to explain: the n_rows largest absolute residuals, largest first
+    # (needs the actual values y), or a random sample
+    if strategy not in ('residual', 'random'):
+        raise ValueError(f"Unknown row selection strategy '{strategy}'. Use 'residual' or 'random'.")
+    n_rows = min(n_rows, X.shape[0])
+    if strategy == 'residual':
+        if y is None:
+            raise ValueError("The residual strategy needs the actual values y.")
+        residuals = np.abs(np.asarray(y, dtype='float64') - model.predict(X))
+        rows = np.argpartition(residuals, -n_rows)[-n_rows:]
+        return rows[np.argsort(-residuals[rows], kind='stable')]
+    return np.sort(np.random.default_rng(random_state).choice(X.shape[0], n_rows, replace=False))
+
+
+def _lime_chunk(rows, X_rows):
+    data = _explanation_data
+    explainer = data['explainer']
+    records = []
+    for row, x in zip(rows, X_rows):
+        # Seeding each row (the sampler and the discretizer) makes its explanation
+        # independent of the chunking
+        seed = None if data['random_state'] is None else data['random_state'] + int(row)
+        explainer.random_state = np.random.RandomState(seed)
+        if explainer.discretizer is not None:
+            explainer.discretizer.random_state = explainer.random_state
+        exp = explainer.explain_instance(x, data['model'].predict, num_features=data['num_features'],
+                                         num_samples=data['num_samples'])
+        for rank, ((feature, weight), (rule, _)) in enumerate(zip(exp.as_map()[1], exp.as_list()), start=1):
+            records.append({
+                'row': int(row), 'rank': rank, 'feature': explainer.feature_names[feature], 'rule': rule,
+                'weight': weight, 'intercept': exp.intercept[1], 'local_prediction': exp.local_pred[0],
+                'prediction': exp.predicted_value, 'score': exp.score
+            })
+    return records
+
+
+def explain_rows_lime(model, X, X_train, feature_names=None, y=None, rows=None, n_rows=20, strategy='residual',
+                      num_features=10, num_samples=5000, n_jobs=None, random_state=0):
+    # LIME explanations of selected rows of X (see select_rows, or explicit row positions),
+    # run in chunks on a process pool (default one process per core; n_jobs=1 explains
+    # in this process). The explainer takes its statistics from a sample of X_train.
+    # Returns one tidy row per (explained row, feature) with the local weight, the
+    # discretized rule, the intercept and the local and model predictions.
+    if feature_names is None:
+        feature_names = list(X.columns) if isinstance(X, pd.DataFrame) else [f"Feature {i}" for i in range(X.shape[1])]
+    if rows is None:
+        rows = select_rows(model, X, y, n_rows, strategy, random_state)
+    rows = np.asarray(rows)
+    rng = np.random.default_rng(random_state)
+    training_rows = np.sort(rng.choice(X_train.shape[0], min(X_train.shape[0], LIME_TRAINING_ROWS), replace=False))
+    training_rows = _dense(_take_rows(X_train, training_rows))
+    X_rows = _dense(_take_rows(X, rows))
+
+    n_jobs = min(n_jobs or os.cpu_count(), len(rows))
+    chunk_size = -(-len(rows) // n_jobs)
+    chunks = [(rows[start:start + chunk_size], X_rows[start:start + chunk_size])
+              for start in range(0, len(rows), chunk_size)]
+    initargs = (model, training_rows, feature_names, num_features, num_samples, random_state)
+    print(f"Explaining {len(rows)} rows with LIME on {n_jobs} process(es)...")
+    if n_jobs == 1:
+        global _explanation_data
+        previous = _explanation_data
+        _init_lime_worker(*initargs)
+        try:
+            results = [_lime_chunk(*chunk) for chunk in chunks]
+        finally:
+            _explanation_data = previous
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_lime_worker, initargs=initargs) as executor:
+            results = list(executor.map(_lime_chunk, *zip(*chunks)))
+
+    weights = pd.DataFrame([record for chunk in results for record in chunk], columns=LIME_COLUMNS)
+    if y is not None:
+        weights['actual'] = np.asarray(y, dtype='float64')[weights['row'].to_numpy()]
+    return weights
+
+
+def _init_importance_worker(model, X, y, metric, baseline, columns):
+    # Each process permutes the columns of its own working copy of X in place and
+    # restores them, and predicts the working copy itself, so no design matrix is copied
+    # per (feature, repeat). Sparse input is held as CSC, where a column is one contiguous
+    # slice of indices and data; models that only predict CSR (e.g. the sklearn trees)
+    # still convert it inside predict, linear models and XGBoost take it as is.
+    global _explanation_data
+    if sparse.issparse(X):
+        X = sparse.csc_matrix(X)
+        X.sort_indices()
+        X_work = X.copy()
+    else:
+        X = np.asfortranarray(X, dtype='float64')
+        X_work = X.copy(order='F')
+    _explanation_data = {
+        'model': model, 'X': X, 'X_work': X_work, 'y': y, 'metric': metric, 'baseline': baseline,
+        'columns': columns, 'inverse': np.empty(X.shape[0], dtype=np.int64),
+        'positions': np.arange(X.shape[0], dtype=np.int64)
+    }
+
+
+def _permuted_score(j, perm):
+    data = _explanation_data
+    X, X_work = data['X'], data['X_work']
+    if sparse.issparse(X):
+        # Shuffling the rows of column j moves the entry of row r to row inverse[r]: remap
+        # the row indices of the column's slice, keeping them sorted
+        start, end = X.indptr[j], X.indptr[j + 1]
+        data['inverse'][perm] = data['positions']
+        rows = data['inverse'][X.indices[start:end]]
+        order = np.argsort(rows, kind='stable')
+        X_work.indices[start:end] = rows[order]
+        X_work.data[start:end] = X.data[start:end][order]
+        X_input = X_work
+    else:
+        np.take(X[:, j], perm, out=X_work[:, j])
+        X_input = X_work if data['columns'] is None else pd.DataFrame(X_work, columns=data['columns'], copy=False)
+    try:
+        return data['metric'](data['y'], data['model'].predict(X_input))
+    finally:
+        if sparse.issparse(X):
+            X_work.indices[start:end] = X.indices[start:end]
+            X_work.data[start:end] = X.data[start:end]
+        else:
+            X_work[:, j] = X[:, j]
+
+
+def _importance_chunk(tasks, random_state):
+    # Every (feature, repeat) draws its permutation from its own seed, so the scores do
+    # not depend on how the tasks are split across processes
+    n_rows = _explanation_data['X'].shape[0]
+    scores = []
+    for j, repeat in tasks:
+        perm = np.random.default_rng([random_state, j, repeat]).permutation(n_rows)
+        scores.append((j, repeat, _permuted_score(j, perm)))
+    return scores
+
+
+def permutation_importance(model, X, y, feature_names=None, n_repeats=5, metric='rmse', max_rows=None,
+                           n_jobs=None, random_state=0):
+    # Model-agnostic permutation importance: the increase of the error (metric 'rmse' or
+    # 'mae') over the single baseline prediction when one column is shuffled, averaged
+    # over n_repeats shuffles. The (feature, repeat) tasks run in chunks on a process
+    # pool (default one process per core; n_jobs=1 runs in this process). max_rows
+    # optionally scores a random subsample of the rows.
+    # Returns the features ranked by mean importance.
+    if metric not in IMPORTANCE_METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Use one of {list(IMPORTANCE_METRICS)}.")
+    columns = list(X.columns) if isinstance(X, pd.DataFrame) else None
+    if feature_names is None:
+        feature_names = columns or [f"Feature {i}" for i in range(X.shape[1])]
+    y = np.asarray(y, dtype='float64')
+    if random_state is None:
+        # Fresh entropy, drawn once here so every worker seeds from the same value
+        random_state = np.random.SeedSequence().entropy
+    if max_rows is not None and max_rows < X.shape[0]:
+        rows = np.sort(np.random.default_rng(random_state).choice(X.shape[0], max_rows, replace=False))
+        X, y = _take_rows(X, rows), y[rows]
+    if isinstance(X, pd.DataFrame):
+        X = X.to_numpy(dtype='float64')
+
+    score = IMPORTANCE_METRICS[metric]
+    baseline = score(y, model.predict(X if columns is None else pd.DataFrame(X, columns=columns)))
+    tasks = [(j, repeat) for j in range(X.shape[1]) for repeat in range(n_repeats)]
+    n_jobs = min(n_jobs or os.cpu_count(), len(tasks))
+    chunks = [chunk.tolist() for chunk in np.array_split(np.array(tasks), min(len(tasks), 4 * n_jobs))]
+    initargs = (model, X, y, score, baseline, columns)
+    if n_jobs == 1:
+        global _explanation_data
+        previous = _explanation_data
+        _init_importance_worker(*initargs)
+        try:
+            results = [_importance_chunk(chunk, random_state) for chunk in chunks]
+        finally:
+            _explanation_data = previous
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_importance_worker,
+                                 initargs=initargs) as executor:
+            results = list(executor.map(_importance_chunk, chunks, [random_state] * len(chunks)))
+
+    scores = np.empty((X.shape[1], n_repeats))
+    for chunk in results:
+        for j, repeat, permuted in chunk:
+            scores[j, repeat] = permuted - baseline
+    importances = pd.DataFrame({
+        'feature': feature_names,
+        'importance_mean': scores.mean(axis=1),
+        'importance_std': scores.std(axis=1),
+        'baseline': baseline
+    }).sort_values('importance_mean', ascending=False, kind='stable', ignore_index=True)
+    importances.insert(0, 'rank', np.arange(1, len(importances) + 1))
+    return importances
@@ -0,0 +1,209 @@
+# src/model_registry.py
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import joblib
+import pandas as pd
+import scipy.sparse as sparse
+
+MODEL_FILE = 'model.joblib'
+PREPROCESSOR_FILE = 'preprocessor.joblib'
+IMPUTER_FILE = 'imputer.joblib'
+CAPPER_FILE = 'capper.joblib'
+METADATA_FILE = 'metadata.json'
+
+
+class RegisteredModel:
+    """
+    A fitted model loaded from the registry together with the feature transformer it was
+    trained with, the missing-value imputer and outlier capper that cleaned its training
+    data (when they were saved with it) and its metadata.
+    """
+
+    def __init__(self, model, preprocessor, metadata: dict, imputer=None, capper=None):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.metadata = metadata
+        self.imputer = imputer
+        self.capper = capper
+
+    @property
+    def feature_columns(self) -> list:
+        """
+        Input columns the transformer needs.
+        """
+        return input_columns(self.preprocessor)
+
+    def clean(self, policies: pd.DataFrame) -> pd.DataFrame:
+        """
+        Applies the fitted imputer and outlier capper of the training data to raw policies,
+        before feature engineering, so they are cleaned exactly like the training rows.
+
+        :param policies: Raw policies (e.g. a chunk of load_data)
+        :return: The cleaned policies (unchanged if the model was saved without cleaners)
+        """
+        if self.imputer is not None:
+            policies = self.imputer.transform(policies)
+        if self.capper is not None:
+            policies = self.capper.transform(policies)
+        return policies
+
+    def predict(self, features: pd.DataFrame):
+        """
+        Transforms engineered features (see Future_Engineering.engineer_features) and
+        predicts them in one vectorized call.
+
+        :param features: DataFrame with the feature columns
+        :return: Array of predictions
+        """
+        return self.predict_transformed(self.transform(features))
+
+    def transform(self, features: pd.DataFrame):
+        """
+        Transforms engineered features into the design matrix of the model.
+        """
+        X = self.preprocessor.transform(features[self.feature_columns])
+        return sparse.csr_matrix(X) if sparse.issparse(X) else X
+
+    def predict_transformed(self, X):
+        """
+        Predicts an already transformed design matrix.
+        """
+        return self.model.predict(X)
+
+
+def input_columns(preprocessor) -> list:
+    """
+    Input columns a fitted ColumnTransformer actually uses (columns it drops, such as the
+    targets of the training frame, are not needed to transform new policies).
+    """
+    if not hasattr(preprocessor, 'transformers_'):
+        return list(getattr(preprocessor, 'feature_names_in_', []))
+    columns = []
+    for name, transformer, transformer_columns in preprocessor.transformers_:
+        if name != 'remainder' and transformer != 'drop':
+            columns.extend(transformer_columns)
+    return columns
+
+
+def save_model(registry_dir: str, name: str, model, preprocessor, metadata: dict = None,
+               imputer=None, capper=None) -> str:
+    """
+    Saves a fitted model, its fitted feature transformer, the fitted cleaners of its
+    training data and its metadata as the next version of `name` in the registry
+    (<registry_dir>/<name>/v<N>/).
+
+    :param registry_dir: Root directory of the registry
+    :param name: Name of the model, e.g. 'TotalPremium_XGBoost'
+    :param model: Fitted estimator
+    :param preprocessor: Fitted feature transformer the model was trained with
+    :param metadata: Extra JSON-serializable metadata (target, metrics, ...)
+    :param imputer: Fitted data_preprocessing.MissingValueImputer applied to the raw training data
+    :param capper: Fitted data_preprocessing.OutlierCapper applied to the raw training data
+    :return: Path of the saved version
+    """
+    model_dir = os.path.join(registry_dir, name)
+    os.makedirs(model_dir, exist_ok=True)
+    version = max(_versions(model_dir), default=0) + 1
+    version_dir = os.path.join(model_dir, f"v{version}")
+
+    metadata = {
+        'name': name,
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'model_class': type(model).__name__,
+        'params': model.get_params() if hasattr(model, 'get_params') else {},
+        'feature_columns': input_columns(preprocessor),
+        'feature_names': list(preprocessor.get_feature_names_out()) if hasattr(preprocessor, 'get_feature_names_out') else [],
+        **(metadata or {})
+    }
+
+    # Write to a temporary directory first so a version is only visible once complete
+    tmp_dir = version_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    joblib.dump(model, os.path.join(tmp_dir, MODEL_FILE))
+    joblib.dump(preprocessor, os.path.join(tmp_dir, PREPROCESSOR_FILE))
+    # Models saved with the same transformer (and cleaners) share its hash, so scoring can
+    # clean and transform once for all of them
+    with open(os.path.join(tmp_dir, PREPROCESSOR_FILE), 'rb') as f:
+        metadata['preprocessor_hash'] = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    cleaning_digest = hashlib.blake2b(digest_size=16)
+    for cleaner, file_name in [(imputer, IMPUTER_FILE), (capper, CAPPER_FILE)]:
+        if cleaner is not None:
+            joblib.dump(cleaner, os.path.join(tmp_dir, file_name))
+            with open(os.path.join(tmp_dir, file_name), 'rb') as f:
+                cleaning_digest.update(f.read())
+    metadata['cleaning_hash'] = cleaning_digest.hexdigest() if imputer is not None or capper is not None else None
+    with open(os.path.join(tmp_dir, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+    os.replace(tmp_dir, version_dir)
+
+    print(f"Model {name} saved as version {version} to {version_dir}")
+    return version_dir
+
+
+def load_model(registry_dir: str, name: str, version: int = None) -> RegisteredModel:
+    """
+    Loads a model version from the registry.
+
+    :param registry_dir: Root directory of the registry
+    :param name: Name of the model
+    :param version: Version number (default is the latest version)
+    :return: RegisteredModel with the model, its transformer, its cleaners and its metadata
+    """
+    model_dir = os.path.join(registry_dir, name)
+    versions = _versions(model_dir) if os.path.isdir(model_dir) else []
+    if not versions:
+        raise FileNotFoundError(f"No model named '{name}' found in the registry at {registry_dir}.")
+    if version is None:
+        version = max(versions)
+    elif version not in versions:
+        raise FileNotFoundError(f"Model '{name}' has no version {version} (versions: {sorted(versions)}).")
+
+    version_dir = os.path.join(model_dir, f"v{version}")
+    with open(os.path.join(version_dir, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    # Versions saved without cleaners have no imputer or capper file
+    cleaners = [
+        joblib.load(os.path.join(version_dir, file_name)) if os.path.exists(os.path.join(version_dir, file_name))
+        else None
+        for file_name in [IMPUTER_FILE, CAPPER_FILE]
+    ]
+    return RegisteredModel(
+        joblib.load(os.path.join(version_dir, MODEL_FILE)),
+        joblib.load(os.path.join(version_dir, PREPROCESSOR_FILE)),
+        metadata,
+        *cleaners
+    )
+
+
+def list_models(registry_dir: str) -> pd.DataFrame:
+    """
+    Lists the model versions of the registry.
+
+    :param registry_dir: Root directory of the registry
+    :return: DataFrame with one row per model version and its main metadata
+    """
+    rows = []
+    if os.path.isdir(registry_dir):
+        for name in sorted(os.listdir(registry_dir)):
+            model_dir = os.path.join(registry_dir, name)
+            if not os.path.isdir(model_dir):
+                continue
+            for version in sorted(_versions(model_dir)):
+                with open(os.path.join(model_dir, f"v{version}", METADATA_FILE)) as f:
+                    metadata = json.load(f)
+                rows.append({key: metadata.get(key) for key in
+                             ['name', 'version', 'created_at', 'model_class', 'target', 'RMSE', 'MAE']})
+    return pd.DataFrame(rows, columns=['name', 'version', 'created_at', 'model_class', 'target', 'RMSE', 'MAE'])
+
+
+def _versions(model_dir: str) -> list:
+    return [
+        int(entry[1:]) for entry in os.listdir(model_dir)
+        if entry.startswith('v') and entry[1:].isdigit() and os.path.isdir(os.path.join(model_dir, entry))
+    ]
@@ -0,0 +1,279 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error
+
+# Search spaces of the model zoo: every configuration is drawn by picking one value per
+# parameter. Models without a space (Linear Regression) are not tuned.
+TUNING_SPACES = {
+    'Random Forest': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [None, 8, 16, 32],
+        'min_samples_leaf': [1, 5, 20, 50],
+        'max_features': [1.0, 0.5, 'sqrt'],
+    },
+    'XGBoost': {
+        'learning_rate': [0.01, 0.03, 0.1, 0.3],
+        'max_depth': [3, 4, 6, 8, 10],
+        'min_child_weight': [1, 5, 20, 50],
+        'subsample': [0.6, 0.8, 1.0],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'reg_lambda': [0.1, 1.0, 10.0],
+    },
+    'Decision Tree': {
+        'max_depth': [None, 4, 8, 12, 16],
+        'min_samples_leaf': [1, 5, 20, 50, 200],
+        'max_features': [1.0, 0.5, 'sqrt'],
+    },
+}
+
+# Boosting rounds of XGBoost at full resource; each rung gets the same fraction of the
+# rounds as of the rows, and stops early when the validation error stops improving
+MAX_BOOSTING_ROUNDS = 1000
+MIN_BOOSTING_ROUNDS = 50
+EARLY_STOPPING_ROUNDS = 20
+
+# Data of the running search, per target, set once in each worker process by its initializer
+_tuning_data = None
+
+
+def _init_tuning_worker(datasets):
+    global _tuning_data
+    _tuning_data = datasets
+
+
+def sample_configs(space, n_configs, rng):
+    # Draw n_configs distinct configurations (fewer when the space is smaller)
+    names = list(space)
+    n_total = math.prod(len(space[name]) for name in names)
+    configs, seen = [], set()
+    while len(configs) < min(n_configs, n_total):
+        config = {name: space[name][rng.integers(len(space[name]))] for name in names}
+        key = tuple(repr(config[name]) for name in names)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def _evaluate_config(target, estimator, params, n_samples, n_rounds):
+    # Fit one configuration on the first n_samples rows of the target's shuffled fitting
+    # rows (so the subsamples of successive rungs are nested) and score it on the
+    # validation rows
+    X_fit, y_fit, X_val, y_val, order = _tuning_data[target]
+    rows = np.sort(order[:n_samples])
+    estimator = clone(estimator).set_params(**params)
+    start = time.perf_counter()
+    if isinstance(estimator, xgb.XGBRegressor):
+        estimator.set_params(n_estimators=n_rounds, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        estimator.fit(_take(X_fit, rows), _take(y_fit, rows), eval_set=[(X_val, y_val)], verbose=False)
+        n_rounds = estimator.best_iteration + 1
+    else:
+        estimator.fit(_take(X_fit, rows), _take(y_fit, rows))
+    rmse = np.sqrt(mean_squared_error(y_val, estimator.predict(X_val)))
+    return rmse, n_rounds, time.perf_counter() - start
+
+
+def _run_jobs(executor, jobs, deadline):
+    # Evaluate the jobs in order until the deadline; returns the scores of the leading jobs
+    # that finished in time. On a process pool, the jobs still pending at the deadline are
+    # cancelled and the workers terminated, so running fits do not overrun the budget; in
+    # this process (no executor) the deadline is checked between fits, so the fit running
+    # at the deadline still completes.
+    if executor is None:
+        scores = []
+        for job in jobs:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            scores.append(_evaluate_config(*job))
+        return scores
+
+    futures = [executor.submit(_evaluate_config, *job) for job in jobs]
+    scores = []
+    for future in futures:
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            scores.append(future.result(timeout=timeout))
+        except FuturesTimeoutError:
+            _terminate_workers(executor)
+            break
+    return scores
+
+
+def _terminate_workers(executor):
+    # A fit cannot be interrupted from outside its process: cancel the pending jobs, then
+    # kill the workers still running one
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def _take(data, rows):
+    # Rows of a design matrix or target (DataFrame/Series, array or sparse matrix)
+    if isinstance(data, (pd.Series, pd.DataFrame)):
+        return data.iloc[rows]
+    return data[rows] if hasattr(data, 'shape') else np.asarray(data)[rows]
+
+
+def _split_for_tuning(X_train, y_train, validation_fraction, rng):
+    # Hold out validation rows from the training split (the test split is never seen
+    # while tuning) and shuffle the remaining rows for the nested subsamples
+    n_rows = X_train.shape[0]
+    permutation = rng.permutation(n_rows)
+    n_val = max(1, int(n_rows * validation_fraction))
+    val_rows, fit_rows = np.sort(permutation[:n_val]), np.sort(permutation[n_val:])
+    order = rng.permutation(len(fit_rows))
+    return (_take(X_train, fit_rows), _take(y_train, fit_rows), _take(X_train, val_rows), _take(y_train, val_rows),
+            order)
+
+
+def hyperband_search(models, datasets, spaces=None, budget_seconds=None, eta=3, min_samples=None,
+                     max_rounds=MAX_BOOSTING_ROUNDS, validation_fraction=0.2, n_jobs=None, random_state=None):
+    # Hyperband search over several models and targets at once.
+    #
+    # models: {model name: estimator}, the models with a search space in `spaces` are tuned
+    # datasets: {target: (X_train, y_train)}, the design matrices may be sparse
+    # budget_seconds: wall-clock budget; once it is spent the running fits are stopped (see
+    #   _run_jobs) and the best configurations found so far are returned
+    # eta: halving rate; each rung keeps the best 1/eta of the configurations and gives them
+    #   eta times more rows (and XGBoost eta times more boosting rounds)
+    #
+    # Every bracket of Hyperband is a successive-halving run starting from a different
+    # trade-off between the number of configurations and the resource per configuration.
+    # The configurations of a rung, for all the models and targets, are evaluated
+    # concurrently on a process pool.
+    #
+    # Returns (best, history, report): best maps each target to its best model and
+    # configuration overall ('model', 'params', 'RMSE') and per model ('per_model');
+    # history has one row per evaluated configuration; report holds the actual
+    # 'elapsed_seconds', the 'budget_seconds', whether the budget was exceeded
+    # ('budget_exceeded') and whether every bracket ran to the end ('completed').
+    start = time.monotonic()
+    spaces = TUNING_SPACES if spaces is None else spaces
+    tuned = {name: model for name, model in models.items() if spaces.get(name)}
+    if not tuned:
+        raise ValueError("None of the models has a search space.")
+    rng = np.random.default_rng(random_state)
+    deadline = None if budget_seconds is None else start + budget_seconds
+
+    tuning_data = {
+        target: _split_for_tuning(X_train, y_train, validation_fraction, rng)
+        for target, (X_train, y_train) in datasets.items()
+    }
+    max_samples = min(len(data[4]) for data in tuning_data.values())
+    if min_samples is None:
+        min_samples = max(100, max_samples // eta ** 4)
+    min_samples = min(min_samples, max_samples)
+    s_max = int(math.floor(math.log(max_samples / min_samples, eta) + 1e-9))
+
+    estimators = {}
+    for name, model in tuned.items():
+        estimator = clone(model)
+        if 'n_jobs' in estimator.get_params():
+            estimator.set_params(n_jobs=1)
+        if 'random_state' in estimator.get_params():
+            estimator.set_params(random_state=0 if random_state is None else random_state)
+        estimators[name] = estimator
+
+    history = []
+    n_jobs = n_jobs or os.cpu_count()
+    executor = None
+    out_of_time = False
+    global _tuning_data
+    previous = _tuning_data
+    if n_jobs == 1:
+        _tuning_data = tuning_data
+    else:
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_tuning_worker,
+                                       initargs=(tuning_data,))
+    try:
+        for s in range(s_max, -1, -1):
+            n_configs = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+            configs = {name: sample_configs(spaces[name], n_configs, rng) for name in estimators}
+            # Surviving (target, model, config id, params) of the bracket, interleaved across
+            # the models and targets so that a rung cut short by the budget covers all of them
+            survivors = [
+                (target, name, config_id, configs[name][config_id])
+                for config_id in range(n_configs)
+                for name in estimators if config_id < len(configs[name])
+                for target in tuning_data
+            ]
+            for rung in range(s + 1):
+                n_samples = min(max_samples, int(min_samples * eta ** (s_max - s + rung)))
+                n_rounds = max(MIN_BOOSTING_ROUNDS, int(max_rounds * n_samples / max_samples))
+                jobs = [(target, estimators[name], params, n_samples, n_rounds)
+                        for target, name, _, params in survivors]
+                scores = _run_jobs(executor, jobs, deadline)
+                out_of_time = len(scores) < len(jobs)
+
+                rung_results = []
+                for (target, name, config_id, params), (rmse, rounds, fit_time) in zip(survivors, scores):
+                    if name == 'XGBoost':
+                        params = {**params, 'n_estimators': rounds}
+                    history.append({
+                        'target': target, 'model': name, 'bracket': s, 'rung': rung, 'config_id': config_id,
+                        'params': params, 'n_samples': n_samples, 'RMSE': rmse, 'fit_time': fit_time
+                    })
+                    rung_results.append(((target, name, config_id, params), rmse))
+
+                # Keep the best 1/eta of the configurations of each (target, model)
+                survivors = []
+                for target in tuning_data:
+                    for name in estimators:
+                        group = sorted(
+                            (result for result in rung_results if result[0][0] == target and result[0][1] == name),
+                            key=lambda result: result[1]
+                        )
+                        survivors.extend(config for config, _ in group[:max(1, len(group) // eta)])
+                if out_of_time:
+                    break
+            if out_of_time:
+                print("Tuning budget spent, returning the best configurations found so far.")
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        _tuning_data = previous
+
+    elapsed = time.monotonic() - start
+    report = {
+        'elapsed_seconds': elapsed,
+        'budget_seconds': budget_seconds,
+        'budget_exceeded': budget_seconds is not None and elapsed > budget_seconds,
+        'completed': not out_of_time
+    }
+    print(f"Tuning took {elapsed:.1f}s" + ("" if budget_seconds is None else
+          f" of a {budget_seconds}s budget" + (" (exceeded)" if report['budget_exceeded'] else "")))
+
+    history = pd.DataFrame(history)
+    if history.empty:
+        raise ValueError("The tuning budget is too small to evaluate any configuration.")
+    return _best_configs(history), history, report
+
+
+def _best_configs(history):
+    # Configurations are compared at the largest number of rows they were evaluated on,
+    # since errors on smaller subsamples are not comparable
+    best = {}
+    for target, target_history in history.groupby('target', sort=False):
+        per_model = {}
+        for name, model_history in target_history.groupby('model', sort=False):
+            largest = model_history[model_history['n_samples'] == model_history['n_samples'].max()]
+            row = largest.loc[largest['RMSE'].idxmin()]
+            per_model[name] = {'params': row['params'], 'RMSE': row['RMSE'], 'n_samples': row['n_samples']}
+        best_name = min(per_model, key=lambda name: (-per_model[name]['n_samples'], per_model[name]['RMSE']))
+        best[target] = {
+            'model': best_name, 'params': per_model[best_name]['params'], 'RMSE': per_model[best_name]['RMSE'],
+            'per_model': per_model
+        }
+    return best
@@ -34,17 +34,23 @@ def outlier_detection(df: pd.DataFrame):
     plt.tight_layout()
     plt.show()
     
-def compare_trends_over_geography(df: pd.DataFrame, geography_column: str):
+def compare_trends_over_geography(df: pd.DataFrame, geography_column: str, cube=None):
     """
     Compares trends of various features (insurance cover type, premium, auto make) 
     over different geographical regions.
     
     :param df: DataFrame with data
     :param geography_column: The geographical column to group by (e.g., 'Country', 'Province')
+    :param cube: Optional InsuranceCube; the cover type counts and the premium trend over
+                 time are then rolled up from it instead of aggregating the rows of df
     """
     # Plot 1: Comparison of Insurance Cover Type over Geography
     plt.figure(figsize=(12, 8))
-    sns.countplot(x=geography_column, hue='CoverType', data=df)
+    if cube is not None:
+        cover_counts = cube.rollup([geography_column, 'CoverType'])['count'].reset_index()
+        sns.barplot(x=geography_column, y='count', hue='CoverType', data=cover_counts)
+    else:
+        sns.countplot(x=geography_column, hue='CoverType', data=df)
     plt.title(f'Comparison of Insurance Cover Type Over {geography_column}')
     plt.xticks(rotation=45)
     plt.show()
@@ -64,7 +70,15 @@ def compare_trends_over_geography(df: pd.DataFrame, geography_column: str):
     plt.show()
 
     # Optional: Trend of Total Premium over Time (if applicable)
-    if 'TransactionMonth' in df.columns:
+    if cube is not None and 'TransactionMonth' in cube.dimensions:
+        monthly_premium = cube.rollup(['TransactionMonth', geography_column])['TotalPremium_mean']
+        plt.figure(figsize=(14, 8))
+        sns.lineplot(x='TransactionMonth', y='TotalPremium', hue=geography_column,
+                     data=monthly_premium.rename('TotalPremium').reset_index())
+        plt.title(f'Trend of Total Premium Over Time by {geography_column}')
+        plt.xticks(rotation=45)
+        plt.show()
+    elif 'TransactionMonth' in df.columns:
         plt.figure(figsize=(14, 8))
         sns.lineplot(x='TransactionMonth', y='TotalPremium', hue=geography_column, data=df)
         plt.title(f'Trend of Total Premium Over Time by {geography_column}')
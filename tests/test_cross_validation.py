@@ -0,0 +1,97 @@
+# tests/test_cross_validation.py
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from cross_validation import cross_validate, rolling_origin_splits, transaction_months
+from Future_Engineering import InsuranceDataUtils
+from Modeling import InsuranceModeling
+
+
+def make_features(n_rows=2400, seed=0):
+    rng = np.random.default_rng(seed)
+    months = pd.date_range('2014-03-01', '2015-08-01', freq='MS')
+    dates = pd.DatetimeIndex(rng.choice(months, n_rows))
+    return pd.DataFrame({
+        'TransactionYear': dates.year,
+        'TransactionMonthOnly': dates.month,
+        'VehicleAge': rng.integers(1, 30, n_rows),
+        'LogSumInsured': rng.normal(10, 2, n_rows),
+        'LogCapitalOutstanding': rng.normal(8, 2, n_rows),
+        'ProvinceZone': rng.choice(['Gauteng_A', 'Gauteng_B', 'Limpopo_A'], n_rows),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.9, 0.0, rng.gamma(1, 1000, n_rows)),
+    })
+
+
+class TestSplits(unittest.TestCase):
+
+    def test_rolling_origin_never_trains_on_the_future(self):
+        df = make_features()
+        months = transaction_months(df)
+        splits = rolling_origin_splits(months, n_splits=4, horizon=2)
+        self.assertEqual(len(splits), 4)
+        for train, test in splits:
+            self.assertLess(months[train].max(), months[test].min())
+            self.assertEqual(len(np.unique(months[test])), 2)
+        # Expanding window: every fold trains on the rows of the previous one and more
+        self.assertTrue(all(len(a[0]) < len(b[0]) for a, b in zip(splits, splits[1:])))
+        self.assertEqual(months[splits[-1][1]].max(), months.max())
+
+        dated = pd.DataFrame({'TransactionMonth': ['2015-01-01 00:00:00', '2014-12-01 00:00:00']})
+        self.assertEqual(transaction_months(dated).tolist(), [2015 * 12, 2014 * 12 + 11])
+        with self.assertRaises(ValueError):
+            rolling_origin_splits(months, n_splits=18)
+
+
+class TestCrossValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.utils = InsuranceDataUtils(make_features(), target_column=['TotalPremium', 'TotalClaims'])
+        self.utils.preprocess_features()
+        self.models = {'Linear Regression': LinearRegression(), 'Decision Tree': DecisionTreeRegressor(max_depth=4)}
+
+    def test_folds_are_cached_and_fitted_per_fold(self):
+        folds = self.utils.cross_validation_folds('kfold', n_splits=4)
+        self.assertIs(self.utils.cross_validation_folds('kfold', n_splits=4), folds)
+        self.assertEqual(sum(fold['X_test'].shape[0] for fold in folds), len(self.utils.df))
+        means = [fold['preprocessor'].named_transformers_['num'].mean_[0] for fold in folds]
+        self.assertEqual(len(set(means)), 4)
+        with self.assertRaises(ValueError):
+            self.utils.cross_validation_folds('holdout')
+
+    def test_parallel_grid_matches_serial(self):
+        folds = self.utils.cross_validation_folds('rolling', n_splits=3)
+        serial, serial_scores = cross_validate(self.models, folds, ['TotalPremium', 'TotalClaims'], n_jobs=1)
+        parallel, _ = cross_validate(self.models, folds, ['TotalPremium', 'TotalClaims'], n_jobs=2)
+        self.assertEqual(len(serial_scores), 3 * 2 * 2)
+        self.assertEqual(serial['Folds'].tolist(), [3] * 4)
+        self.assertTrue(np.allclose(serial['RMSE Mean'], parallel['RMSE Mean']))
+        self.assertTrue(np.allclose(serial['MAE Std'], parallel['MAE Std']))
+
+    def test_targets_must_be_in_the_folds(self):
+        utils = InsuranceDataUtils(make_features(), target_column='TotalClaims')
+        utils.preprocess_features()
+        folds = utils.cross_validation_folds('kfold', n_splits=3)
+        for n_jobs in [1, 2]:
+            with self.assertRaisesRegex(ValueError, "TotalPremium"):
+                cross_validate(self.models, folds, ['TotalPremium', 'TotalClaims'], n_jobs=n_jobs)
+
+        # InsuranceModeling defaults to the targets the folds were prepared for
+        modeling = InsuranceModeling(*[None] * 8)
+        modeling.models = self.models
+        summary = modeling.cross_validate(folds, n_jobs=1)
+        self.assertEqual(summary['Target'].unique().tolist(), ['TotalClaims'])
+        self.assertEqual(summary['Folds'].tolist(), [3, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# tests/test_cube.py
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from cube import InsuranceCube
+
+
+def make_policies(n_rows=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Province': pd.Categorical(rng.choice(['Gauteng', 'Limpopo', 'Western Cape'], n_rows)),
+        'PostalCode': rng.integers(1000, 1006, n_rows),
+        'Gender': rng.choice(['Male', 'Female', 'Not specified'], n_rows),
+        'CoverType': rng.choice(['Own Damage', 'Windscreen'], n_rows),
+        'TransactionMonth': rng.choice(['2015-01-01 00:00:00', '2015-02-01 00:00:00', '2015-03-01 00:00:00'], n_rows),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows).astype('float32'),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.8, 0.0, rng.gamma(1, 1000, n_rows)),
+    })
+
+
+class TestInsuranceCube(unittest.TestCase):
+
+    def setUp(self):
+        self.df = make_policies()
+        self.df['Margin'] = self.df['TotalPremium'].astype('float64') - self.df['TotalClaims']
+        self.cube = InsuranceCube.build(self.df.drop(columns='Margin'))
+
+    def assert_matches_groupby(self, rollup, dimensions):
+        grouped = self.df.groupby(dimensions, observed=True)
+        for measure in ['TotalPremium', 'TotalClaims', 'Margin']:
+            values = grouped[measure]
+            expected = pd.DataFrame({
+                'count': values.count(), 'sum': values.sum(), 'mean': values.mean(), 'var': values.var()
+            })
+            actual = rollup.reindex(expected.index)
+            self.assertEqual(actual[f"{measure}_count"].tolist(), expected['count'].tolist())
+            for stat in ['sum', 'mean', 'var']:
+                self.assertTrue(np.allclose(actual[f"{measure}_{stat}"], expected[stat], rtol=1e-6),
+                                msg=f"{measure}_{stat} by {dimensions}")
+
+    def test_rollups_match_groupby(self):
+        self.assertEqual(self.cube.dimensions, ['Province', 'PostalCode', 'Gender', 'CoverType', 'TransactionMonth'])
+        self.assertEqual(int(self.cube.cells['count'].sum()), len(self.df))
+        for dimensions in [['Province'], ['PostalCode', 'Gender'], ['Province', 'CoverType', 'Gender']]:
+            with self.subTest(dimensions=dimensions):
+                rollup = self.cube.rollup(dimensions)
+                self.assertEqual(len(rollup), self.df.groupby(dimensions, observed=True).ngroups)
+                self.assertEqual(rollup['count'].tolist(), self.df.groupby(dimensions, observed=True).size().tolist())
+                self.assert_matches_groupby(rollup, dimensions)
+        # A single dimension name works like a one-element list
+        pd.testing.assert_frame_equal(self.cube.rollup('Gender'), self.cube.rollup(['Gender']))
+
+    def test_missing_measure_values(self):
+        small = pd.DataFrame({'Province': ['A', 'A', 'B', 'B'], 'TotalPremium': [1.0, np.nan, 2.0, 4.0],
+                              'TotalClaims': [0.0, 0.0, 1.0, np.nan]})
+        rollup = InsuranceCube.build(small).rollup('Province')
+        self.assertEqual(rollup.loc['A', 'TotalPremium_mean'], 1.0)
+        self.assertEqual(rollup.loc['A', 'count'], 2)
+        self.assertEqual(rollup.loc['A', 'TotalPremium_count'], 1)
+        self.assertEqual(rollup.loc['B', 'Margin_count'], 1)
+
+        self.df.loc[::7, 'TotalPremium'] = np.nan
+        self.df.loc[::11, 'TotalClaims'] = np.nan
+        self.df['Margin'] = self.df['TotalPremium'].astype('float64') - self.df['TotalClaims']
+        cube = InsuranceCube.build(self.df.drop(columns='Margin'))
+        for dimensions in [['Province'], ['PostalCode', 'Gender']]:
+            with self.subTest(dimensions=dimensions):
+                self.assert_matches_groupby(cube.rollup(dimensions), dimensions)
+
+    def test_month_rollup_and_grand_total(self):
+        months = self.cube.rollup('TransactionMonth')
+        self.assertEqual(months.index.tolist(), list(pd.to_datetime(['2015-01-31', '2015-02-28', '2015-03-31'])))
+        self.assertEqual(months['count'].sum(), len(self.df))
+
+        total = self.cube.rollup([])
+        self.assertEqual(len(total), 1)
+        self.assertEqual(total['count'].iloc[0], len(self.df))
+        self.assertTrue(np.isclose(total['TotalClaims_mean'].iloc[0], self.df['TotalClaims'].mean()))
+        self.assertTrue(np.isclose(total['Margin_var'].iloc[0], self.df['Margin'].var()))
+        with self.assertRaises(ValueError):
+            self.cube.rollup(['make'])
+
+    def test_save_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cube.parquet')
+            self.cube.save(path)
+            loaded = InsuranceCube.load(path)
+        self.assertEqual(loaded.dimensions, self.cube.dimensions)
+        self.assertEqual(loaded.measures, self.cube.measures)
+        for dimensions in [['Province'], ['TransactionMonth', 'Gender'], []]:
+            pd.testing.assert_frame_equal(loaded.rollup(dimensions), self.cube.rollup(dimensions),
+                                          check_index_type=False, check_categorical=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
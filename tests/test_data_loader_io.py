@@ -0,0 +1,202 @@
+# tests/test_data_loader_io.py
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import data_loader
+from data_loader import (attach_shared_columns, fingerprint_file, load_cached_data, load_data,
+                         shared_column_categories, write_shared_columns)
+
+
+def write_policy_file(path, n_rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    provinces = np.array(['Gauteng', 'Limpopo', 'Western Cape'])[rng.integers(0, 3, n_rows)]
+    # The last rows bring a province and a make that no earlier chunk has
+    provinces[-5:] = 'North West'
+    makes = np.array(['TOYOTA', 'AUDI', ''], dtype=object)[rng.integers(0, 3, n_rows)]
+    makes[-1] = 'VOLVO'
+    capital = rng.gamma(2, 20000, n_rows).round(2).astype(str).astype(object)
+    capital[::97] = 'n/a'
+    pd.DataFrame({
+        'UnderwrittenCoverID': np.arange(n_rows),
+        'TransactionMonth': rng.choice(['2015-01-01 00:00:00', '2015-02-01 00:00:00'], n_rows),
+        'Province': provinces,
+        'PostalCode': rng.integers(1000, 1010, n_rows),
+        'Gender': rng.choice(['Male', 'Female', 'Not specified'], n_rows),
+        'make': makes,
+        'CapitalOutstanding': capital,
+        'SumInsured': rng.gamma(2, 50000, n_rows),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.9, 0.0, rng.gamma(1, 1000, n_rows)),
+    }).to_csv(path, sep='|', index=False)
+
+
+class TestLoadData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'policies.txt')
+        write_policy_file(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunked_load_matches_full_load(self):
+        full = load_data(self.path)
+        chunks = list(load_data(self.path, chunksize=300))
+        self.assertEqual([len(chunk) for chunk in chunks], [300, 300, 300, 100])
+        pd.testing.assert_frame_equal(pd.concat(chunks), full)
+
+        self.assertEqual(full['Province'].dtype, 'category')
+        self.assertEqual(full['TotalPremium'].dtype, 'float32')
+        self.assertEqual(full['CapitalOutstanding'].dtype, 'float32')
+        self.assertTrue(full['CapitalOutstanding'].isna().any())
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(full['TransactionMonth']))
+
+    def test_categories_are_consistent_across_chunks(self):
+        full = load_data(self.path)
+        for chunk in load_data(self.path, chunksize=300):
+            for col in ['Province', 'PostalCode', 'Gender', 'make']:
+                self.assertEqual(chunk[col].dtype, full[col].dtype)
+        self.assertIn('North West', full['Province'].cat.categories)
+
+    def test_usecols_subsetting(self):
+        usecols = ['UnderwrittenCoverID', 'Province', 'TotalPremium']
+        full = load_data(self.path, usecols=usecols)
+        self.assertEqual(list(full.columns), usecols)
+        chunks = list(load_data(self.path, chunksize=400, usecols=usecols))
+        self.assertTrue(all(list(chunk.columns) == usecols for chunk in chunks))
+        pd.testing.assert_frame_equal(pd.concat(chunks), full)
+
+
+class TestLoadCachedData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'policies.txt')
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+        write_policy_file(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cached_load(self, file_format):
+        # Load through the cache, counting the parses of the raw file
+        with mock.patch.object(data_loader, 'load_data', wraps=data_loader.load_data) as parse:
+            df = load_cached_data(self.path, cache_dir=self.cache_dir, file_format=file_format)
+        return df, parse.call_count
+
+    def cache_files(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_cache_hit_and_rebuilds(self):
+        for file_format in data_loader.CACHE_FORMATS:
+            with self.subTest(file_format=file_format):
+                first, parses = self.cached_load(file_format)
+                self.assertEqual(parses, 1)
+                cache_file = f"policies.{fingerprint_file(self.path)}.{file_format}"
+                self.assertIn(cache_file, self.cache_files())
+
+                second, parses = self.cached_load(file_format)
+                self.assertEqual(parses, 0)
+                pd.testing.assert_frame_equal(second, first.reset_index(drop=True))
+                for df in [first, second]:
+                    self.assertEqual(df.attrs['source_fingerprint'], fingerprint_file(self.path))
+
+                # Editing the source rebuilds the cache and removes the stale file
+                write_policy_file(self.path, seed=1)
+                _, parses = self.cached_load(file_format)
+                self.assertEqual(parses, 1)
+                self.assertNotIn(cache_file, self.cache_files())
+                cache_file = f"policies.{fingerprint_file(self.path)}.{file_format}"
+                self.assertIn(cache_file, self.cache_files())
+
+                # So does a schema change
+                with mock.patch.object(data_loader, 'SCHEMA_VERSION', data_loader.SCHEMA_VERSION + 1):
+                    _, parses = self.cached_load(file_format)
+                    self.assertEqual(parses, 1)
+                    self.assertIn(f"policies.{fingerprint_file(self.path)}.{file_format}", self.cache_files())
+                self.assertNotIn(cache_file, self.cache_files())
+                self.assertEqual(len([name for name in self.cache_files() if name.endswith(file_format)]), 1)
+                write_policy_file(self.path)
+
+    def test_other_sources_and_formats_are_kept(self):
+        other = os.path.join(self.tmp.name, 'other.txt')
+        write_policy_file(other, n_rows=50)
+        load_cached_data(other, cache_dir=self.cache_dir)
+        self.cached_load('parquet')
+        self.cached_load('feather')
+        write_policy_file(self.path, seed=1)
+        self.cached_load('parquet')
+        names = self.cache_files()
+        self.assertEqual(len(names), 3)
+        self.assertTrue(any(name.startswith('other.') for name in names))
+        self.assertTrue(any(name.endswith('.feather') for name in names))
+        with self.assertRaises(ValueError):
+            load_cached_data(self.path, cache_dir=self.cache_dir, file_format='csv')
+
+
+class TestSharedColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'policies.txt')
+        write_policy_file(path)
+        self.df = load_data(path)
+        self.store = os.path.join(self.tmp.name, 'store')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        write_shared_columns(self.df, self.store, numeric_columns=['TotalPremium', 'CapitalOutstanding'],
+                             categorical_columns=['Province', 'make'])
+        arrays = attach_shared_columns(self.store)
+        self.assertEqual(set(arrays), {'TotalPremium', 'CapitalOutstanding', 'Province', 'make'})
+        for col in ['TotalPremium', 'CapitalOutstanding']:
+            self.assertEqual(arrays[col].dtype, self.df[col].dtype)
+            np.testing.assert_array_equal(arrays[col], self.df[col].to_numpy())
+
+        categories = shared_column_categories(self.store)
+        for col in ['Province', 'make']:
+            self.assertEqual(categories[col].tolist(), self.df[col].cat.categories.tolist())
+            restored = pd.Categorical.from_codes(arrays[col], categories[col])
+            pd.testing.assert_series_equal(pd.Series(restored, name=col), self.df[col].reset_index(drop=True))
+            self.assertTrue(np.all(arrays[col][self.df[col].isna().to_numpy()] == -1))
+
+        # The arrays are read-only memory maps
+        self.assertIsInstance(arrays['TotalPremium'], np.memmap)
+        with self.assertRaises(ValueError):
+            arrays['TotalPremium'][0] = 0
+        self.assertEqual(list(attach_shared_columns(self.store, columns=['make'])), ['make'])
+
+    def test_missing_or_mismatched_manifest(self):
+        with self.assertRaises(FileNotFoundError):
+            attach_shared_columns(self.store)
+        write_shared_columns(self.df, self.store, numeric_columns=['TotalPremium', 'SumInsured'],
+                             categorical_columns=['Province'])
+        with self.assertRaises(ValueError):
+            attach_shared_columns(self.store, columns=['TotalClaims'])
+
+        # A column file rewritten with another length or dtype than the manifest says
+        np.save(os.path.join(self.store, 'TotalPremium.npy'), np.zeros(10, dtype='float32'))
+        with self.assertRaisesRegex(ValueError, 'does not match its manifest'):
+            attach_shared_columns(self.store)
+        np.save(os.path.join(self.store, 'SumInsured.npy'), np.zeros(len(self.df), dtype='int64'))
+        with self.assertRaisesRegex(ValueError, 'does not match its manifest'):
+            attach_shared_columns(self.store, columns=['SumInsured'])
+        os.remove(os.path.join(self.store, 'Province.npy'))
+        with self.assertRaisesRegex(ValueError, 'file .* is missing'):
+            attach_shared_columns(self.store, columns=['Province'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# tests/test_data_preprocessing.py
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from data_preprocessing import (
+    MissingValueImputer, OutlierCapper, QuantileSketch, clean_in_chunks, detect_outliers,
+    handle_missing_values, handle_outliers
+)
+
+
+def make_frame(n_rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'TotalPremium': rng.gamma(1.5, 40, n_rows).astype('float32'),
+        'SumInsured': rng.normal(100, 10, n_rows),
+        'RegistrationYear': rng.integers(1990, 2015, n_rows).astype('int32'),
+        'Gender': pd.Categorical(rng.choice(['Male', 'Female'], n_rows)),
+        'Province': rng.choice(['Gauteng', 'Limpopo', 'Western Cape'], n_rows).astype(object),
+        'MostlyMissing': np.nan,
+    })
+    df.loc[::5, 'TotalPremium'] = np.nan
+    df.loc[::7, 'SumInsured'] = np.nan
+    df.loc[::9, 'Gender'] = np.nan
+    df.loc[::11, 'Province'] = None
+    return df
+
+
+class TestMissingValueImputer(unittest.TestCase):
+
+    def test_statistics_match_pandas(self):
+        df = make_frame()
+        stats = MissingValueImputer().fit(df).statistics_
+        for col in ['TotalPremium', 'SumInsured']:
+            self.assertAlmostEqual(stats.at[col, 'mean'], df[col].astype('float64').mean(), places=6)
+            self.assertAlmostEqual(stats.at[col, 'median'], df[col].astype('float64').median(), places=6)
+            self.assertAlmostEqual(stats.at[col, 'skewness'], df[col].astype('float64').skew(), places=6)
+        self.assertEqual(stats.at['Gender', 'mode'], df['Gender'].mode()[0])
+        self.assertEqual(stats.at['Province', 'mode'], df['Province'].mode()[0])
+
+    def test_fills_float32_columns_and_drops_empty_ones(self):
+        df = make_frame()
+        result = handle_missing_values(df)
+        self.assertNotIn('MostlyMissing', result.columns)
+        self.assertEqual(result.isna().sum().sum(), 0)
+        self.assertEqual(result['TotalPremium'].dtype, np.float32)
+        # TotalPremium is heavily skewed, so it is filled with the median
+        self.assertAlmostEqual(result['TotalPremium'].iloc[0], df['TotalPremium'].median(), places=4)
+
+    def test_reuses_fitted_statistics_on_new_batch(self):
+        imputer = MissingValueImputer().fit(make_frame())
+        batch = make_frame(n_rows=50, seed=1)
+        batch['Gender'] = batch['Gender'].cat.remove_categories([imputer.fill_values_['Gender']])
+        result = imputer.transform(batch)
+        self.assertEqual(result.isna().sum().sum(), 0)
+        self.assertEqual(result['SumInsured'].iloc[0], imputer.fill_values_['SumInsured'])
+
+    def test_partial_fit_matches_fit(self):
+        df = make_frame(n_rows=5000)
+        full = MissingValueImputer().fit(df)
+        chunked = MissingValueImputer()
+        for start in range(0, len(df), 700):
+            chunked.partial_fit(df.iloc[start:start + 700])
+        self.assertEqual(chunked.columns_to_drop_, full.columns_to_drop_)
+        for col in ['TotalPremium', 'SumInsured', 'RegistrationYear']:
+            for stat in ['null_fraction', 'mean', 'skewness']:
+                self.assertAlmostEqual(chunked.statistics_.at[col, stat], full.statistics_.at[col, stat], places=6)
+        self.assertEqual(chunked.fill_values_['Province'], full.fill_values_['Province'])
+
+    def test_partial_fit_with_columns_missing_from_the_first_chunk(self):
+        # Read back in chunks, a column that is empty in the first chunk has a float dtype there
+        df = make_frame(n_rows=3000)
+        df.loc[:699, ['Province', 'SumInsured']] = np.nan
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'frame.csv')
+            df.to_csv(path, index=False)
+            full = MissingValueImputer().fit(pd.read_csv(path))
+            chunked = MissingValueImputer()
+            for chunk in pd.read_csv(path, chunksize=700):
+                chunked.partial_fit(chunk)
+        self.assertEqual(chunked.columns_to_drop_, full.columns_to_drop_)
+        self.assertEqual(chunked.statistics_.index.tolist(), full.statistics_.index.tolist())
+        self.assertEqual(chunked.fill_values_['Province'], full.fill_values_['Province'])
+        for col in ['SumInsured', 'RegistrationYear']:
+            for stat in ['null_fraction', 'mean', 'skewness']:
+                self.assertAlmostEqual(chunked.statistics_.at[col, stat], full.statistics_.at[col, stat], places=6)
+        self.assertEqual(chunked.transform(df.iloc[:700])['Province'].unique().tolist(), [full.fill_values_['Province']])
+
+
+class TestOutlierCapper(unittest.TestCase):
+
+    def test_exact_bounds_match_per_column_iqr(self):
+        df = make_frame()
+        summary = detect_outliers(df)
+        for col in ['TotalPremium', 'SumInsured', 'RegistrationYear']:
+            q1, q3 = df[col].quantile(0.25), df[col].quantile(0.75)
+            lower, upper = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+            self.assertAlmostEqual(summary.at[col, 'Lower Bound'], lower, places=4)
+            self.assertAlmostEqual(summary.at[col, 'Upper Bound'], upper, places=4)
+            self.assertEqual(summary.at[col, 'Total Outliers'], ((df[col] < lower) | (df[col] > upper)).sum())
+
+    def test_handle_outliers_caps_values(self):
+        df = make_frame()
+        capper = OutlierCapper().fit(df)
+        result = handle_outliers(df)
+        self.assertLessEqual(result['TotalPremium'].max(), capper.upper_bounds_['TotalPremium'] + 1e-4)
+        self.assertEqual(capper.count_outliers(result)['Total Outliers'].sum(), 0)
+
+    def test_streaming_bounds_approximate_exact_bounds(self):
+        df = make_frame(n_rows=20000)
+        streaming = OutlierCapper(method='streaming')
+        for start in range(0, len(df), 3000):
+            streaming.partial_fit(df.iloc[start:start + 3000])
+        exact = OutlierCapper().fit(df)
+        scale = exact.upper_bounds_ - exact.lower_bounds_
+        error = ((streaming.upper_bounds_ - exact.upper_bounds_).abs() / scale).max()
+        self.assertLess(error, 0.01)
+
+    def test_quantile_sketch_rank_error(self):
+        values = np.random.default_rng(2).lognormal(0, 1.5, 200000)
+        sketch = QuantileSketch()
+        for chunk in np.array_split(values, 10):
+            sketch.update(chunk)
+        quantiles = np.array([0.01, 0.25, 0.5, 0.75, 0.99])
+        ranks = np.searchsorted(np.sort(values), sketch.quantile(quantiles)) / len(values)
+        self.assertLess(np.abs(ranks - quantiles).max(), 0.002)
+
+
+class TestCleanInChunks(unittest.TestCase):
+
+    def test_two_pass_cleaning_writes_imputed_and_capped_output(self):
+        df = make_frame(n_rows=4000)
+        chunks = lambda: (df.iloc[start:start + 500] for start in range(0, len(df), 500))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'cleaned.csv')
+            imputer, capper = clean_in_chunks(chunks, output_path)
+            cleaned = pd.read_csv(output_path)
+        self.assertEqual(len(cleaned), len(df))
+        self.assertNotIn('MostlyMissing', cleaned.columns)
+        self.assertEqual(cleaned.isna().sum().sum(), 0)
+        self.assertLessEqual(cleaned['TotalPremium'].max(), capper.upper_bounds_['TotalPremium'] + 1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
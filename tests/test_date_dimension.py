@@ -0,0 +1,76 @@
+# tests/test_date_dimension.py
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import date_dimension as dd
+from date_dimension import date_dimension, date_features
+
+
+def make_months(n_rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    months = pd.date_range('2013-10-01', '2015-08-01', freq='MS').strftime('%Y-%m-%d 00:00:00')
+    values = pd.Series(rng.choice(months, n_rows), dtype=object)
+    values[[3, 10]] = [None, 'not a date']
+    return pd.DataFrame({'TransactionMonth': values})
+
+
+class TestDateDimension(unittest.TestCase):
+
+    def test_features_match_row_level_parsing(self):
+        df = make_months()
+        dates = pd.to_datetime(df['TransactionMonth'], errors='coerce')
+        features = date_features(df)
+        self.assertTrue(features['Date'].equals(dates))
+        self.assertTrue(features['Year'].equals(dates.dt.year))
+        self.assertTrue(features['Month'].equals(dates.dt.month))
+        expected = dates.dt.to_period('M').dt.to_timestamp() + pd.offsets.MonthEnd(0)
+        self.assertTrue(features['MonthEnd'].equals(expected))
+
+    def setUp(self):
+        dd._PARSED_DATES.clear()
+
+    def test_parsed_values_are_cached_by_raw_value(self):
+        df = make_months()
+        codes, dimension = date_dimension(df)
+        self.assertEqual(len(dd._PARSED_DATES), len(dimension))
+        self.assertEqual(codes.max() + 1, len(dimension))
+        self.assertEqual(df.attrs, {})
+
+        # Other frames reuse the cache; only unseen values are parsed and added to it
+        subset = df.iloc[:500].copy()
+        subset.loc[0, 'TransactionMonth'] = '2016-01-01 00:00:00'
+        with mock.patch.object(dd.pd, 'to_datetime', wraps=pd.to_datetime) as parse:
+            features = date_features(subset, features=['Year'])
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(parse.call_args.args[0].tolist(), ['2016-01-01 00:00:00'])
+        self.assertEqual(list(features.columns), ['Year'])
+        self.assertEqual(features.loc[0, 'Year'], 2016)
+        self.assertIn('2016-01-01 00:00:00', dd._PARSED_DATES)
+
+    def test_cache_is_bounded(self):
+        df = make_months()
+        with mock.patch.object(dd, 'DATE_CACHE_SIZE', 5):
+            features = date_features(df)
+            self.assertEqual(len(dd._PARSED_DATES), 5)
+            pd.testing.assert_frame_equal(date_features(df), features)
+
+    def test_frames_stay_serializable(self):
+        df = make_months()
+        df['Year'] = date_features(df)['Year']
+        derived = df[df['Year'] > 2014]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dates.parquet')
+            derived.to_parquet(path)
+            pd.testing.assert_frame_equal(pd.read_parquet(path), derived, check_dtype=False)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# tests/test_eda.py
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import eda
+from data_preprocessing import detect_outliers
+from eda import MonthlyAggregateStore, preprocess_data, profile_data
+
+
+def make_transactions(n_rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    months = pd.date_range('2014-01-01', '2014-12-01', freq='MS')
+    df = pd.DataFrame({
+        'TransactionMonth': pd.DatetimeIndex(rng.choice(months, n_rows)),
+        'Province': pd.Categorical(rng.choice(['Gauteng', 'Limpopo', 'Western Cape'], n_rows)),
+        'SumInsured': rng.normal(100, 10, n_rows),
+        'RegistrationYear': rng.integers(1990, 2015, n_rows).astype('int32'),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows).astype('float32'),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.9, 0.0, rng.gamma(1, 1000, n_rows)),
+    })
+    df.loc[::9, 'SumInsured'] = np.nan
+    return df
+
+
+class TestProfileData(unittest.TestCase):
+
+    def setUp(self):
+        eda._PROFILE_CACHE.clear()
+        self.df = make_transactions()
+
+    def test_profile_matches_describe_and_outlier_counts(self):
+        report = profile_data(self.df, n_jobs=4, use_cache=False)
+        self.assertEqual(report.index.tolist(), self.df.columns.tolist())
+
+        numeric = self.df.select_dtypes(include=['number'])
+        described = numeric.astype('float64').describe().T
+        for stat in ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']:
+            self.assertTrue(np.allclose(report.loc[numeric.columns, stat].astype('float64'), described[stat]),
+                            msg=stat)
+        self.assertEqual(report.loc['SumInsured', 'missing'], self.df['SumInsured'].isna().sum())
+
+        outliers = detect_outliers(numeric)
+        self.assertEqual(report.loc[numeric.columns, 'outliers'].astype(int).tolist(),
+                         outliers['Total Outliers'].astype(int).tolist())
+        self.assertTrue(np.allclose(report.loc[numeric.columns, 'lower_bound'].astype('float64'),
+                                    outliers['Lower Bound']))
+        self.assertEqual(report.loc['Province', 'unique'], 3)
+
+    def test_cache_hits_misses_and_bound(self):
+        report = profile_data(self.df, n_jobs=2)
+        self.assertEqual(len(eda._PROFILE_CACHE), 1)
+        pd.testing.assert_frame_equal(profile_data(self.df, n_jobs=2), report)
+
+        # A single changed value is a different dataset
+        changed = self.df.copy()
+        changed.loc[0, 'TotalPremium'] = 1e6
+        changed_report = profile_data(changed, n_jobs=2)
+        self.assertEqual(len(eda._PROFILE_CACHE), 2)
+        self.assertEqual(changed_report.loc['TotalPremium', 'max'], 1e6)
+        self.assertNotEqual(report.loc['TotalPremium', 'max'], 1e6)
+
+        # The cache keeps the most recently used reports only: re-using the first report
+        # makes the changed one the oldest, and it is the one evicted
+        profile_data(self.df, n_jobs=1)
+        for i in range(1, eda.PROFILE_CACHE_SIZE):
+            profile_data(self.df.iloc[i:], n_jobs=1)
+        self.assertEqual(len(eda._PROFILE_CACHE), eda.PROFILE_CACHE_SIZE)
+        keys = [key.split('-')[0] for key in eda._PROFILE_CACHE]
+        self.assertIn(eda.dataset_fingerprint(self.df), keys)
+        self.assertNotIn(eda.dataset_fingerprint(changed), keys)
+
+    def test_source_fingerprint_skips_hashing_the_frame(self):
+        with mock.patch.object(eda, 'dataset_fingerprint', wraps=eda.dataset_fingerprint) as hashed:
+            report = profile_data(self.df, n_jobs=1, fingerprint='source-a')
+            pd.testing.assert_frame_equal(profile_data(self.df, n_jobs=1, fingerprint='source-a'), report)
+            self.assertEqual(hashed.call_count, 0)
+            # Another source is another entry, even for equal frames
+            profile_data(self.df, n_jobs=1, fingerprint='source-b')
+        self.assertEqual([key.split('-')[1] for key in eda._PROFILE_CACHE], ['a', 'b'])
+
+
+class TestMonthlyAggregateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.df = make_transactions()
+        self.last_month = self.df['TransactionMonth'] == self.df['TransactionMonth'].max()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_appending_a_month_matches_the_full_history(self):
+        expected = preprocess_data(self.df)
+        for replace in [True, False]:
+            with self.subTest(replace=replace):
+                path = os.path.join(self.tmp.name, f"aggregates_{replace}.parquet")
+                MonthlyAggregateStore(path).update(self.df[~self.last_month])
+                # The appended month is read back from the persisted table
+                store = MonthlyAggregateStore(path)
+                store.update(self.df[self.last_month], replace=replace)
+                pd.testing.assert_frame_equal(store.monthly_changes(), expected, check_freq=False)
+
+                full = eda.monthly_aggregates(self.df)
+                pd.testing.assert_frame_equal(store.aggregates, full, check_freq=False)
+
+    def test_redelivered_month_is_replaced_or_rejected(self):
+        path = os.path.join(self.tmp.name, 'aggregates.parquet')
+        store = MonthlyAggregateStore(path)
+        store.update(self.df)
+        with self.assertRaisesRegex(ValueError, 'already stored'):
+            store.update(self.df[self.last_month], replace=False)
+        pd.testing.assert_frame_equal(MonthlyAggregateStore(path).monthly_changes(), preprocess_data(self.df),
+                                      check_freq=False)
+
+        # Re-delivering the month with replace=True is idempotent
+        store.update(self.df[self.last_month], replace=True)
+        pd.testing.assert_frame_equal(store.monthly_changes(), preprocess_data(self.df), check_freq=False)
+        with self.assertRaises(ValueError):
+            MonthlyAggregateStore(os.path.join(self.tmp.name, 'empty.parquet')).monthly_changes()
+
+
+if __name__ == '__main__':
+    unittest.main()
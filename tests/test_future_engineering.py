@@ -0,0 +1,86 @@
+# tests/test_future_engineering.py
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from Future_Engineering import InsuranceDataUtils, load_preprocessor, transform_features
+
+
+def make_features(n_rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'VehicleAge': rng.integers(1, 30, n_rows),
+        'LogSumInsured': rng.normal(10, 2, n_rows),
+        'LogCapitalOutstanding': rng.normal(8, 2, n_rows),
+        'ProvinceZone': rng.choice([f"Province{i}_Zone{j}" for i in range(9) for j in range(5)], n_rows),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.9, 0.0, rng.gamma(1, 1000, n_rows)),
+    })
+
+
+class TestFeaturePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.df = make_features()
+        self.utils = InsuranceDataUtils(self.df, target_column='TotalPremium')
+        self.utils.preprocess_features()
+        self.utils.split_data()
+
+    def test_sparse_design_fitted_on_train_only(self):
+        X_train, X_test, y_train, y_test = self.utils.get_train_test_data()
+        self.assertTrue(sparse.issparse(X_train))
+        self.assertEqual(X_train.format, 'csr')
+        self.assertEqual(X_train.shape[1], len(self.utils.feature_names))
+        self.assertNotIn('TotalPremium', self.utils.feature_names)
+
+        # The target is raw and the scaler statistics come from the training rows only
+        self.assertTrue(y_train.equals(self.df.loc[y_train.index, 'TotalPremium']))
+        scaler = self.utils.preprocessor.named_transformers_['num']
+        self.assertAlmostEqual(scaler.mean_[0], self.df.loc[y_train.index, 'VehicleAge'].mean())
+        self.assertEqual(X_train.shape[0] + X_test.shape[0], len(self.df))
+
+    def test_saved_preprocessor_scores_new_policies(self):
+        new_policies = self.df.drop(columns=['TotalPremium']).iloc[:10].copy()
+        new_policies.loc[new_policies.index[0], 'ProvinceZone'] = 'Unknown_Zone'
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'preprocessor.joblib')
+            self.utils.save_preprocessor(path)
+            X_new = transform_features(load_preprocessor(path), new_policies)
+
+        expected = self.utils.transform(new_policies)
+        self.assertEqual((X_new != expected).nnz, 0)
+        # The unseen category is encoded as all zeros
+        n_numerical = len(self.utils.preprocessor.named_transformers_['num'].mean_)
+        self.assertEqual(X_new[0, n_numerical:].nnz, 0)
+
+
+class TestMultiTarget(unittest.TestCase):
+
+    def test_shared_design_for_both_targets(self):
+        df = make_features()
+        utils = InsuranceDataUtils(df, target_column=['TotalPremium', 'TotalClaims'])
+        utils.preprocess_features()
+        utils.split_data()
+        X_train, X_test, y_train, y_test = utils.get_train_test_data()
+
+        self.assertEqual(list(y_train.columns), ['TotalPremium', 'TotalClaims'])
+        self.assertTrue(y_test.equals(df.loc[y_test.index, ['TotalPremium', 'TotalClaims']]))
+        self.assertFalse({'TotalPremium', 'TotalClaims'} & set(utils.feature_names))
+
+        # Same split as a single-target run with the same random_state
+        single = InsuranceDataUtils(df, target_column='TotalClaims')
+        single.preprocess_features()
+        single.split_data()
+        self.assertTrue(single.y_train.index.equals(y_train.index))
+
+
+if __name__ == '__main__':
+    unittest.main()
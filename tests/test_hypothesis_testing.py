@@ -0,0 +1,223 @@
+# tests/test_hypothesis_testing.py
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from cube import InsuranceCube
+from hypothesis_testing import (
+    InsuranceDataUtils, benjamini_hochberg, bin_claims, bootstrap_ci, bucket_low_frequency, combine_group_stats,
+    one_way_anova_from_stats, permutation_test, run_hypothesis_tests, sparse_chi2_contingency,
+    welch_t_test_from_stats
+)
+
+
+def make_policies(n_rows=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Province': rng.choice(['Gauteng', 'Limpopo', 'Western Cape', 'North West'], n_rows),
+        'PostalCode': rng.choice(np.arange(1, 80), n_rows),
+        'Gender': rng.choice(['Male', 'Female', 'Not specified'], n_rows),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.9, 0.0, rng.gamma(1, 1000, n_rows)),
+    })
+
+
+class TestSufficientStatisticsTests(unittest.TestCase):
+
+    def test_welch_t_test_matches_scipy(self):
+        rng = np.random.default_rng(1)
+        a, b = rng.normal(0, 1, 300), rng.normal(0.2, 2, 500)
+        t_stat, p_value = welch_t_test_from_stats(len(a), a.mean(), a.var(ddof=1), len(b), b.mean(), b.var(ddof=1))
+        expected = stats.ttest_ind(a, b, equal_var=False)
+        self.assertAlmostEqual(t_stat, expected.statistic, places=10)
+        self.assertAlmostEqual(p_value, expected.pvalue, places=10)
+
+    def test_anova_matches_scipy(self):
+        rng = np.random.default_rng(2)
+        groups = [rng.normal(i * 0.1, 1, n) for i, n in enumerate([50, 80, 1, 120])]
+        f_stat, p_value = one_way_anova_from_stats(
+            [len(g) for g in groups], [g.mean() for g in groups], [g.var(ddof=1) if len(g) > 1 else np.nan for g in groups]
+        )
+        expected = stats.f_oneway(*groups)
+        self.assertAlmostEqual(f_stat, expected.statistic, places=10)
+        self.assertAlmostEqual(p_value, expected.pvalue, places=10)
+
+    def test_combine_group_stats_matches_pooled_sample(self):
+        rng = np.random.default_rng(3)
+        groups = [rng.normal(i, 1 + i, 100 + 10 * i) for i in range(3)]
+        group_stats = pd.DataFrame({
+            'count': [len(g) for g in groups], 'mean': [g.mean() for g in groups], 'var': [g.var(ddof=1) for g in groups]
+        })
+        pooled = np.concatenate(groups)
+        count, mean, var = combine_group_stats(group_stats)
+        self.assertEqual(count, len(pooled))
+        self.assertAlmostEqual(mean, pooled.mean(), places=10)
+        self.assertAlmostEqual(var, pooled.var(ddof=1), places=10)
+
+    def test_risk_differences_match_row_level_test(self):
+        df = make_policies()
+        for cube in [None, InsuranceCube.build(df)]:
+            utils = InsuranceDataUtils(df, cube=cube)
+            high, low = utils.categorize_provinces('TotalClaims')
+            t_stat, p_value, _ = utils.test_risk_differences('TotalClaims', high, low)
+            expected = stats.ttest_ind(
+                df.loc[df['Province'].isin(high), 'TotalClaims'], df.loc[df['Province'].isin(low), 'TotalClaims'],
+                equal_var=False
+            )
+            self.assertAlmostEqual(t_stat, expected.statistic, places=8)
+            self.assertAlmostEqual(p_value, expected.pvalue, places=8)
+
+
+    def test_cube_and_scan_agree_with_missing_values(self):
+        df = make_policies()
+        df.loc[df.index[::5], 'TotalPremium'] = np.nan
+        df.loc[df.index[::9], 'TotalClaims'] = np.nan
+        scanned = run_hypothesis_tests(df, n_jobs=1).set_index('hypothesis')
+        rolled_up = run_hypothesis_tests(df, cube=InsuranceCube.build(df), n_jobs=1).set_index('hypothesis')
+        self.assertTrue(np.allclose(rolled_up['statistic'], scanned['statistic'], equal_nan=True))
+        self.assertTrue(np.allclose(rolled_up['p_value'], scanned['p_value'], equal_nan=True))
+
+        for cube in [None, InsuranceCube.build(df)]:
+            utils = InsuranceDataUtils(df, cube=cube)
+            high, low = utils.categorize_provinces('TotalPremium')
+            t_stat, _, _ = utils.test_risk_differences('TotalPremium', high, low)
+            expected = stats.ttest_ind(
+                df.loc[df['Province'].isin(high), 'TotalPremium'], df.loc[df['Province'].isin(low), 'TotalPremium'],
+                equal_var=False, nan_policy='omit'
+            )
+            self.assertAlmostEqual(t_stat, expected.statistic, places=8)
+
+
+class TestPostalCodeBuckets(unittest.TestCase):
+
+    def test_bucket_low_frequency(self):
+        codes = np.array([0, 1, 1, 2, 2, 2, -1])
+        categories, mapping = bucket_low_frequency(codes, pd.Index([10, 20, 30]), [1, 2, 3], threshold=2)
+        self.assertEqual(list(categories.astype(object)[:6]), ['Other', 20, 20, 30, 30, 30])
+        self.assertTrue(pd.isna(categories[6]))
+        self.assertEqual(mapping.to_dict(), {10: 'Other', 20: 20, 30: 30})
+
+    def test_categorize_postal_codes_matches_row_level_rule(self):
+        df = make_policies()
+        counts = df['PostalCode'].value_counts()
+        expected = df['PostalCode'].where(df['PostalCode'].map(counts) >= 70, 'Other')
+        utils = InsuranceDataUtils(df)
+        result = utils.categorize_postal_codes(threshold=70)['PostalCodeCategory']
+        self.assertIsInstance(result.dtype, pd.CategoricalDtype)
+        self.assertTrue((result.astype(object) == expected.astype(object)).all())
+        cached = utils._postal_code_buckets[70]
+        utils.categorize_postal_codes(threshold=70)
+        self.assertIs(utils._postal_code_buckets[70], cached)
+
+
+class TestSparseChiSquare(unittest.TestCase):
+
+    def test_matches_dense_chi2_contingency(self):
+        df = make_policies()
+        row_codes, _ = pd.factorize(df['PostalCode'])
+        for bins in ['raw', 'zero', 4]:
+            col_codes = bin_claims(df['TotalClaims'], bins)
+            chi2_stat, p_value, dof, expected = sparse_chi2_contingency(row_codes, col_codes)
+            table = pd.crosstab(row_codes, col_codes)
+            dense = stats.chi2_contingency(table)
+            self.assertAlmostEqual(chi2_stat, dense[0], places=6)
+            self.assertAlmostEqual(p_value, dense[1], places=8)
+            self.assertEqual(dof, dense[2])
+            self.assertTrue(np.allclose(expected.toarray()[table.to_numpy() > 0], dense[3][table.to_numpy() > 0]))
+
+    def test_bin_claims(self):
+        claims = np.array([0.0, 5.0, 10.0, np.nan, 0.0, 20.0])
+        self.assertEqual(list(bin_claims(claims, 'zero')), [0, 1, 1, -1, 0, 1])
+        self.assertEqual(list(bin_claims(claims, 2)), [0, 1, 2, -1, 0, 2])
+
+
+class TestResampling(unittest.TestCase):
+
+    def test_results_do_not_depend_on_n_jobs(self):
+        rng = np.random.default_rng(4)
+        a, b = rng.gamma(1, 100, 400), rng.gamma(1, 120, 700)
+        for function in [permutation_test, bootstrap_ci]:
+            serial = function(a, b, n_resamples=500, batch_size=64, n_jobs=1, random_state=7)
+            parallel = function(a, b, n_resamples=500, batch_size=64, n_jobs=2, random_state=7)
+            self.assertEqual(serial, parallel)
+
+    def test_permutation_p_value(self):
+        rng = np.random.default_rng(5)
+        a, b = rng.gamma(1, 100, 300), rng.gamma(1, 100, 500)
+        result = permutation_test(a, b, n_resamples=2000, n_jobs=1, random_state=0)
+        expected = stats.permutation_test(
+            (a, b), lambda x, y: x.mean() - y.mean(), n_resamples=2000, random_state=0
+        )
+        self.assertAlmostEqual(result['statistic'], expected.statistic, places=10)
+        self.assertLess(abs(result['p_value'] - expected.pvalue), 0.05)
+        shifted = permutation_test(a + 100, b, n_resamples=500, n_jobs=1, random_state=0)
+        self.assertLess(shifted['p_value'], 0.01)
+
+    def test_bootstrap_ci_covers_difference(self):
+        rng = np.random.default_rng(6)
+        claims_a, claims_b = rng.gamma(1, 60, 2000), rng.gamma(1, 40, 2000)
+        premiums_a, premiums_b = np.full(2000, 100.0), np.full(2000, 100.0)
+        result = bootstrap_ci(claims_a, claims_b, premiums_a, premiums_b, statistic='loss_ratio_diff',
+                              n_resamples=1000, n_jobs=1, random_state=0)
+        self.assertLess(result['ci_low'], 0.2)
+        self.assertGreater(result['ci_high'], 0.2)
+        self.assertAlmostEqual(result['statistic'], claims_a.mean() / 100 - claims_b.mean() / 100, places=10)
+
+    def test_resample_group_difference(self):
+        df = make_policies()
+        utils = InsuranceDataUtils(df)
+        result = utils.resample_group_difference('Gender', 'Male', 'Female', n_resamples=200, n_jobs=1,
+                                                 random_state=0)
+        claims = df.groupby('Gender')['TotalClaims'].mean()
+        self.assertAlmostEqual(result['statistic'], claims['Male'] - claims['Female'], places=8)
+        self.assertLessEqual(result['ci_low'], result['ci_high'])
+
+
+class TestHypothesisBatch(unittest.TestCase):
+
+    def test_benjamini_hochberg_matches_scipy(self):
+        p_values = np.random.default_rng(7).random(30) ** 3
+        p_values[5] = np.nan
+        adjusted = benjamini_hochberg(p_values)
+        self.assertTrue(np.isnan(adjusted[5]))
+        tested = ~np.isnan(p_values)
+        self.assertTrue(np.allclose(adjusted[tested], stats.false_discovery_control(p_values[tested])))
+
+    def test_batch_matches_individual_tests(self):
+        df = make_policies(n_rows=8000)
+        for cube in [None, InsuranceCube.build(df)]:
+            results = run_hypothesis_tests(df, cube=cube, n_jobs=2).set_index('hypothesis')
+
+            utils = InsuranceDataUtils(df)
+            high, low = utils.categorize_provinces('TotalClaims')
+            t_stat, p_value, _ = utils.test_risk_differences('TotalClaims', high, low)
+            self.assertAlmostEqual(results.loc['TotalClaims by Province (t_test)', 'statistic'], t_stat, places=8)
+
+            utils.categorize_postal_codes(10)
+            margin = df['TotalPremium'] - df['TotalClaims']
+            groups = [margin[utils.df['PostalCodeCategory'] == c] for c in utils.df['PostalCodeCategory'].cat.categories]
+            expected = stats.f_oneway(*[g for g in groups if len(g)])
+            self.assertAlmostEqual(results.loc['Margin by PostalCodeCategory (anova)', 'p_value'], expected.pvalue, places=8)
+
+            expected = stats.chi2_contingency(pd.crosstab(utils.df['PostalCodeCategory'], df['TotalClaims']))
+            self.assertAlmostEqual(results.loc['TotalClaims by PostalCodeCategory (chi2)', 'statistic'], expected[0], places=4)
+
+            expected = stats.ttest_ind(
+                df.loc[df['Gender'] == 'Male', 'TotalClaims'], df.loc[df['Gender'] == 'Female', 'TotalClaims'],
+                equal_var=False
+            )
+            self.assertAlmostEqual(results.loc['TotalClaims by Gender (t_test)', 'p_value'], expected.pvalue, places=8)
+
+            self.assertTrue(np.allclose(results['p_adjusted'], benjamini_hochberg(results['p_value'])))
+            self.assertTrue((results['reject'] == (results['p_adjusted'] < 0.05)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
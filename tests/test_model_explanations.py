@@ -0,0 +1,143 @@
+# tests/test_model_explanations.py
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import scipy.sparse as sparse
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from model_explanations import explain_model, explain_rows_lime, permutation_importance, select_rows, stratified_sample
+
+
+def make_data(n_rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = sparse.random(n_rows, 5, density=0.6, format='csr', random_state=seed)
+    y = X @ np.arange(1, 6) + rng.normal(0, 0.1, n_rows)
+    return X, y
+
+
+class TestShapExplanations(unittest.TestCase):
+
+    def test_stratified_sample_keeps_rare_targets(self):
+        y = np.zeros(10000)
+        y[:20] = np.arange(1, 21) * 1000
+        rows = stratified_sample(y, 200, random_state=0)
+        self.assertEqual(len(np.unique(rows)), len(rows))
+        self.assertTrue(np.any(rows < 20))
+        self.assertLessEqual(abs(len(rows) - 200), 10)
+
+    def test_tree_values_are_additive_and_cached(self):
+        X, y = make_data()
+        model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0).fit(X, y)
+        names = [f"f{i}" for i in range(5)]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            explanation = explain_model(model, X, feature_names=names, y=y, n_samples=300, chunk_size=100,
+                                        n_jobs=1, cache_dir=cache_dir)
+            predictions = model.predict(explanation.data)
+            self.assertTrue(np.allclose(explanation.values.sum(axis=1) + explanation.base_values, predictions))
+
+            parallel = explain_model(model, X, feature_names=names, y=y, n_samples=300, chunk_size=100, n_jobs=2)
+            self.assertTrue(np.allclose(parallel.values, explanation.values))
+
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            cached = explain_model(model, X, y=y, n_samples=300, n_jobs=1, cache_dir=cache_dir)
+            self.assertTrue(np.array_equal(cached.values, explanation.values))
+            self.assertEqual(cached.feature_names, names)
+
+    def test_linear_model_uses_summarized_background(self):
+        X, y = make_data()
+        model = LinearRegression().fit(X, y)
+        explanation = explain_model(model, X, n_samples=100, n_jobs=1)
+        self.assertEqual(explanation.values.shape, (100, 5))
+        self.assertTrue(np.allclose(explanation.values.sum(axis=1) + explanation.base_values,
+                                    model.predict(explanation.data), atol=0.2))
+
+
+class TestLimeExplanations(unittest.TestCase):
+
+    def test_residual_rows_are_the_worst_predicted(self):
+        X, y = make_data()
+        model = LinearRegression().fit(X, y)
+        residuals = np.abs(y - model.predict(X))
+        rows = select_rows(model, X, y, n_rows=5)
+        self.assertEqual(rows.tolist(), np.argsort(-residuals)[:5].tolist())
+        with self.assertRaises(ValueError):
+            select_rows(model, X, n_rows=5)
+
+    def test_parallel_weights_match_serial(self):
+        X, y = make_data()
+        model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0).fit(X, y)
+        names = [f"f{i}" for i in range(5)]
+        serial = explain_rows_lime(model, X, X, feature_names=names, y=y, n_rows=4, num_features=3,
+                                   num_samples=500, n_jobs=1)
+        parallel = explain_rows_lime(model, X, X, feature_names=names, y=y, n_rows=4, num_features=3,
+                                     num_samples=500, n_jobs=2)
+        self.assertEqual(len(serial), 4 * 3)
+        self.assertTrue(set(serial['feature']) <= set(names))
+        self.assertEqual(serial['row'].unique().tolist(), select_rows(model, X, y, n_rows=4).tolist())
+        self.assertTrue(np.allclose(serial['weight'], parallel['weight']))
+        self.assertTrue(np.allclose(serial['prediction'], model.predict(X[serial['row'].to_numpy()])))
+
+
+class RecordingRegression(LinearRegression):
+    # Keeps the design matrices it is asked to predict
+
+    def predict(self, X):
+        self.seen_.append(X)
+        return super().predict(X)
+
+
+class TestPermutationImportance(unittest.TestCase):
+
+    def test_sparse_dense_and_parallel_agree(self):
+        X, y = make_data()
+        model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0).fit(X, y)
+        names = [f"f{i}" for i in range(5)]
+        sparse_serial = permutation_importance(model, X, y, feature_names=names, n_repeats=3, n_jobs=1)
+        dense_serial = permutation_importance(model, X.toarray(), y, feature_names=names, n_repeats=3, n_jobs=1)
+        sparse_parallel = permutation_importance(model, X, y, feature_names=names, n_repeats=3, n_jobs=2)
+        self.assertTrue(np.allclose(sparse_serial['importance_mean'], dense_serial['importance_mean']))
+        self.assertTrue(np.allclose(sparse_serial['importance_mean'], sparse_parallel['importance_mean']))
+        self.assertEqual(sparse_serial['rank'].tolist(), [1, 2, 3, 4, 5])
+
+    def test_linear_ranking_follows_coefficients(self):
+        X, y = make_data()
+        model = LinearRegression().fit(X, y)
+        importances = permutation_importance(model, X, y, n_repeats=5, metric='mae', n_jobs=1)
+        self.assertEqual(importances['feature'].tolist(), [f"Feature {i}" for i in range(4, -1, -1)])
+        self.assertTrue((importances['importance_mean'] > 0).all())
+        with self.assertRaises(ValueError):
+            permutation_importance(model, X, y, metric='r2')
+
+    def test_unseeded_runs(self):
+        X, y = make_data()
+        model = LinearRegression().fit(X, y)
+        for n_jobs in [1, 2]:
+            with self.subTest(n_jobs=n_jobs):
+                importances = permutation_importance(model, X, y, n_repeats=3, max_rows=300, n_jobs=n_jobs,
+                                                     random_state=None)
+                self.assertEqual(importances['feature'].tolist(), [f"Feature {i}" for i in range(4, -1, -1)])
+                self.assertTrue(np.isfinite(importances['importance_std']).all())
+
+    def test_permuted_matrix_is_not_copied(self):
+        X, y = make_data()
+        model = RecordingRegression().fit(X, y)
+        model.seen_ = []
+        importances = permutation_importance(model, X, y, n_repeats=2, n_jobs=1)
+        # Every (feature, repeat) predicts the same working CSC matrix, after the baseline
+        permuted = model.seen_[1:]
+        self.assertEqual(len(permuted), 5 * 2)
+        self.assertTrue(all(matrix is permuted[0] for matrix in permuted))
+        self.assertEqual(permuted[0].format, 'csc')
+        dense = permutation_importance(LinearRegression().fit(X, y), X.toarray(), y, n_repeats=2, n_jobs=1)
+        self.assertTrue(np.allclose(importances['importance_mean'], dense['importance_mean']))
+
+
+if __name__ == '__main__':
+    unittest.main()
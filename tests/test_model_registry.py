@@ -0,0 +1,121 @@
+# tests/test_model_registry.py
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'src'))
+sys.path.append(os.path.join(ROOT, 'scripts'))
+
+from data_preprocessing import MissingValueImputer, OutlierCapper
+from Future_Engineering import InsuranceDataUtils, engineer_features
+from model_registry import list_models, load_model, save_model
+from score_policies import score_policies
+
+
+def make_policies(n_rows=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    months = pd.date_range('2014-01-01', '2015-08-01', freq='MS').strftime('%Y-%m-%d 00:00:00')
+    return pd.DataFrame({
+        'UnderwrittenCoverID': np.arange(n_rows),
+        'PolicyID': rng.integers(1, 500, n_rows),
+        'TransactionMonth': rng.choice(months, n_rows),
+        'Province': rng.choice(['Gauteng', 'Limpopo', 'Western Cape'], n_rows),
+        'MainCrestaZone': rng.choice(['Zone A', 'Zone B'], n_rows),
+        'RegistrationYear': rng.integers(1990, 2015, n_rows),
+        'SumInsured': rng.gamma(2, 50000, n_rows),
+        'CapitalOutstanding': rng.gamma(2, 20000, n_rows),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.9, 0.0, rng.gamma(1, 1000, n_rows)),
+    })
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.policies = make_policies()
+        utils = InsuranceDataUtils(engineer_features(self.policies), target_column=['TotalPremium', 'TotalClaims'])
+        utils.preprocess_features()
+        utils.split_data()
+        self.utils = utils
+        self.model = LinearRegression().fit(utils.X_train, utils.y_train['TotalPremium'])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = os.path.join(self.tmp.name, 'registry')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_versions_and_round_trip(self):
+        save_model(self.registry, 'TotalPremium_LinearRegression', self.model, self.utils.preprocessor,
+                   {'target': 'TotalPremium', 'RMSE': 1.0})
+        save_model(self.registry, 'TotalPremium_LinearRegression', self.model, self.utils.preprocessor)
+        self.assertEqual(list_models(self.registry)['version'].tolist(), [1, 2])
+
+        registered = load_model(self.registry, 'TotalPremium_LinearRegression', version=1)
+        self.assertEqual(registered.metadata['target'], 'TotalPremium')
+        self.assertNotIn('TotalPremium', registered.feature_columns)
+        features = engineer_features(self.policies.drop(columns=['TotalPremium', 'TotalClaims']))
+        expected = self.model.predict(self.utils.transform(features))
+        self.assertTrue(np.allclose(registered.predict(features), expected))
+        with self.assertRaises(FileNotFoundError):
+            load_model(self.registry, 'TotalPremium_LinearRegression', version=3)
+
+    def test_chunked_scoring_matches_in_memory_predictions(self):
+        save_model(self.registry, 'TotalPremium_LinearRegression', self.model, self.utils.preprocessor)
+        input_path = os.path.join(self.tmp.name, 'policies.txt')
+        output_path = os.path.join(self.tmp.name, 'predictions.csv')
+        self.policies.to_csv(input_path, sep='|', index=False)
+
+        n_rows = score_policies(input_path, self.registry, ['TotalPremium_LinearRegression'], output_path,
+                                chunksize=700)
+        predictions = pd.read_csv(output_path)
+        self.assertEqual(n_rows, len(self.policies))
+        self.assertEqual(predictions['UnderwrittenCoverID'].tolist(), self.policies['UnderwrittenCoverID'].tolist())
+        expected = self.model.predict(self.utils.transform(engineer_features(self.policies)))
+        self.assertTrue(np.allclose(predictions['PredictedTotalPremium_LinearRegression'], expected))
+
+    def test_saved_cleaners_score_like_the_training_pipeline(self):
+        # Raw policies with gaps and outliers, cleaned before feature engineering as in the notebook
+        raw = self.policies.copy()
+        raw.loc[::11, 'CapitalOutstanding'] = np.nan
+        raw.loc[::13, 'MainCrestaZone'] = None
+        raw.loc[::17, 'SumInsured'] = 1e9
+        imputer, capper = MissingValueImputer(), OutlierCapper()
+        cleaned = capper.fit_transform(imputer.fit_transform(raw))
+        utils = InsuranceDataUtils(engineer_features(cleaned), target_column=['TotalPremium', 'TotalClaims'])
+        utils.preprocess_features()
+        utils.split_data()
+        model = LinearRegression().fit(utils.X_train, utils.y_train['TotalPremium'])
+        expected = model.predict(utils.transform(engineer_features(cleaned)))
+
+        save_model(self.registry, 'TotalPremium_LinearRegression', model, utils.preprocessor,
+                   imputer=imputer, capper=capper)
+        registered = load_model(self.registry, 'TotalPremium_LinearRegression')
+        self.assertIsNotNone(registered.metadata['cleaning_hash'])
+        self.assertTrue(np.allclose(registered.predict(engineer_features(registered.clean(raw))), expected))
+        # Skipping the cleaning would not score like the training pipeline
+        self.assertFalse(np.allclose(registered.predict(engineer_features(raw)), expected))
+
+        input_path = os.path.join(self.tmp.name, 'policies.txt')
+        output_path = os.path.join(self.tmp.name, 'predictions.csv')
+        raw.to_csv(input_path, sep='|', index=False)
+        score_policies(input_path, self.registry, ['TotalPremium_LinearRegression'], output_path, chunksize=700)
+        predictions = pd.read_csv(output_path)
+        self.assertEqual(predictions['UnderwrittenCoverID'].tolist(), raw['UnderwrittenCoverID'].tolist())
+        self.assertTrue(np.allclose(predictions['PredictedTotalPremium_LinearRegression'], expected, rtol=1e-4))
+
+        # Versions saved without cleaners leave the policies unchanged
+        save_model(self.registry, 'TotalPremium_LinearRegression', model, utils.preprocessor)
+        uncleaned = load_model(self.registry, 'TotalPremium_LinearRegression')
+        self.assertIsNone(uncleaned.metadata['cleaning_hash'])
+        self.assertIs(uncleaned.clean(raw), raw)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# tests/test_model_tuning.py
+
+import os
+import sys
+import time
+import unittest
+
+import numpy as np
+import scipy.sparse as sparse
+import xgboost as xgb
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.tree import DecisionTreeRegressor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from model_tuning import hyperband_search, sample_configs
+
+SPACES = {
+    'Decision Tree': {'max_depth': [1, 2, 6], 'min_samples_leaf': [1, 10]},
+    'XGBoost': {'learning_rate': [0.1, 0.3], 'max_depth': [2, 4]},
+}
+
+
+def make_datasets(n_rows=900, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, 4))
+    premium = 3 * X[:, 0] + np.sin(2 * X[:, 1]) + rng.normal(0, 0.1, n_rows)
+    claims = np.where(X[:, 2] > 0, 10.0, 0.0) + rng.normal(0, 0.1, n_rows)
+    X = sparse.csr_matrix(X)
+    return {'TotalPremium': (X, premium), 'TotalClaims': (X, claims)}
+
+
+def make_models():
+    return {'Decision Tree': DecisionTreeRegressor(), 'XGBoost': xgb.XGBRegressor()}
+
+
+class SlowRegressor(RegressorMixin, BaseEstimator):
+    # Predicts the mean plus an offset; fits on more than 100 rows take `delay` seconds
+
+    def __init__(self, offset=0.0, delay=0.0):
+        self.offset = offset
+        self.delay = delay
+
+    def fit(self, X, y):
+        if len(y) > 100:
+            time.sleep(self.delay)
+        self.mean_ = np.mean(y) + self.offset
+        return self
+
+    def predict(self, X):
+        return np.full(X.shape[0], self.mean_)
+
+
+SLOW_SPACES = {'Slow': {'offset': [0.0, 0.5, 1.0], 'delay': [30.0]}}
+
+
+class TestHyperbandSearch(unittest.TestCase):
+
+    def test_sample_configs_are_distinct(self):
+        configs = sample_configs(SPACES['Decision Tree'], 100, np.random.default_rng(0))
+        self.assertEqual(len(configs), 6)
+        self.assertEqual(len({tuple(sorted(config.items())) for config in configs}), 6)
+
+    def test_search_finds_best_config_per_target(self):
+        best, history, report = hyperband_search(make_models(), make_datasets(), spaces=SPACES, min_samples=80,
+                                                 max_rounds=200, n_jobs=1, random_state=0)
+        self.assertTrue(report['completed'])
+        self.assertFalse(report['budget_exceeded'])
+        self.assertEqual(set(best), {'TotalPremium', 'TotalClaims'})
+        # Successive halving grows the rows of the surviving configurations up to all fitting rows
+        self.assertEqual(history['n_samples'].max(), 720)
+        first_bracket = history[history['bracket'] == history['bracket'].max()]
+        self.assertTrue((first_bracket.groupby('rung')['n_samples'].first().diff().dropna() > 0).all())
+
+        self.assertEqual(best['TotalPremium']['model'], 'XGBoost')
+        self.assertGreater(best['TotalPremium']['params']['max_depth'], 1)
+        self.assertGreater(best['TotalClaims']['per_model']['Decision Tree']['params']['max_depth'], 0)
+        self.assertIn('n_estimators', best['TotalClaims']['per_model']['XGBoost']['params'])
+
+    def test_parallel_search_matches_serial(self):
+        kwargs = dict(spaces=SPACES, min_samples=80, max_rounds=100, random_state=1)
+        serial, _, _ = hyperband_search(make_models(), make_datasets(), n_jobs=1, **kwargs)
+        parallel, _, _ = hyperband_search(make_models(), make_datasets(), n_jobs=2, **kwargs)
+        for target in serial:
+            self.assertEqual(serial[target]['params'], parallel[target]['params'])
+            self.assertAlmostEqual(serial[target]['RMSE'], parallel[target]['RMSE'])
+
+    def test_budget_stops_the_search(self):
+        with self.assertRaises(ValueError):
+            hyperband_search(make_models(), make_datasets(), spaces=SPACES, budget_seconds=0, n_jobs=1)
+
+    def test_running_fits_are_stopped_at_the_budget(self):
+        # The first rung (80 rows) is fast, the fits of the next one take 30s each
+        best, history, report = hyperband_search({'Slow': SlowRegressor()}, make_datasets(), spaces=SLOW_SPACES,
+                                                 budget_seconds=3, min_samples=80, n_jobs=2, random_state=0)
+        self.assertFalse(report['completed'])
+        self.assertLess(report['elapsed_seconds'], 10)
+        self.assertEqual(report['budget_exceeded'], report['elapsed_seconds'] > 3)
+        self.assertEqual(history['n_samples'].unique().tolist(), [80])
+        self.assertEqual(best['TotalPremium']['model'], 'Slow')
+
+    def test_serial_overrun_is_reported(self):
+        # In-process fits cannot be stopped: the fit running at the deadline completes
+        spaces = {'Slow': {'offset': [0.0, 0.5, 1.0], 'delay': [1.0]}}
+        _, history, report = hyperband_search({'Slow': SlowRegressor()}, make_datasets(), spaces=spaces,
+                                              budget_seconds=0.5, min_samples=80, n_jobs=1, random_state=0)
+        self.assertFalse(report['completed'])
+        self.assertTrue(report['budget_exceeded'])
+        self.assertGreaterEqual(report['elapsed_seconds'], 1.0)
+        self.assertEqual(report['budget_seconds'], 0.5)
+        self.assertEqual((history['n_samples'] > 100).sum(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# tests/test_modeling.py
+
+import os
+import sys
+import time
+import unittest
+
+import numpy as np
+import scipy.sparse as sparse
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from Modeling import InsuranceModeling
+
+
+def make_modeling(n_rows=600, seed=0):
+    rng = np.random.default_rng(seed)
+    X = sparse.random(n_rows, 6, density=0.5, format='csr', random_state=seed)
+    premium = X @ np.arange(1, 7) + rng.normal(0, 0.1, n_rows)
+    claims = X @ np.arange(6, 0, -1) * 10 + rng.normal(0, 1, n_rows)
+    split = n_rows * 4 // 5
+    modeling = InsuranceModeling(
+        X[:split], X[split:], premium[:split], premium[split:],
+        X[:split], X[split:], claims[:split], claims[split:]
+    )
+    modeling.models = {'Linear Regression': LinearRegression(), 'Decision Tree': DecisionTreeRegressor(random_state=0)}
+    return modeling
+
+
+class AllocatingRegressor(RegressorMixin, BaseEstimator):
+    # Holds a buffer of a known size while it fits, then predicts the training mean
+
+    def __init__(self, megabytes=50):
+        self.megabytes = megabytes
+
+    def fit(self, X, y):
+        buffer = np.ones(self.megabytes * 2 ** 20 // 8)
+        time.sleep(0.05)
+        self.mean_ = float(np.mean(y)) + buffer[0] - 1
+        return self
+
+    def predict(self, X):
+        return np.full(X.shape[0], self.mean_)
+
+
+class TestTrainModels(unittest.TestCase):
+
+    def test_models_are_independent_per_target(self):
+        modeling = make_modeling()
+        modeling.train_models(n_jobs=1)
+        for name in modeling.models:
+            premium_model = modeling.results_premium[name]['model']
+            claims_model = modeling.results_claims[name]['model']
+            self.assertIsNot(premium_model, claims_model)
+            self.assertIsNot(premium_model, modeling.models[name])
+        coef = modeling.results_premium['Linear Regression']['model'].coef_
+        self.assertTrue(np.allclose(coef, np.arange(1, 7), atol=0.1))
+        self.assertGreaterEqual(modeling.results_claims['Decision Tree']['Wall Time (s)'], 0)
+        self.assertGreaterEqual(modeling.results_claims['Decision Tree']['Peak Memory (MB)'], 0)
+
+    def test_parallel_training_matches_serial(self):
+        serial, parallel = make_modeling(), make_modeling()
+        serial.train_models(n_jobs=1)
+        parallel.train_models(n_jobs=2)
+        for name in serial.models:
+            self.assertAlmostEqual(serial.results_premium[name]['RMSE'], parallel.results_premium[name]['RMSE'])
+            self.assertAlmostEqual(serial.results_claims[name]['MAE'], parallel.results_claims[name]['MAE'])
+        self.assertEqual(list(parallel.results_claims), list(parallel.models))
+
+    def test_peak_memory_is_per_job(self):
+        # A smaller allocation after a heavier one in the same process still reports its own peak
+        for n_jobs in [1, 2]:
+            with self.subTest(n_jobs=n_jobs):
+                modeling = make_modeling()
+                modeling.models = {'Heavy': AllocatingRegressor(megabytes=120), 'Light': AllocatingRegressor(megabytes=40)}
+                modeling.train_models(n_jobs=n_jobs)
+                for results in [modeling.results_premium, modeling.results_claims]:
+                    self.assertGreaterEqual(results['Heavy']['Peak Memory (MB)'], 120 * 0.95)
+                    self.assertGreaterEqual(results['Light']['Peak Memory (MB)'], 40 * 0.95)
+                    self.assertLess(results['Light']['Peak Memory (MB)'], 120 * 0.95)
+
+
+class TestFeatureImportance(unittest.TestCase):
+
+    def test_every_model_and_target_is_ranked(self):
+        modeling = make_modeling()
+        modeling.feature_names_premium = modeling.feature_names_claims = [f"x{i}" for i in range(6)]
+        modeling.train_models(n_jobs=1)
+        importances = modeling.feature_importance_analysis(n_repeats=2, n_jobs=1)
+        self.assertEqual(len(importances), 2 * 2 * 6)
+        linear = importances[importances['Model'] == 'Linear Regression']
+        # The premium weights grow with the column and the claims weights shrink
+        premium = linear[linear['Target'] == 'TotalPremium']['feature'].tolist()
+        claims = linear[linear['Target'] == 'TotalClaims']['feature'].tolist()
+        self.assertEqual(premium[0], 'x5')
+        self.assertEqual(claims[0], 'x0')
+
+
+if __name__ == '__main__':
+    unittest.main()
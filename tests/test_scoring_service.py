@@ -0,0 +1,153 @@
+# tests/test_scoring_service.py
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'src'))
+sys.path.append(os.path.join(ROOT, 'scripts'))
+
+from Future_Engineering import InsuranceDataUtils, engineer_features
+from model_registry import load_model, save_model
+from scoring_service import MAX_BODY_BYTES, MicroBatcher, ScoringService
+
+
+def make_policies(n_rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'TransactionMonth': rng.choice(['2015-01-01', '2015-02-01', '2015-03-01'], n_rows),
+        'Province': rng.choice(['Gauteng', 'Limpopo', 'Western Cape'], n_rows),
+        'MainCrestaZone': rng.choice(['Zone A', 'Zone B'], n_rows),
+        'RegistrationYear': rng.integers(1990, 2015, n_rows),
+        'SumInsured': rng.gamma(2, 50000, n_rows),
+        'CapitalOutstanding': rng.gamma(2, 20000, n_rows),
+        'TotalPremium': rng.gamma(1.5, 40, n_rows),
+        'TotalClaims': np.where(rng.random(n_rows) < 0.9, 0.0, rng.gamma(1, 1000, n_rows)),
+    })
+
+
+async def post(port, path, payload=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    method = 'POST' if payload is not None else 'GET'
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                 + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+class TestScoringService(unittest.TestCase):
+
+    def setUp(self):
+        self.policies = make_policies()
+        utils = InsuranceDataUtils(engineer_features(self.policies), target_column=['TotalPremium', 'TotalClaims'])
+        utils.preprocess_features()
+        utils.split_data()
+        model = LinearRegression().fit(utils.X_train, utils.y_train['TotalPremium'])
+        self.tmp = tempfile.TemporaryDirectory()
+        save_model(self.tmp.name, 'TotalPremium_LinearRegression', model, utils.preprocessor)
+        self.registered = load_model(self.tmp.name, 'TotalPremium_LinearRegression')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_concurrent_requests_are_micro_batched(self):
+        records = json.loads(self.policies.head(50).drop(columns=['TotalPremium', 'TotalClaims']).to_json(orient='records'))
+        expected = self.registered.predict(engineer_features(self.policies.head(50)))
+
+        async def scenario():
+            service = ScoringService(self.registered, max_batch_size=64, max_wait_ms=20)
+            server = await service.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                responses = await asyncio.gather(*[post(port, '/predict', record) for record in records])
+                bad_request = await post(port, '/predict', {'Province': 'Gauteng'})
+                metrics = await post(port, '/metrics')
+            finally:
+                await service.stop()
+            return responses, bad_request, metrics
+
+        responses, bad_request, metrics = asyncio.run(scenario())
+        self.assertTrue(all(status == 200 for status, _ in responses))
+        predictions = [payload['predictions'][0] for _, payload in responses]
+        self.assertTrue(np.allclose(predictions, expected))
+        self.assertEqual(bad_request[0], 400)
+
+        metrics = metrics[1]
+        self.assertEqual(metrics['requests'], 50)
+        self.assertLess(metrics['batches'], 50)
+        self.assertGreater(metrics['batch_size']['max'], 1)
+        self.assertIsNotNone(metrics['latency_ms']['p99'])
+
+    def send_without_body(self, content_length):
+        async def scenario():
+            service = ScoringService(self.registered)
+            server = await service.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                # Keep-alive request whose body is never sent: the server must not wait for it
+                writer.write(f"POST /predict HTTP/1.1\r\nContent-Length: {content_length}\r\n\r\n".encode())
+                await writer.drain()
+                response = await asyncio.wait_for(reader.read(), timeout=5)
+                writer.close()
+            finally:
+                await service.stop()
+            return response
+
+        head, _, body = asyncio.run(scenario()).partition(b'\r\n\r\n')
+        self.assertIn(b'Connection: close', head)
+        self.assertIn('error', json.loads(body))
+        return int(head.split()[1])
+
+    def test_oversized_body_closes_the_connection(self):
+        self.assertEqual(self.send_without_body(MAX_BODY_BYTES + 1), 413)
+
+    def test_invalid_content_length_closes_the_connection(self):
+        for content_length in ['abc', '-5', '1.5']:
+            with self.subTest(content_length=content_length):
+                self.assertEqual(self.send_without_body(content_length), 400)
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_bad_record_only_fails_its_own_request(self):
+        def predict_batch(records):
+            if any(record['x'] < 0 for record in records):
+                raise ValueError("negative x")
+            return [record['x'] * 2 for record in records]
+
+        async def scenario():
+            batcher = MicroBatcher(predict_batch, max_batch_size=64, max_wait_ms=50)
+            batcher.start()
+            try:
+                results = await asyncio.gather(
+                    *[batcher.submit([{'x': x}, {'x': x + 1}]) for x in [1, 3, -5, 7]], return_exceptions=True
+                )
+            finally:
+                await batcher.stop()
+            return results, batcher.metrics()
+
+        results, metrics = asyncio.run(scenario())
+        self.assertEqual(results[0], [2, 4])
+        self.assertEqual(results[1], [6, 8])
+        self.assertIsInstance(results[2], ValueError)
+        self.assertEqual(results[3], [14, 16])
+        self.assertEqual(metrics['errors'], 1)
+        self.assertEqual(metrics['requests'], 3)
+        self.assertEqual(metrics['rows'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()